@@ -3,12 +3,18 @@ THRYX Activity Generator - Creates organic on-chain activity
 Run this to make the chain look alive with real transactions
 """
 import os
-import time
 import random
-from web3 import Web3
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from web3 import Web3, AsyncWeb3, AsyncHTTPProvider
 from eth_account import Account
+from chain_utils import AsyncNonceTracker, ReceiptWatcher, batch_call, get_contract, get_raw_tx, wait_for_receipts, receipt_ok
 
 RPC_URL = os.getenv("RPC_URL", "http://localhost:8545")
+# Optional websocket endpoint (anvil serves ws:// on the RPC port) for push-based receipts
+WS_URL = os.getenv("WS_URL", "")
+RECEIPT_TIMEOUT = 120  # seconds
 
 # Hardhat default accounts with 10000 ETH each
 ACCOUNTS = [
@@ -26,6 +32,12 @@ ACCOUNTS = [
 
 # Contract addresses (update these after deploy)
 FACTORY_ADDRESS = os.getenv("FACTORY_ADDRESS", "0x2E2Ed0Cfd3AD2f1d34481277b3204d807Ca2F8c2")
+FACTORY_ADDRESS_CS = Web3.to_checksum_address(FACTORY_ADDRESS)
+
+# Fixed gas settings for the local chain
+CHAIN_ID = 31337
+GAS_MAX_FEE = Web3.to_wei(2, 'gwei')
+GAS_PRIO_FEE = Web3.to_wei(1, 'gwei')
 
 FACTORY_ABI = [
     {"name": "createCoin", "type": "function", "stateMutability": "nonpayable",
@@ -72,154 +84,266 @@ COIN_IDEAS = [
 ]
 
 
-def create_coin(w3, account, name, symbol, profile):
-    """Create a new coin"""
-    try:
-        factory = w3.eth.contract(
-            address=Web3.to_checksum_address(FACTORY_ADDRESS),
-            abi=FACTORY_ABI
-        )
-        
-        nonce = w3.eth.get_transaction_count(account.address)
-        tx = factory.functions.createCoin(name, symbol, profile).build_transaction({
-            'from': account.address,
-            'nonce': nonce,
-            'gas': 3000000,
-            'chainId': 31337,
-            'maxFeePerGas': w3.to_wei(2, 'gwei'),
-            'maxPriorityFeePerGas': w3.to_wei(1, 'gwei'),
-        })
-        
-        signed = w3.eth.account.sign_transaction(tx, account.key)
-        raw_tx = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-        tx_hash = w3.eth.send_raw_transaction(raw_tx)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-        
-        if receipt.status == 1:
-            print(f"✅ Created ${symbol} by {account.address[:10]}...")
-            return True
-        return False
-    except Exception as e:
-        print(f"❌ Failed to create {symbol}: {e}")
-        return False
-
-
-def buy_coin(w3, account, coin_address, eth_amount):
-    """Buy a coin"""
+# Set once at startup by detect_send_sync()
+_send_sync_supported = False
+
+
+async def detect_send_sync(w3):
+    """
+    Probe for eth_sendRawTransactionSync, which returns the receipt in the
+    same call. A bogus payload is enough: nodes that know the method
+    reject the params, nodes that don't report an unknown method.
+    """
+    global _send_sync_supported
     try:
-        coin = w3.eth.contract(
-            address=Web3.to_checksum_address(coin_address),
-            abi=COIN_ABI
+        response = await w3.provider.make_request('eth_sendRawTransactionSync', ['0x'])
+        error = response.get('error') or {}
+        message = str(error.get('message', '')).lower()
+        _send_sync_supported = not (
+            error.get('code') == -32601
+            or 'not found' in message
+            or 'does not exist' in message
+            or 'not supported' in message
         )
-        
-        symbol = coin.functions.symbol().call()
-        
-        nonce = w3.eth.get_transaction_count(account.address)
-        tx = coin.functions.buy(0).build_transaction({
-            'from': account.address,
-            'nonce': nonce,
-            'value': w3.to_wei(eth_amount, 'ether'),
-            'gas': 200000,
-            'chainId': 31337,
-            'maxFeePerGas': w3.to_wei(2, 'gwei'),
-            'maxPriorityFeePerGas': w3.to_wei(1, 'gwei'),
-        })
-        
-        signed = w3.eth.account.sign_transaction(tx, account.key)
-        raw_tx = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-        tx_hash = w3.eth.send_raw_transaction(raw_tx)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-        
-        if receipt.status == 1:
-            print(f"💰 {account.address[:10]}... bought {eth_amount} ETH of ${symbol}")
-            return True
-        return False
-    except Exception as e:
-        print(f"❌ Failed to buy: {e}")
-        return False
-
-
-def transfer_eth(w3, from_account, to_address, amount):
-    """Simple ETH transfer"""
-    try:
-        nonce = w3.eth.get_transaction_count(from_account.address)
-        tx = {
-            'from': from_account.address,
-            'to': Web3.to_checksum_address(to_address),
-            'value': w3.to_wei(amount, 'ether'),
-            'nonce': nonce,
-            'gas': 21000,
-            'chainId': 31337,
-            'maxFeePerGas': w3.to_wei(2, 'gwei'),
-            'maxPriorityFeePerGas': w3.to_wei(1, 'gwei'),
-        }
-        
-        signed = w3.eth.account.sign_transaction(tx, from_account.key)
-        raw_tx = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-        tx_hash = w3.eth.send_raw_transaction(raw_tx)
-        w3.eth.wait_for_transaction_receipt(tx_hash)
-        print(f"💸 Transferred {amount} ETH: {from_account.address[:10]}... → {to_address[:10]}...")
-        return True
-    except Exception as e:
-        print(f"❌ Transfer failed: {e}")
-        return False
-
-
-def main():
+    except Exception:
+        _send_sync_supported = False
+    return _send_sync_supported
+
+
+async def send_raw(w3, raw_tx, tx_hash):
+    """
+    Broadcast a signed transaction, returns (tx_hash, receipt).
+    The receipt is only available when the node supports
+    eth_sendRawTransactionSync; otherwise it is None and gets collected
+    later with the phase's batched receipt poll.
+    """
+    if _send_sync_supported:
+        response = await w3.provider.make_request('eth_sendRawTransactionSync', [Web3.to_hex(raw_tx)])
+        if 'result' in response:
+            return tx_hash, response['result']
+        error = response.get('error') or {}
+        # Code 4: accepted but not mined before the node's timeout
+        if error.get('code') == 4:
+            return tx_hash, None
+        raise ValueError(error)
+    
+    return (await w3.eth.send_raw_transaction(raw_tx)).hex(), None
+
+
+def _sign_one(job):
+    """Sign (tx, key) in a worker process, returns (raw_tx, tx_hash)"""
+    tx, key = job
+    signed = Account.sign_transaction(tx, key)
+    return bytes(get_raw_tx(signed)), signed.hash.hex()
+
+
+# Set in main() when WS_URL is configured
+_receipt_watcher = None
+
+
+# Coin symbols, fetched once per address
+_symbol_cache = {}
+
+
+async def build_create_tx(w3, account, nonce, name, symbol, profile):
+    """Build an unsigned createCoin transaction"""
+    factory = get_contract(w3, FACTORY_ADDRESS_CS, FACTORY_ABI)
+    return await factory.functions.createCoin(name, symbol, profile).build_transaction({
+        'from': account.address,
+        'nonce': nonce,
+        'gas': 3000000,
+        'chainId': CHAIN_ID,
+        'maxFeePerGas': GAS_MAX_FEE,
+        'maxPriorityFeePerGas': GAS_PRIO_FEE,
+    })
+
+
+async def build_buy_tx(w3, account, nonce, coin_address, eth_amount):
+    """Build an unsigned buy transaction"""
+    coin = get_contract(w3, coin_address, COIN_ABI)
+    return await coin.functions.buy(0).build_transaction({
+        'from': account.address,
+        'nonce': nonce,
+        'value': w3.to_wei(eth_amount, 'ether'),
+        'gas': 200000,
+        'chainId': CHAIN_ID,
+        'maxFeePerGas': GAS_MAX_FEE,
+        'maxPriorityFeePerGas': GAS_PRIO_FEE,
+    })
+
+
+async def build_transfer_tx(w3, from_account, nonce, to_address, amount):
+    """Build an unsigned ETH transfer"""
+    return {
+        'from': from_account.address,
+        'to': Web3.to_checksum_address(to_address),
+        'value': w3.to_wei(amount, 'ether'),
+        'nonce': nonce,
+        'gas': 21000,
+        'chainId': CHAIN_ID,
+        'maxFeePerGas': GAS_MAX_FEE,
+        'maxPriorityFeePerGas': GAS_PRIO_FEE,
+    }
+
+
+async def run_phase(w3, nonces, pool, plan):
+    """
+    Build, sign and submit one phase, then collect its receipts.
+    `plan` is a list of (sender, build, args, success_message, failure_label).
+    Nonces are reserved in plan order, all transactions are signed in one
+    go on the process pool, and each sender's transactions are then sent
+    in nonce order (senders run concurrently). A failure stops the rest of
+    that sender's transactions so no nonce gap is left behind.
+    Returns the number of successful transactions.
+    """
+    jobs = [(entry, await nonces.next(entry[0].address)) for entry in plan]
+    txs = await asyncio.gather(
+        *(build(w3, sender, nonce, *args) for (sender, build, args, _, _), nonce in jobs),
+        return_exceptions=True
+    )
+    
+    # ECDSA signing is CPU-bound - do it all at once, off the event loop
+    loop = asyncio.get_running_loop()
+    signed = iter(await asyncio.gather(*(
+        loop.run_in_executor(pool, _sign_one, (tx, entry[0].key))
+        for (entry, _), tx in zip(jobs, txs) if not isinstance(tx, Exception)
+    )))
+    
+    by_sender = defaultdict(list)
+    for ((sender, _, _, message, failure_label), _), tx in zip(jobs, txs):
+        if isinstance(tx, Exception):
+            by_sender[sender.address].append((None, tx, message, failure_label))
+        else:
+            signed_tx = next(signed)
+            by_sender[sender.address].append((signed_tx, None, message, failure_label))
+    
+    async def submit_group(address, entries):
+        submitted = []
+        for signed_tx, error, message, failure_label in entries:
+            try:
+                if error:
+                    raise error
+                tx_hash, receipt = await send_raw(w3, *signed_tx)
+            except Exception as e:
+                print(f"❌ {failure_label}: {e}")
+                nonces.reset(address)
+                break
+            # Watched only once broadcast, so skipped or failed sends are never left pending
+            if receipt is None and _receipt_watcher:
+                _receipt_watcher.expect(tx_hash)
+            submitted.append((tx_hash, address, message, receipt))
+        return submitted
+    
+    submitted = []
+    for entries in await asyncio.gather(*(submit_group(a, e) for a, e in by_sender.items())):
+        submitted.extend(entries)
+    return await collect_phase(w3, nonces, submitted)
+
+
+async def collect_phase(w3, nonces, submitted):
+    """
+    Wait for all transactions of a phase in one batched receipt poll.
+    `submitted` is a list of (tx_hash, sender, success_message, receipt);
+    only entries without a receipt yet are polled.
+    Returns the number of successful transactions.
+    """
+    missing = [tx_hash for tx_hash, _, _, receipt in submitted if receipt is None]
+    receipts = {}
+    if _receipt_watcher:
+        receipts = await _receipt_watcher.wait_many(missing, RECEIPT_TIMEOUT)
+        _receipt_watcher.discard([tx_hash for tx_hash, _, _, _ in submitted])
+        missing = [tx_hash for tx_hash in missing if tx_hash not in receipts]
+    if missing:
+        receipts.update(await asyncio.to_thread(wait_for_receipts, w3, missing))
+    
+    succeeded = 0
+    for tx_hash, sender, message, receipt in submitted:
+        receipt = receipt or receipts.get(tx_hash)
+        if receipt_ok(receipt):
+            print(message)
+            succeeded += 1
+        elif receipt is None:
+            # Never mined - resync this sender's nonce before reusing it
+            nonces.reset(sender)
+    return succeeded
+
+
+async def main():
     print("=" * 60)
     print("🚀 THRYX ACTIVITY GENERATOR")
     print("=" * 60)
     print("Generating organic on-chain activity...")
     print()
     
-    w3 = Web3(Web3.HTTPProvider(RPC_URL))
-    print(f"Connected to THRYX: {w3.is_connected()}")
-    print(f"Current block: {w3.eth.block_number}")
+    w3 = AsyncWeb3(AsyncHTTPProvider(RPC_URL))
+    print(f"Connected to THRYX: {await w3.is_connected()}")
+    print(f"Current block: {await w3.eth.block_number}")
+    print(f"Sync send (eth_sendRawTransactionSync): {await detect_send_sync(w3)}")
+    
+    global _receipt_watcher
+    if WS_URL:
+        _receipt_watcher = ReceiptWatcher(w3, WS_URL)
+        _receipt_watcher.start()
+        print(f"Receipts via websocket: {WS_URL}")
     print()
     
     # Load accounts
     accounts = [Account.from_key(pk) for _, pk in ACCOUNTS]
     
+    # One get_transaction_count per sender, then nonces are tracked locally
+    nonces = AsyncNonceTracker(w3)
+    pool = ProcessPoolExecutor()
+    
     # Phase 1: Create coins
     print("=" * 60)
     print("📦 PHASE 1: Creating Creator Coins")
     print("=" * 60)
     
-    created_coins = 0
+    plan = []
     for i, (name, symbol, profile) in enumerate(COIN_IDEAS[:5]):  # Create 5 coins
         creator = accounts[i % len(accounts)]
-        if create_coin(w3, creator, name, symbol, profile):
-            created_coins += 1
-        time.sleep(1)
+        plan.append((creator, build_create_tx, (name, symbol, profile),
+                     f"✅ Created ${symbol} by {creator.address[:10]}...",
+                     f"Failed to create {symbol}"))
     
+    created_coins = await run_phase(w3, nonces, pool, plan)
     print(f"\n✅ Created {created_coins} coins\n")
     
-    # Get coin addresses
-    factory = w3.eth.contract(
-        address=Web3.to_checksum_address(FACTORY_ADDRESS),
-        abi=FACTORY_ABI
+    # Get coin addresses, then resolve every symbol once for trade logs
+    factory = get_contract(w3, FACTORY_ADDRESS_CS, FACTORY_ABI)
+    total = await factory.functions.totalCoins().call()
+    coin_addresses = [
+        addr for addr in await asyncio.to_thread(batch_call, w3, [factory.functions.allCoins(i) for i in range(total)])
+        if addr
+    ]
+    symbols = await asyncio.to_thread(
+        batch_call, w3, [get_contract(w3, addr, COIN_ABI).functions.symbol() for addr in coin_addresses]
     )
-    total = factory.functions.totalCoins().call()
-    coin_addresses = []
-    for i in range(total):
-        addr = factory.functions.allCoins(i).call()
-        coin_addresses.append(addr)
+    for addr, symbol in zip(coin_addresses, symbols):
+        if symbol:
+            _symbol_cache[addr] = symbol
     
     # Phase 2: Buy coins (generate trading activity)
     print("=" * 60)
     print("💰 PHASE 2: Trading Activity")
     print("=" * 60)
     
-    trades = 0
-    for _ in range(20):  # 20 random trades
-        buyer = random.choice(accounts)
-        if coin_addresses:
-            coin = random.choice(coin_addresses)
-            amount = random.uniform(0.01, 0.5)
-            if buy_coin(w3, buyer, coin, round(amount, 4)):
-                trades += 1
-        time.sleep(0.5)
+    # Buys stay one transaction per trade: CreatorCoin.buy() mints to
+    # msg.sender, so routing them through Multicall3.aggregate3Value would
+    # credit the tokens to the multicall contract instead of the buyer.
+    # Sample every trade decision up front
+    plan = []
+    if coin_addresses:
+        num_trades = 20  # 20 random trades
+        buyers = random.choices(accounts, k=num_trades)
+        coins = random.choices(coin_addresses, k=num_trades)
+        amounts = [round(0.01 + random.random() * 0.49, 4) for _ in range(num_trades)]
+        for buyer, coin, amount in zip(buyers, coins, amounts):
+            plan.append((buyer, build_buy_tx, (coin, amount),
+                         f"💰 {buyer.address[:10]}... bought {amount} ETH of ${_symbol_cache.get(coin, '?')}",
+                         "Failed to buy"))
     
+    trades = await run_phase(w3, nonces, pool, plan)
     print(f"\n✅ Executed {trades} trades\n")
     
     # Phase 3: ETH transfers (general activity)
@@ -227,17 +351,21 @@ def main():
     print("💸 PHASE 3: ETH Transfers")
     print("=" * 60)
     
-    transfers = 0
-    for _ in range(10):  # 10 transfers
-        sender = random.choice(accounts)
-        receiver = random.choice(accounts)
-        if sender != receiver:
-            amount = random.uniform(0.1, 1.0)
-            if transfer_eth(w3, sender, receiver.address, round(amount, 4)):
-                transfers += 1
-        time.sleep(0.5)
+    num_transfers = 10  # 10 transfers
+    senders = random.choices(accounts, k=num_transfers)
+    receivers = random.choices(accounts, k=num_transfers)
+    amounts = [round(0.1 + random.random() * 0.9, 4) for _ in range(num_transfers)]
+    plan = [
+        (sender, build_transfer_tx, (receiver.address, amount),
+         f"💸 Transferred {amount} ETH: {sender.address[:10]}... → {receiver.address[:10]}...",
+         "Transfer failed")
+        for sender, receiver, amount in zip(senders, receivers, amounts)
+        if sender != receiver
+    ]
     
+    transfers = await run_phase(w3, nonces, pool, plan)
     print(f"\n✅ Executed {transfers} transfers\n")
+    pool.shutdown()
     
     # Summary
     print("=" * 60)
@@ -247,11 +375,11 @@ def main():
     print(f"Trades executed: {trades}")
     print(f"ETH transfers: {transfers}")
     print(f"Total transactions: {created_coins + trades + transfers}")
-    print(f"Current block: {w3.eth.block_number}")
+    print(f"Current block: {await w3.eth.block_number}")
     print()
     print("🔥 Chain is now buzzing with activity!")
     print("Check the explorer: https://crispy-goggles-v6jg77gvqwqv3pxpg-5100.app.github.dev")
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
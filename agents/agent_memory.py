@@ -6,19 +6,216 @@ Features:
 - Action tracking with outcomes
 - Performance metrics calculation
 - Parameter adjustment recommendations
-- Persistent storage
+- Persistent storage (msgpack snapshot + write-ahead log)
 """
 import os
+import sys
 import json
 import time
-from datetime import datetime, timedelta
+import atexit
+import threading
+from datetime import datetime
 from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
-from collections import defaultdict
+from dataclasses import dataclass
+from collections import defaultdict, deque
 import math
+from chain_utils import json_dumps, json_loads
 
+try:
+    import msgpack
+except ImportError:  # Fall back to JSON files where msgpack isn't installed
+    msgpack = None
 
-MEMORY_FILE = os.getenv("AGENT_MEMORY_FILE", "agent_memory.json")
+
+MEMORY_FILE = os.getenv("AGENT_MEMORY_FILE", "agent_memory.mpk")
+
+# 1.1: timestamps are stored as epoch floats instead of ISO strings
+# 1.2: execution time is kept as an integer total, the average is derived on read
+MEMORY_VERSION = "1.2"
+
+# Background snapshot cadence; actions in between only go to the WAL
+SNAPSHOT_INTERVAL = 10  # seconds
+
+# Window kept indexed per action type for O(1) recent-stats lookups
+RECENT_WINDOW_HOURS = 24
+
+
+def _pack(obj) -> bytes:
+    """Serialize a snapshot or WAL record (msgpack, else one JSON line)"""
+    if msgpack:
+        return msgpack.packb(obj, default=str)
+    return json_dumps(obj) + b"\n"
+
+
+def _unpack(data: bytes):
+    """Parse a snapshot written by _pack or by the older JSON format"""
+    if data[:1] == b"{":
+        return json_loads(data)
+    return msgpack.unpackb(data)
+
+
+def _iter_records(data: bytes):
+    """Yield WAL records, stopping quietly at a torn write from a crash"""
+    if not data:
+        return
+    if data[:1] == b"{":
+        for line in data.splitlines():
+            try:
+                yield json_loads(line)
+            except ValueError:
+                continue
+        return
+    
+    unpacker = msgpack.Unpacker()
+    unpacker.feed(data)
+    try:
+        yield from unpacker
+    except Exception:
+        return
+
+
+def _legacy_file(memory_file: str) -> Optional[str]:
+    """The .json file an .mpk memory file replaces, if any"""
+    root, ext = os.path.splitext(memory_file)
+    return root + ".json" if ext == ".mpk" else None
+
+
+def _read_memory_file(memory_file: str) -> dict:
+    """Read and migrate a memory file, falling back to its legacy .json"""
+    try:
+        with open(memory_file, 'rb') as f:
+            return _migrate(_unpack(f.read()))
+    except FileNotFoundError:
+        legacy = _legacy_file(memory_file)
+        if not legacy:
+            raise
+        with open(legacy, 'rb') as f:
+            return _migrate(json_loads(f.read()))
+
+
+def to_json(memory_file: str = None) -> str:
+    """Decode a memory file into pretty-printed JSON for reading"""
+    return json.dumps(_read_memory_file(memory_file or MEMORY_FILE), indent=2, default=str)
+
+
+def _to_epoch(value):
+    """Convert a legacy ISO timestamp to an epoch float"""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return value
+
+
+def _migrate(memory: dict) -> dict:
+    """Upgrade an older memory file to the current schema"""
+    if memory.get("version") == "1.0":
+        global_metrics = memory.get("global_metrics", {})
+        global_metrics["last_update"] = _to_epoch(global_metrics.get("last_update"))
+        for agent_data in memory.get("agents", {}).values():
+            agent_data["created_at"] = _to_epoch(agent_data.get("created_at"))
+            for insight in agent_data.get("learned_parameters", {}).values():
+                insight["last_updated"] = _to_epoch(insight.get("last_updated"))
+        memory["version"] = "1.1"
+    
+    if memory.get("version") == "1.1":
+        for agent_data in memory.get("agents", {}).values():
+            metrics = agent_data.get("metrics", {})
+            avg = metrics.pop("avg_execution_time", 0)
+            metrics["total_execution_time_ms"] = round(avg * metrics.get("total_actions", 0))
+        memory["version"] = "1.2"
+    
+    return memory
+
+
+def _with_averages(metrics: dict) -> dict:
+    """Copy of metrics with avg_execution_time derived from the running total"""
+    return {
+        **metrics,
+        "avg_execution_time": metrics.get("total_execution_time_ms", 0) / max(metrics.get("total_actions", 0), 1),
+    }
+
+
+def iso(ts) -> str:
+    """Format an epoch timestamp for display"""
+    return datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else "never"
+
+
+def _empty_memory() -> dict:
+    return {
+        "version": MEMORY_VERSION,
+        "agents": {},
+        "global_metrics": {
+            "total_transactions": 0,
+            "system_uptime_hours": 0,
+            "last_update": None
+        }
+    }
+
+
+class SharedMemoryStore:
+    """
+    Process-wide owner of one memory file.
+    The file is parsed once and every AgentMemory in the process works on
+    the same dict; a single background thread snapshots it when dirty.
+    """
+    
+    def __init__(self, memory_file: str):
+        self.memory_file = memory_file
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.views = {}  # agent_name -> AgentMemory
+        self.memory = self._load()
+        
+        self._flusher = threading.Thread(target=self._flush_loop, name="agent-memory-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+    
+    def _load(self) -> dict:
+        """Load memory snapshot from file"""
+        try:
+            return _read_memory_file(self.memory_file)
+        except:
+            return _empty_memory()
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(SNAPSHOT_INTERVAL)
+            if self.dirty:
+                self.flush()
+    
+    def flush(self):
+        """Snapshot memory to file atomically and truncate every agent's WAL"""
+        with self.lock:
+            try:
+                for view in self.views.values():
+                    view._checkpoint()
+                self.memory["global_metrics"]["last_update"] = time.time()
+                
+                tmp_file = self.memory_file + ".tmp"
+                with open(tmp_file, 'wb') as f:
+                    f.write(_pack(self.memory))
+                os.replace(tmp_file, self.memory_file)
+                
+                for view in self.views.values():
+                    view._wal.truncate(0)
+                self.dirty = False
+            except Exception as e:
+                print(f"[AgentMemory] Warning: Could not save memory: {e}")
+
+
+# One store per memory file, created on first use
+_stores: Dict[str, SharedMemoryStore] = {}
+_stores_lock = threading.Lock()
+
+
+def _get_store(memory_file: str) -> SharedMemoryStore:
+    with _stores_lock:
+        store = _stores.get(memory_file)
+        if store is None:
+            store = _stores[memory_file] = SharedMemoryStore(memory_file)
+        return store
 
 
 @dataclass
@@ -39,12 +236,30 @@ class AgentMemory:
     """
     Learning memory system for THRYX agents.
     Tracks actions, outcomes, and provides adaptive recommendations.
+    One instance per agent and memory file exists in a process; constructing
+    it again returns the instance already attached to the shared store.
     """
     
+    def __new__(cls, agent_name: str, memory_file: str = None):
+        store = _get_store(memory_file or MEMORY_FILE)
+        with store.lock:
+            view = store.views.get(agent_name)
+            if view is None:
+                view = super().__new__(cls)
+                view._store = store
+                view._attach(agent_name)
+            return view
+    
     def __init__(self, agent_name: str, memory_file: str = None):
+        pass  # State is set up once, in _attach
+    
+    def _attach(self, agent_name: str):
+        """Bind to the shared memory dict and register with the store"""
         self.agent_name = agent_name
-        self.memory_file = memory_file or MEMORY_FILE
-        self.memory = self._load_memory()
+        self.memory_file = self._store.memory_file
+        # Per-agent write-ahead log: one record per action between snapshots
+        self.wal_file = f"{self.memory_file}.{agent_name}.wal"
+        self.memory = self._store.memory
         
         # Initialize agent section if needed
         if agent_name not in self.memory["agents"]:
@@ -57,71 +272,135 @@ class AgentMemory:
                     "failed_actions": 0,
                     "total_profit": 0.0,
                     "total_gas_spent": 0,
-                    "avg_execution_time": 0
+                    "total_execution_time_ms": 0
                 },
                 "learned_parameters": {},
-                "created_at": datetime.now().isoformat()
+                "created_at": time.time()
             }
+        
+        # Per-action-type view of the recent window with running tallies
+        self._by_type = defaultdict(deque)
+        self._totals = defaultdict(lambda: {"success": 0, "profit": 0.0})
+        for action_dict in self.memory["agents"][agent_name]["actions"]:
+            self._index_action(action_dict)
+        
+        if self._replay_wal():
+            self._store.dirty = True
+        self._wal = open(self.wal_file, 'ab', buffering=0)
+        self._store.views[agent_name] = self
     
-    def _load_memory(self) -> dict:
-        """Load memory from file"""
-        try:
-            with open(self.memory_file, 'r') as f:
-                return json.load(f)
-        except:
-            return {
-                "version": "1.0",
-                "agents": {},
-                "global_metrics": {
-                    "total_transactions": 0,
-                    "system_uptime_hours": 0,
-                    "last_update": None
-                }
-            }
+    def _replay_wal(self):
+        """Re-apply actions logged after the last snapshot, returns how many"""
+        agent_data = self.memory["agents"][self.agent_name]
+        checkpoint = agent_data.get("wal_checkpoint", 0)
+        wal_files = [self.wal_file]
+        legacy = _legacy_file(self.memory_file)
+        if legacy and not os.path.exists(self.memory_file):
+            wal_files.insert(0, f"{legacy}.{self.agent_name}.wal")
+        
+        replayed = 0
+        for wal_file in wal_files:
+            try:
+                with open(wal_file, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            for record in _iter_records(data):
+                action_dict = record.get("action") if isinstance(record, dict) else None
+                if action_dict and action_dict["timestamp"] > checkpoint:
+                    self._apply_action(action_dict)
+                    replayed += 1
+        return replayed
+    
+    def _checkpoint(self):
+        """Mark everything applied so far as covered by the next snapshot"""
+        agent_data = self.memory["agents"][self.agent_name]
+        if agent_data["actions"]:
+            agent_data["wal_checkpoint"] = agent_data["actions"][-1]["timestamp"]
     
     def _save_memory(self):
-        """Save memory to file"""
-        try:
-            self.memory["global_metrics"]["last_update"] = datetime.now().isoformat()
-            with open(self.memory_file, 'w') as f:
-                json.dump(self.memory, f, indent=2, default=str)
-        except Exception as e:
-            print(f"[{self.agent_name}] Warning: Could not save memory: {e}")
+        """Snapshot the shared memory now instead of waiting for the flusher"""
+        self._store.flush()
     
-    def record_action(self, action: ActionRecord):
-        """Record an action and its outcome"""
+    def _apply_action(self, action_dict: dict):
+        """Fold one action into the in-memory history and metrics"""
         agent_data = self.memory["agents"][self.agent_name]
         
         # Add to actions list (keep last 1000)
-        action_dict = asdict(action)
-        agent_data["actions"].append(action_dict)
-        if len(agent_data["actions"]) > 1000:
-            agent_data["actions"] = agent_data["actions"][-1000:]
+        actions = agent_data["actions"]
+        actions.append(action_dict)
+        self._index_action(action_dict)
+        if len(actions) > 1000:
+            for old in actions[:-1000]:
+                dq = self._by_type.get(old["action_type"])
+                if dq and dq[0] is old:
+                    self._unindex_oldest(old["action_type"])
+            del actions[:-1000]
         
         # Update metrics
         metrics = agent_data["metrics"]
         metrics["total_actions"] += 1
         
-        if action.outcome == "success":
+        if action_dict["outcome"] == "success":
             metrics["successful_actions"] += 1
-        elif action.outcome == "failure":
+        elif action_dict["outcome"] == "failure":
             metrics["failed_actions"] += 1
         
-        metrics["total_profit"] += action.result_value
-        metrics["total_gas_spent"] += action.gas_used
+        metrics["total_profit"] += action_dict["result_value"]
+        metrics["total_gas_spent"] += action_dict["gas_used"]
         
-        # Update average execution time
-        n = metrics["total_actions"]
-        old_avg = metrics["avg_execution_time"]
-        metrics["avg_execution_time"] = old_avg + (action.execution_time_ms - old_avg) / n
+        # Exact integer total; the average is computed on read
+        metrics["total_execution_time_ms"] += action_dict["execution_time_ms"]
         
         # Update global metrics
         self.memory["global_metrics"]["total_transactions"] += 1
-        
-        self._save_memory()
-        
-        # Trigger learning
-        self._learn_from_action(action)
+    
+    def _index_action(self, action_dict: dict):
+        """Add an action to its type's recent-window deque and tallies"""
+        action_type = action_dict["action_type"]
+        self._by_type[action_type].append(action_dict)
+        totals = self._totals[action_type]
+        totals["success"] += action_dict["outcome"] == "success"
+        totals["profit"] += action_dict["result_value"]
+    
+    def _unindex_oldest(self, action_type: str):
+        """Drop the oldest indexed action of a type"""
+        old = self._by_type[action_type].popleft()
+        totals = self._totals[action_type]
+        totals["success"] -= old["outcome"] == "success"
+        totals["profit"] -= old["result_value"]
+    
+    def _expire(self, action_type: str) -> deque:
+        """Evict actions that fell out of the recent window, returns the deque"""
+        dq = self._by_type[action_type]
+        cutoff = time.time() - RECENT_WINDOW_HOURS * 3600
+        while dq and dq[0]["timestamp"] <= cutoff:
+            self._unindex_oldest(action_type)
+        return dq
+    
+    def record_action(self, action: ActionRecord):
+        """Record an action and its outcome"""
+        # Flat row; parameters/context are shared rather than deep-copied like asdict()
+        action_dict = {
+            "agent_name": action.agent_name,
+            "action_type": action.action_type,
+            "parameters": action.parameters,
+            "timestamp": action.timestamp,
+            "outcome": action.outcome,
+            "result_value": action.result_value,
+            "gas_used": action.gas_used,
+            "execution_time_ms": action.execution_time_ms,
+            "context": action.context,
+        }
+        with self._store.lock:
+            self._apply_action(action_dict)
+            
+            # Log the action before anything else can fail; the flusher snapshots later
+            self._wal.write(_pack({"agent": self.agent_name, "action": action_dict}))
+            self._store.dirty = True
+            
+            # Trigger learning
+            self._learn_from_action(action)
     
     def _learn_from_action(self, action: ActionRecord):
         """Analyze action and adjust learned parameters"""
@@ -129,76 +408,86 @@ class AgentMemory:
         learned = agent_data["learned_parameters"]
         
         # Get recent actions for this type
-        recent = self.get_recent_actions(action.action_type, hours=24)
+        recent = self.get_recent_actions(action.action_type, hours=RECENT_WINDOW_HOURS)
         if len(recent) < 5:
             return  # Not enough data
         
-        # Calculate success rate
-        success_count = sum(1 for a in recent if a["outcome"] == "success")
-        success_rate = success_count / len(recent)
-        
-        # Calculate average profit
-        avg_profit = sum(a["result_value"] for a in recent) / len(recent)
+        # Success rate and average profit come from the running tallies
+        totals = self._totals[action.action_type]
+        success_rate = totals["success"] / len(recent)
+        avg_profit = totals["profit"] / len(recent)
         
         # Store learned insights
         learned[action.action_type] = {
             "success_rate": success_rate,
             "avg_profit": avg_profit,
             "sample_size": len(recent),
-            "last_updated": datetime.now().isoformat(),
+            "last_updated": action.timestamp,
             "recommended_adjustments": self._calculate_adjustments(action.action_type, recent)
         }
-        
-        self._save_memory()
     
     def _calculate_adjustments(self, action_type: str, recent_actions: List[dict]) -> dict:
         """Calculate recommended parameter adjustments based on outcomes"""
         adjustments = {}
         
-        # Analyze which parameters correlate with success
-        successful = [a for a in recent_actions if a["outcome"] == "success"]
-        failed = [a for a in recent_actions if a["outcome"] == "failure"]
-        
-        if not successful or not failed:
-            return adjustments
+        # Single pass over the window: per-parameter [success_sum, success_n, fail_sum, fail_n]
+        columns = defaultdict(lambda: [0.0, 0, 0.0, 0])
+        non_numeric = set()
+        has_success = has_failure = False
         
-        # Get all parameter keys
-        all_params = set()
         for a in recent_actions:
-            all_params.update(a.get("parameters", {}).keys())
+            outcome = a["outcome"]
+            if outcome == "success":
+                offset = 0
+                has_success = True
+            elif outcome == "failure":
+                offset = 2
+                has_failure = True
+            else:
+                continue
+            
+            for param, value in a.get("parameters", {}).items():
+                if value is None or param in non_numeric:
+                    continue
+                try:
+                    value = float(value)
+                except (ValueError, TypeError):
+                    non_numeric.add(param)  # Skip non-numeric parameters
+                    continue
+                col = columns[param]
+                col[offset] += value
+                col[offset + 1] += 1
+        
+        if not has_success or not has_failure:
+            return adjustments
         
-        for param in all_params:
-            # Get average values for successful vs failed
-            success_vals = [a["parameters"].get(param) for a in successful if param in a.get("parameters", {})]
-            fail_vals = [a["parameters"].get(param) for a in failed if param in a.get("parameters", {})]
+        confidence = len(recent_actions) / 100  # More data = more confidence
+        for param, (success_sum, success_n, fail_sum, fail_n) in columns.items():
+            if param in non_numeric or not success_n or not fail_n:
+                continue
             
-            # Only analyze numeric parameters
-            try:
-                success_vals = [float(v) for v in success_vals if v is not None]
-                fail_vals = [float(v) for v in fail_vals if v is not None]
+            success_avg = success_sum / success_n
+            fail_avg = fail_sum / fail_n
+            
+            # Recommend moving toward successful values
+            if success_avg != fail_avg:
+                direction = "increase" if success_avg > fail_avg else "decrease"
+                magnitude = abs(success_avg - fail_avg) / max(abs(success_avg), abs(fail_avg), 0.0001)
                 
-                if success_vals and fail_vals:
-                    success_avg = sum(success_vals) / len(success_vals)
-                    fail_avg = sum(fail_vals) / len(fail_vals)
-                    
-                    # Recommend moving toward successful values
-                    if success_avg != fail_avg:
-                        direction = "increase" if success_avg > fail_avg else "decrease"
-                        magnitude = abs(success_avg - fail_avg) / max(abs(success_avg), abs(fail_avg), 0.0001)
-                        
-                        adjustments[param] = {
-                            "direction": direction,
-                            "magnitude": magnitude,
-                            "target_value": success_avg,
-                            "confidence": len(recent_actions) / 100  # More data = more confidence
-                        }
-            except (ValueError, TypeError):
-                continue  # Skip non-numeric parameters
+                adjustments[param] = {
+                    "direction": direction,
+                    "magnitude": magnitude,
+                    "target_value": success_avg,
+                    "confidence": confidence
+                }
         
         return adjustments
     
     def get_recent_actions(self, action_type: str = None, hours: int = 24) -> List[dict]:
         """Get recent actions, optionally filtered by type"""
+        if action_type and hours == RECENT_WINDOW_HOURS:
+            return list(self._expire(action_type))
+        
         agent_data = self.memory["agents"][self.agent_name]
         cutoff = time.time() - (hours * 3600)
         
@@ -214,6 +503,10 @@ class AgentMemory:
     
     def get_success_rate(self, action_type: str = None, hours: int = 24) -> float:
         """Get success rate for recent actions"""
+        if action_type and hours == RECENT_WINDOW_HOURS:
+            count = len(self._expire(action_type))
+            return self._totals[action_type]["success"] / count if count else 0.0
+        
         recent = self.get_recent_actions(action_type, hours)
         if not recent:
             return 0.0
@@ -239,14 +532,14 @@ class AgentMemory:
     
     def get_metrics(self) -> dict:
         """Get agent performance metrics"""
-        return self.memory["agents"][self.agent_name]["metrics"]
+        return _with_averages(self.memory["agents"][self.agent_name]["metrics"])
     
     def get_learning_insights(self) -> dict:
         """Get current learned parameters and insights"""
         agent_data = self.memory["agents"][self.agent_name]
         return {
             "agent": self.agent_name,
-            "metrics": agent_data["metrics"],
+            "metrics": _with_averages(agent_data["metrics"]),
             "learned_parameters": agent_data.get("learned_parameters", {}),
             "recent_success_rate": self.get_success_rate(hours=24),
             "total_actions_24h": len(self.get_recent_actions(hours=24))
@@ -337,21 +630,22 @@ class LearningMixin:
 def print_learning_report():
     """Print a report of all agent learning"""
     try:
-        with open(MEMORY_FILE, 'r') as f:
-            memory = json.load(f)
+        memory = _read_memory_file(MEMORY_FILE)
     except:
         print("No memory file found")
         return
     
     print("=" * 60)
     print("THRYX AGENT LEARNING REPORT")
+    print(f"Last update: {iso(memory.get('global_metrics', {}).get('last_update'))}")
     print("=" * 60)
     
     for agent_name, agent_data in memory.get("agents", {}).items():
-        metrics = agent_data.get("metrics", {})
+        metrics = _with_averages(agent_data.get("metrics", {}))
         learned = agent_data.get("learned_parameters", {})
         
         print(f"\n{agent_name}:")
+        print(f"  Tracking Since: {iso(agent_data.get('created_at'))}")
         print(f"  Total Actions: {metrics.get('total_actions', 0)}")
         
         total = metrics.get('total_actions', 1)
@@ -369,4 +663,7 @@ def print_learning_report():
 
 
 if __name__ == "__main__":
-    print_learning_report()
+    if "--json" in sys.argv:
+        print(to_json())
+    else:
+        print_learning_report()
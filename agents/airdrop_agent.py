@@ -4,16 +4,57 @@ Distributes tokens to active addresses to incentivize participation
 """
 import os
 import json
+import math
 import time
+import mmap
 import random
+import struct
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from web3 import Web3
 from eth_account import Account
+from chain_utils import (
+    batch_request, make_http_provider, ttl_cache, MulticallReader, NonceTracker, get_raw_tx,
+    wait_for_receipts, receipt_ok, fill_nonce_gaps, json_dumps, json_loads,
+)
+from config import MULTICALL3_ADDRESS, MULTICALL3_ABI
 
 # Config
 RPC_URL = os.getenv("RPC_URL", "http://thryx-node:8545")
 STATE_FILE = os.getenv("AIRDROP_STATE", "/app/data/airdrop_state.json")
 
+# Max JSON-RPC calls per batch request
+BATCH_SIZE = 50
+
+# Recipient dedupe: Bloom filter sizing
+BLOOM_CAPACITY = 100_000
+BLOOM_ERROR_RATE = 0.01
+
+# Recipients airdropped per cycle
+AIRDROP_BATCH = 10
+
+# Rescan for active addresses at least this often (cycles)
+RESCAN_EVERY = 10
+
+# How long a totalCoins() read is reused
+TOTAL_COINS_TTL = 30  # seconds
+
+# Transfer(address,address,uint256) event, and the zero address as it appears in its topics
+TRANSFER_TOPIC = Web3.to_hex(Web3.keccak(text="Transfer(address,address,uint256)"))
+ZERO_TOPIC_ADDRESS = "0x" + "0" * 40
+
+# transfer(address,uint256) and the fields shared by every airdrop transfer (chainId is added once known)
+TRANSFER_SELECTOR = bytes.fromhex("a9059cbb")
+TRANSFER_TEMPLATE = {
+    'type': 2,
+    'value': 0,
+    'gas': 100000,
+    'maxFeePerGas': Web3.to_wei(2, 'gwei'),
+    'maxPriorityFeePerGas': Web3.to_wei(1, 'gwei'),
+}
+
 # Airdrop account (uses a dedicated account)
 AIRDROP_KEY = "0x92db14e403b83dfe3df233f83dfa3a0d7096f21ca9b0d6d6b8d88b2b4ec1564e"  # Account 6
 
@@ -40,32 +81,176 @@ COIN_ABI = [
 ]
 
 
+class RecipientBloom:
+    """
+    Bloom filter over recipient addresses.
+    False positives (skipping an address that never got an airdrop) happen
+    at roughly BLOOM_ERROR_RATE; false negatives never do.
+    `bits` can be a bytearray or an mmap, in which case add() updates the
+    file in place.
+    """
+    
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE, bits=None):
+        self.m = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray(self.size_for(self.m))
+    
+    @staticmethod
+    def size_for(m):
+        return (m + 7) // 8
+    
+    def _positions(self, address):
+        # Kirsch-Mitzenmacher: k indexes from two hashes, h1 + i*h2
+        digest = hashlib.blake2b(address.lower().encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.m for i in range(self.k))
+    
+    def add(self, address):
+        for pos in self._positions(address):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+    
+    def __contains__(self, address):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(address))
+
+
+class BlockedBloom:
+    """
+    Bloom filter split into cache-line-friendly blocks: one hash picks a
+    2 KB block and all k bits for a key land inside it, so a lookup
+    touches a single block. Used to remember which block numbers have
+    already been scanned.
+    """
+    
+    BLOCKS = 128
+    BLOCK_BYTES = 2048
+    K = 7
+    SIZE = BLOCKS * BLOCK_BYTES  # 256 KB
+    
+    def __init__(self, bits=None):
+        self.bits = bits if bits is not None else bytearray(self.SIZE)
+    
+    def _positions(self, key):
+        digest = hashlib.blake2b(str(key).encode(), digest_size=16).digest()
+        base = (int.from_bytes(digest[:2], "little") % self.BLOCKS) * self.BLOCK_BYTES * 8
+        h1 = int.from_bytes(digest[2:9], "little")
+        h2 = int.from_bytes(digest[9:], "little") | 1
+        block_bits = self.BLOCK_BYTES * 8
+        return (base + (h1 + i * h2) % block_bits for i in range(self.K))
+    
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+    
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+def _map_file(path, size):
+    """mmap a fixed-size file, creating it zero-filled; bytearray if that fails"""
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            return mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+    except OSError:
+        return bytearray(size)
+
+
 class AirdropState:
+    """
+    Airdrop state split by how often it changes:
+    - <state>.bloom: recipient Bloom filter bits, mmapped, set in place
+    - <state>.counters: airdrops_sent (u64) + total_tokens_distributed (u256), mmapped
+    - <state>.blocks: blocked Bloom filter of block numbers already scanned, mmapped
+    - airdrop_events.jsonl: one appended line per airdrop
+    - <state>.json: scan results, rewritten only after a scan
+    """
+    
+    # airdrops_sent: u64 little-endian, total_tokens_distributed: u256 big-endian
+    COUNTERS = struct.Struct("<Q32s")
+    
     def __init__(self, filepath):
         self.filepath = filepath
+        root = os.path.splitext(filepath)[0]
+        directory = os.path.dirname(filepath)
+        self.events_file = os.path.join(directory, "airdrop_events.jsonl")
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            pass
+        
         self.data = self._load()
+        
+        self.counters = _map_file(root + ".counters", 64)
+        if "airdrops_sent" in self.data:
+            # Counters used to live in the JSON file
+            self._write_counters(int(self.data.pop("airdrops_sent")), int(self.data.pop("total_tokens_distributed", 0)))
+        
+        bloom_file = root + ".bloom"
+        migrate = not os.path.exists(bloom_file)
+        self.bloom = RecipientBloom()
+        self.bloom.bits = _map_file(bloom_file, len(self.bloom.bits))
+        if migrate:
+            # Seed the filter from the recipients list of an older state file
+            for recipient in self.data.get("recipients", []):
+                self.bloom.add(recipient)
+        
+        self.scanned_blocks = BlockedBloom(_map_file(root + ".blocks", BlockedBloom.SIZE))
+        self.data.pop("recipients", None)
+        
+        # Addresses already classified as EOAs; that never changes, so keep it across restarts
+        self.eoas = set(self.data.get("eoas", []))
+    
+    @property
+    def airdrops_sent(self):
+        return self.COUNTERS.unpack_from(self.counters)[0]
+    
+    @property
+    def total_tokens_distributed(self):
+        return int.from_bytes(self.COUNTERS.unpack_from(self.counters)[1], "big")
+    
+    def _write_counters(self, sent, tokens):
+        self.COUNTERS.pack_into(self.counters, 0, sent, tokens.to_bytes(32, "big"))
+    
+    def record_airdrop(self, coin_addr, recipient, amount, tx_hash):
+        """Log one successful airdrop: bloom bit, counters and an event line"""
+        self.bloom.add(recipient)
+        self._write_counters(self.airdrops_sent + 1, self.total_tokens_distributed + amount)
+        try:
+            with open(self.events_file, 'ab') as f:
+                f.write(json_dumps({
+                    "time": time.time(),
+                    "coin": coin_addr,
+                    "recipient": recipient,
+                    "amount": str(amount),  # uint256, too wide for a JSON number
+                    "tx": tx_hash,
+                }) + b"\n")
+        except OSError:
+            pass
     
     def _load(self):
         try:
             if os.path.exists(self.filepath):
-                with open(self.filepath, 'r') as f:
-                    return json.load(f)
+                with open(self.filepath, 'rb') as f:
+                    return json_loads(f.read())
         except:
             pass
         return {
-            "airdrops_sent": 0,
-            "total_tokens_distributed": 0,
-            "recipients": [],
             "active_addresses": [],
+            "eoas": [],
             "last_scan_block": 0,
             "started_at": datetime.now().isoformat(),
         }
     
     def save(self):
         try:
-            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
-            with open(self.filepath, 'w') as f:
-                json.dump(self.data, f, indent=2)
+            self.data["eoas"] = sorted(self.eoas)
+            with open(self.filepath, 'wb') as f:
+                f.write(json_dumps(self.data, indent=True))
         except:
             pass
 
@@ -73,11 +258,22 @@ class AirdropState:
 class AirdropAgent:
     def __init__(self):
         self.name = "AIRDROP"
-        self.w3 = Web3(Web3.HTTPProvider(RPC_URL))
+        self.w3 = Web3(make_http_provider(RPC_URL))
         self.state = AirdropState(STATE_FILE)
         self.account = Account.from_key(AIRDROP_KEY)
+        self.nonces = NonceTracker(self.w3)
         self.deployment = self._load_deployment()
         self.coin_balances = {}  # Cache of our token balances
+        self.symbols = {}  # Coin symbols never change
+        self.coins = {}  # Coin contract instances by address
+        self.chain_id = None  # Fetched once, it never changes
+        self._factory_contract = None
+        self.contracts = set()  # Addresses known to have code
+        self._reader = MulticallReader(self.w3, MULTICALL3_ADDRESS, MULTICALL3_ABI, lambda msg: self.log(msg))
+        
+        # Shuffled never-airdropped EOAs from the last scan, popped as they're used
+        self.candidates = self._candidates(self.state.data["active_addresses"])
+        self.cycles_since_scan = 0
         
     def _load_deployment(self):
         try:
@@ -90,37 +286,153 @@ class AirdropAgent:
         timestamp = datetime.now().strftime("%H:%M:%S")
         print(f"[{timestamp}] 🎁 {self.name}: {msg}")
     
+    def _rpc_many(self, calls):
+        """
+        Run (method, params) calls in batches of BATCH_SIZE.
+        Falls back to parallel single calls if the node rejects batches.
+        Results are raw JSON-RPC values, None where a call failed.
+        """
+        results = []
+        try:
+            for i in range(0, len(calls), BATCH_SIZE):
+                results.extend(batch_request(self.w3, calls[i:i + BATCH_SIZE]))
+            return results
+        except Exception as e:
+            self.log(f"Batch request failed ({e}), falling back to parallel calls")
+        
+        def single(call):
+            try:
+                return self.w3.provider.make_request(*call).get("result")
+            except Exception:
+                return None
+        
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            return list(pool.map(single, calls))
+    
+    def _chain_id(self):
+        if self.chain_id is None:
+            self.chain_id = self.w3.eth.chain_id
+        return self.chain_id
+    
+    def _factory(self):
+        factory_addr = self.deployment.get("contracts", {}).get("CreatorCoinFactory", "")
+        if not factory_addr:
+            return None
+        if self._factory_contract is None:
+            self._factory_contract = self.w3.eth.contract(
+                address=Web3.to_checksum_address(factory_addr), abi=FACTORY_ABI
+            )
+        return self._factory_contract
+    
+    def _coin(self, coin_addr):
+        """Contract instance for a coin, built once per address"""
+        coin = self.coins.get(coin_addr)
+        if coin is None:
+            coin = self.coins[coin_addr] = self.w3.eth.contract(
+                address=Web3.to_checksum_address(coin_addr), abi=COIN_ABI
+            )
+        return coin
+    
+    @ttl_cache(ttl=TOTAL_COINS_TTL)
+    def _total_coins(self):
+        return self._factory().functions.totalCoins().call()
+    
+    def _symbol(self, coin):
+        symbol = self.symbols.get(coin.address)
+        if symbol is None:
+            symbol = self.symbols[coin.address] = coin.functions.symbol().call()
+        return symbol
+    
+    def _classify(self, addresses):
+        """Sort unseen addresses into EOAs and contracts with one code batch"""
+        unknown = [a for a in addresses if a not in self.state.eoas and a not in self.contracts]
+        codes = self._rpc_many([("eth_getCode", [addr, "latest"]) for addr in unknown])
+        for addr, code in zip(unknown, codes):
+            if code is None:
+                continue  # Lookup failed, retry next scan
+            if len(code) <= 2:  # EOA ("0x")
+                self.state.eoas.add(addr)
+            else:
+                self.contracts.add(addr)
+    
+    def _candidates(self, addresses):
+        fresh = [addr for addr in addresses if addr not in self.state.bloom]
+        random.shuffle(fresh)
+        return deque(fresh)
+    
+    def _transfer_log_addresses(self, block_nums):
+        """
+        Senders and receivers of ERC-20 Transfer events in one eth_getLogs
+        call over the span of block_nums. Raises if the node can't serve logs.
+        """
+        if not block_nums:
+            return set()
+        response = self.w3.provider.make_request("eth_getLogs", [{
+            "fromBlock": hex(min(block_nums)),
+            "toBlock": hex(max(block_nums)),
+            "topics": [TRANSFER_TOPIC],
+        }])
+        if "error" in response:
+            raise ValueError(response["error"].get("message", response["error"]))
+        
+        raw = set()
+        for entry in response["result"]:
+            topics = entry["topics"]
+            if len(topics) == 3:  # ERC-721 Transfer has a third indexed topic
+                raw.add("0x" + topics[1][-40:])
+                raw.add("0x" + topics[2][-40:])
+        for n in block_nums:
+            self.state.scanned_blocks.add(n)
+        return raw
+    
+    def _block_tx_addresses(self, block_nums):
+        """Fallback: from/to of every transaction in block_nums, fetched in batches"""
+        blocks = self._rpc_many([("eth_getBlockByNumber", [hex(n), True]) for n in block_nums])
+        for n, block in zip(block_nums, blocks):
+            if block:
+                self.state.scanned_blocks.add(n)
+        
+        txs = [tx for block in blocks if block for tx in block["transactions"]]
+        return {tx.get('from') for tx in txs} | {tx.get('to') for tx in txs}
+    
     def scan_active_addresses(self):
         """Scan recent blocks for active addresses"""
         try:
             current_block = self.w3.eth.block_number
             start_block = max(self.state.data["last_scan_block"], current_block - 100)
             
-            addresses = set(self.state.data["active_addresses"])
+            # Only fetch blocks not folded in by an earlier scan (including before a restart)
+            block_nums = [
+                n for n in range(start_block, current_block + 1)
+                if n not in self.state.scanned_blocks
+            ]
+            try:
+                raw = self._transfer_log_addresses(block_nums)
+            except Exception as e:
+                self.log(f"Log scan unavailable ({e}), scanning blocks")
+                raw = self._block_tx_addresses(block_nums)
             
-            for block_num in range(start_block, current_block + 1):
-                try:
-                    block = self.w3.eth.get_block(block_num, full_transactions=True)
-                    for tx in block.transactions:
-                        if tx.get('from'):
-                            addresses.add(tx['from'])
-                        if tx.get('to'):
-                            addresses.add(tx['to'])
-                except:
-                    continue
+            # Dedupe the raw lowercase hex first; checksumming costs a keccak per address
+            raw.discard(None)
+            raw.discard(ZERO_TOPIC_ADDRESS)  # Mints and burns
+            addresses = set(self.state.data["active_addresses"])
+            addresses.update(Web3.to_checksum_address(addr) for addr in raw)
             
-            # Filter out contract addresses and our own
-            filtered = []
-            for addr in addresses:
-                if addr and addr != self.account.address:
-                    code = self.w3.eth.get_code(Web3.to_checksum_address(addr))
-                    if len(code) <= 2:  # EOA
-                        filtered.append(addr)
+            # Filter out our own address, past recipients and contracts
+            candidates = [
+                addr for addr in addresses
+                if addr and addr != self.account.address and addr not in self.state.bloom
+            ]
+            self._classify(candidates)
+            filtered = [addr for addr in candidates if addr in self.state.eoas]
             
             self.state.data["active_addresses"] = filtered[:100]  # Keep top 100
             self.state.data["last_scan_block"] = current_block
             self.state.save()
             
+            self.candidates = self._candidates(self.state.data["active_addresses"])
+            self.cycles_since_scan = 0
+            
             self.log(f"Found {len(filtered)} active addresses")
             return filtered
         except Exception as e:
@@ -129,34 +441,36 @@ class AirdropAgent:
     
     def get_coins_with_balance(self):
         """Get coins where we have a balance"""
-        factory_addr = self.deployment.get("contracts", {}).get("CreatorCoinFactory", "")
-        if not factory_addr:
+        factory = self._factory()
+        if not factory:
             return []
         
         coins_with_balance = []
         
         try:
-            factory = self.w3.eth.contract(
-                address=Web3.to_checksum_address(factory_addr),
-                abi=FACTORY_ABI
+            total = self._total_coins()
+            
+            coin_addrs = self._reader.read([factory.functions.allCoins(i) for i in range(total)])
+            coins = [self._coin(coin_addr) for coin_addr in coin_addrs if coin_addr]
+            
+            # Balances plus any symbols we haven't seen yet, in one round-trip
+            unknown = [coin for coin in coins if coin.address not in self.symbols]
+            results = self._reader.read(
+                [coin.functions.balanceOf(self.account.address) for coin in coins]
+                + [coin.functions.symbol() for coin in unknown]
             )
-            total = factory.functions.totalCoins().call()
+            for coin, symbol in zip(unknown, results[len(coins):]):
+                if symbol is not None:
+                    self.symbols[coin.address] = symbol
             
-            for i in range(total):
-                coin_addr = factory.functions.allCoins(i).call()
-                coin = self.w3.eth.contract(
-                    address=Web3.to_checksum_address(coin_addr),
-                    abi=COIN_ABI
-                )
-                balance = coin.functions.balanceOf(self.account.address).call()
-                if balance > 0:
-                    symbol = coin.functions.symbol().call()
+            for coin, balance in zip(coins, results[:len(coins)]):
+                if balance and balance > 0:
                     coins_with_balance.append({
-                        "address": coin_addr,
-                        "symbol": symbol,
+                        "address": coin.address,
+                        "symbol": self.symbols.get(coin.address, "???"),
                         "balance": balance
                     })
-                    self.coin_balances[coin_addr] = balance
+                    self.coin_balances[coin.address] = balance
         except Exception as e:
             self.log(f"Error getting coins: {e}")
         
@@ -165,73 +479,98 @@ class AirdropAgent:
     def acquire_tokens(self, coin_addr):
         """Buy some tokens to airdrop"""
         try:
-            coin = self.w3.eth.contract(
-                address=Web3.to_checksum_address(coin_addr),
-                abi=COIN_ABI
-            )
+            coin = self._coin(coin_addr)
             
             amount = 0.02  # Buy 0.02 ETH worth
             
-            nonce = self.w3.eth.get_transaction_count(self.account.address)
+            nonce = self.nonces.next(self.account.address)
             tx = coin.functions.buy(0).build_transaction({
                 'from': self.account.address,
                 'nonce': nonce,
                 'value': self.w3.to_wei(amount, 'ether'),
                 'gas': 200000,
-                'chainId': 31337,
+                'chainId': self._chain_id(),
                 'maxFeePerGas': self.w3.to_wei(2, 'gwei'),
                 'maxPriorityFeePerGas': self.w3.to_wei(1, 'gwei'),
             })
             
             signed = self.w3.eth.account.sign_transaction(tx, self.account.key)
-            raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-            tx_hash = self.w3.eth.send_raw_transaction(raw)
-            self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            tx_hash = Web3.to_hex(self.w3.eth.send_raw_transaction(get_raw_tx(signed)))
+            receipt = wait_for_receipts(self.w3, [tx_hash]).get(tx_hash)
+            if receipt is None:
+                raise TimeoutError(f"buy {tx_hash} not mined")
+            if not receipt_ok(receipt):
+                self.log(f"Token buy {tx_hash} reverted")
+                return False
             
-            symbol = coin.functions.symbol().call()
-            self.log(f"Acquired ${symbol} tokens for airdrops")
+            self.log(f"Acquired ${self._symbol(coin)} tokens for airdrops")
             return True
         except Exception as e:
+            self.nonces.reset()  # Resync in case the tx never made it out
             self.log(f"Error acquiring tokens: {e}")
             return False
     
+    def _transfer_tx(self, coin_addr, recipient, amount, nonce):
+        """
+        ERC-20 transfer tx from a fixed template with hand-encoded calldata,
+        skipping web3's ABI encoding and transaction validation
+        """
+        data = (
+            TRANSFER_SELECTOR
+            + bytes.fromhex(recipient[2:]).rjust(32, b"\0")
+            + amount.to_bytes(32, "big")
+        )
+        return {**TRANSFER_TEMPLATE, 'chainId': self._chain_id(), 'to': coin_addr, 'nonce': nonce, 'data': data}
+    
     def send_airdrop(self, coin_addr, recipient, amount):
         """Send tokens to a recipient"""
+        return self.send_airdrops(coin_addr, [(recipient, amount)]) == 1
+    
+    def send_airdrops(self, coin_addr, drops):
+        """
+        Send several (recipient, amount) airdrops of one coin at once.
+        Transactions get sequential local nonces, are signed in parallel and
+        broadcast in one JSON-RPC batch; receipts are collected at the end.
+        Returns how many succeeded.
+        """
+        sent = 0
         try:
-            coin = self.w3.eth.contract(
-                address=Web3.to_checksum_address(coin_addr),
-                abi=COIN_ABI
-            )
+            coin = self._coin(coin_addr)
             
-            nonce = self.w3.eth.get_transaction_count(self.account.address)
-            tx = coin.functions.transfer(
-                Web3.to_checksum_address(recipient),
-                amount
-            ).build_transaction({
-                'from': self.account.address,
-                'nonce': nonce,
-                'gas': 100000,
-                'chainId': 31337,
-                'maxFeePerGas': self.w3.to_wei(2, 'gwei'),
-                'maxPriorityFeePerGas': self.w3.to_wei(1, 'gwei'),
-            })
+            txs = [
+                self._transfer_tx(coin.address, recipient, amount, self.nonces.next(self.account.address))
+                for recipient, amount in drops
+            ]
             
-            signed = self.w3.eth.account.sign_transaction(tx, self.account.key)
-            raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-            tx_hash = self.w3.eth.send_raw_transaction(raw)
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            with ThreadPoolExecutor(max_workers=len(txs)) as pool:
+                signed = list(pool.map(lambda tx: self.account.sign_transaction(tx), txs))
+            
+            # One round-trip for every send, in nonce order
+            results = batch_request(self.w3, [
+                ("eth_sendRawTransaction", [Web3.to_hex(get_raw_tx(s))]) for s in signed
+            ])
+            # Later sends were accepted behind any rejected nonce: fill the gaps so they still mine
+            gaps = [tx['nonce'] for tx, result in zip(txs, results) if result is None]
+            if not fill_nonce_gaps(self.w3, self.account.sign_transaction, self.account.address, gaps,
+                                   {**TRANSFER_TEMPLATE, 'chainId': self._chain_id()}):
+                self.nonces.reset()  # Couldn't fill a gap, resync from the node
+            
+            tx_hashes = [Web3.to_hex(s.hash) for s, result in zip(signed, results) if result]
+            receipts = wait_for_receipts(self.w3, tx_hashes)
             
-            if receipt.status == 1:
-                symbol = coin.functions.symbol().call()
-                self.log(f"🎁 Airdropped ${symbol} to {recipient[:10]}...")
-                self.state.data["airdrops_sent"] += 1
-                if recipient not in self.state.data["recipients"]:
-                    self.state.data["recipients"].append(recipient)
-                self.state.save()
-                return True
+            symbol = self._symbol(coin)
+            for (recipient, amount), s in zip(drops, signed):
+                tx_hash = Web3.to_hex(s.hash)
+                if receipt_ok(receipts.get(tx_hash)):
+                    self.log(f"🎁 Airdropped ${symbol} to {recipient[:10]}...")
+                    self.state.record_airdrop(coin.address, recipient, amount, tx_hash)
+                    sent += 1
+                else:
+                    self.log(f"Airdrop to {recipient[:10]}... failed")
         except Exception as e:
+            self.nonces.reset()  # Resync in case the txs never made it out
             self.log(f"Airdrop error: {e}")
-        return False
+        return sent
     
     def run_cycle(self):
         """Run one airdrop cycle"""
@@ -240,14 +579,10 @@ class AirdropAgent:
         
         # If no coins, try to acquire some
         if not coins:
-            factory_addr = self.deployment.get("contracts", {}).get("CreatorCoinFactory", "")
-            if factory_addr:
+            factory = self._factory()
+            if factory:
                 try:
-                    factory = self.w3.eth.contract(
-                        address=Web3.to_checksum_address(factory_addr),
-                        abi=FACTORY_ABI
-                    )
-                    total = factory.functions.totalCoins().call()
+                    total = self._total_coins()
                     if total > 0:
                         coin_addr = factory.functions.allCoins(random.randint(0, total-1)).call()
                         self.acquire_tokens(coin_addr)
@@ -255,26 +590,26 @@ class AirdropAgent:
                     pass
             return
         
-        # Get active addresses
-        addresses = self.state.data["active_addresses"]
-        if not addresses or random.random() < 0.1:  # 10% chance to rescan
-            addresses = self.scan_active_addresses()
+        # Refill candidates when they run low, and periodically regardless
+        self.cycles_since_scan += 1
+        if len(self.candidates) < AIRDROP_BATCH or self.cycles_since_scan >= RESCAN_EVERY:
+            self.scan_active_addresses()
         
-        if not addresses:
+        if not self.candidates:
             return
         
-        # Pick a coin and recipient
+        # Pick a coin and up to AIRDROP_BATCH recipients that haven't received yet
         coin = random.choice(coins)
-        recipient = random.choice(addresses)
-        
-        # Skip if already received
-        if recipient in self.state.data["recipients"]:
-            return
+        recipients = [self.candidates.pop() for _ in range(min(AIRDROP_BATCH, len(self.candidates)))]
         
-        # Airdrop 1-5% of our balance
-        airdrop_amount = int(coin["balance"] * random.uniform(0.01, 0.05))
-        if airdrop_amount > 0:
-            self.send_airdrop(coin["address"], recipient, airdrop_amount)
+        # Airdrop 1-5% of our balance to each
+        drops = [
+            (recipient, int(coin["balance"] * random.uniform(0.01, 0.05)))
+            for recipient in recipients
+        ]
+        drops = [(recipient, amount) for recipient, amount in drops if amount > 0]
+        if drops:
+            self.send_airdrops(coin["address"], drops)
     
     def run(self):
         """Main loop"""
@@ -7,6 +7,15 @@ from web3 import Web3
 from base_agent import BaseAgent
 from config import CONTRACTS, SIMPLE_AMM_ABI, AGENT_ORACLE_ABI, ERC20_ABI
 
+ETH_USD_PAIR = Web3.keccak(text="ETH/USD")
+
+# Fixed-point scales: USDC has 6 decimals, WETH 18, oracle prices 8
+USDC_UNIT = 10**6
+PRICE_FROM_RESERVES = 10**20  # 10^18 (WETH) / 10^6 (USDC) * 10^8 (price)
+USD_FROM_WETH_PRICE = 10**26  # 10^18 (WETH) * 10^8 (price)
+BPS = 10_000
+MAX_UINT256 = 2**256 - 1
+
 
 class ArbitrageAgent(BaseAgent):
     """Autonomous arbitrage agent - finds and executes profitable trades"""
@@ -14,7 +23,7 @@ class ArbitrageAgent(BaseAgent):
     def __init__(self):
         super().__init__(agent_type="arbitrage", loop_interval=5.0)
         
-        self.min_profit_percent = 0.5  # 0.5% minimum profit
+        self.min_profit_bps = 50  # 0.5% minimum profit
         self.max_trade_usdc = 1000 * 10**6  # Max 1000 USDC per trade
         
         self.amm_contract = None
@@ -23,6 +32,12 @@ class ArbitrageAgent(BaseAgent):
         self.weth_contract = None
         
         self.total_profit = 0
+        
+        # Known AMM allowance per token address; approvals are max-uint and reused
+        self._allowance_cache = {}
+        
+        # (block number, {"oracle", "reserve_a", "reserve_b", "amm"}) from the last read
+        self._block_cache = (None, {})
     
     def _init_contracts(self):
         """Initialize contract instances"""
@@ -31,28 +46,44 @@ class ArbitrageAgent(BaseAgent):
             self.oracle_contract = self.get_contract("AgentOracle", AGENT_ORACLE_ABI)
             self.usdc_contract = self.get_contract("MockUSDC", ERC20_ABI)
             self.weth_contract = self.get_contract("MockWETH", ERC20_ABI)
+            
+            # Bind the functions used every tick once
+            self._get_price = self.oracle_contract.functions.getPrice
+            self._reserve_a = self.amm_contract.functions.reserveA
+            self._reserve_b = self.amm_contract.functions.reserveB
+            self._get_amount_out = self.amm_contract.functions.getAmountOut
+            self._swap = self.amm_contract.functions.swap
+            self._approve_usdc = self.usdc_contract.functions.approve
+            self._approve_weth = self.weth_contract.functions.approve
+    
+    def _market_state(self) -> dict:
+        """Oracle price and AMM reserves, read in one round-trip once per block"""
+        block = self.w3.eth.block_number
+        if block != self._block_cache[0]:
+            oracle, reserve_a, reserve_b = self.read_many([
+                self._get_price(ETH_USD_PAIR),
+                self._reserve_a(),
+                self._reserve_b(),
+            ], block=block)
+            reserve_a = reserve_a or 0  # USDC (6 decimals)
+            reserve_b = reserve_b or 0  # WETH (18 decimals)
+            self._block_cache = (block, {
+                "oracle": oracle[0] if oracle else 0,  # (price, timestamp, isStale)
+                "reserve_a": reserve_a,
+                "reserve_b": reserve_b,
+                "amm": reserve_a * PRICE_FROM_RESERVES // reserve_b if reserve_a and reserve_b else 0,
+            })
+        return self._block_cache[1]
     
     def _get_oracle_price(self) -> int:
         """Get ETH/USD price from oracle (8 decimals)"""
-        pair_hash = Web3.keccak(text="ETH/USD")
-        result = self.call_contract(self.oracle_contract, "getPrice", pair_hash)
-        if result:
-            return result[0]  # (price, timestamp, isStale)
-        return 0
+        return self._market_state()["oracle"]
     
     def _get_amm_price(self) -> int:
         """Get ETH price from AMM reserves (18 decimals -> convert to 8)"""
-        reserve_a = self.call_contract(self.amm_contract, "reserveA")  # USDC (6 decimals)
-        reserve_b = self.call_contract(self.amm_contract, "reserveB")  # WETH (18 decimals)
-        
-        if not reserve_a or not reserve_b or reserve_b == 0:
-            return 0
-        
-        # Price = USDC per WETH, convert to 8 decimals
-        # USDC has 6 decimals, WETH has 18
+        # Price = USDC per WETH, convert to 8 decimals, computed once per block
         # price = (reserve_a * 10^18) / (reserve_b * 10^6) * 10^8
-        price = (reserve_a * 10**20) // reserve_b
-        return price
+        return self._market_state()["amm"]
     
     def _check_arbitrage(self) -> dict:
         """Check for arbitrage opportunity"""
@@ -62,60 +93,77 @@ class ArbitrageAgent(BaseAgent):
         if oracle_price == 0 or amm_price == 0:
             return None
         
-        # Calculate price difference
+        # Calculate price difference in basis points (integer math, no float roundoff)
         if amm_price > oracle_price:
             # AMM price higher than oracle -> sell WETH for USDC
-            diff_percent = ((amm_price - oracle_price) / oracle_price) * 100
+            diff_bps = ((amm_price - oracle_price) * BPS) // oracle_price
             direction = "sell_weth"
         else:
             # AMM price lower than oracle -> buy WETH with USDC  
-            diff_percent = ((oracle_price - amm_price) / oracle_price) * 100
+            diff_bps = ((oracle_price - amm_price) * BPS) // oracle_price
             direction = "buy_weth"
         
-        if diff_percent >= self.min_profit_percent:
+        if diff_bps >= self.min_profit_bps:
             return {
                 "direction": direction,
                 "oracle_price": oracle_price,
                 "amm_price": amm_price,
-                "diff_percent": diff_percent
+                "diff_percent": diff_bps / 100
             }
         
         return None
     
+    def _ensure_allowance(self, token_contract, approve, amount: int) -> bool:
+        """Approve the AMM for max-uint only when the known allowance is short"""
+        token = token_contract.address
+        allowance = self._allowance_cache.get(token)
+        if allowance is None or allowance < amount:
+            # Refresh from chain before paying for an approve
+            allowance = self.call_function(
+                token_contract.functions.allowance, self.address, CONTRACTS["SimpleAMM"]
+            ) or 0
+        
+        if allowance < amount:
+            approve_tx = self.build_function_tx(approve, CONTRACTS["SimpleAMM"], MAX_UINT256)
+            if not self.send_transaction(approve_tx):
+                self._allowance_cache.pop(token, None)
+                return False
+            allowance = MAX_UINT256
+        
+        self._allowance_cache[token] = allowance
+        return True
+    
+    def _spend_allowance(self, token_contract, amount: int):
+        token = token_contract.address
+        if token in self._allowance_cache:
+            self._allowance_cache[token] -= amount
+    
     def _execute_swap(self, direction: str) -> bool:
         """Execute swap transaction"""
         try:
             if direction == "buy_weth":
                 # Buy WETH with USDC
-                amount_in = min(self.max_trade_usdc, 100 * 10**6)  # 100 USDC
+                amount_in = min(self.max_trade_usdc, 100 * USDC_UNIT)  # 100 USDC
                 token_in = CONTRACTS["MockUSDC"]
                 
-                # Approve USDC
-                approve_tx = self.build_contract_tx(
-                    self.usdc_contract, "approve",
-                    CONTRACTS["SimpleAMM"], amount_in
-                )
-                self.send_transaction(approve_tx)
+                # Approve USDC (once, then reused)
+                if not self._ensure_allowance(self.usdc_contract, self._approve_usdc, amount_in):
+                    return False
                 
                 # Get expected output
-                amount_out = self.call_contract(
-                    self.amm_contract, "getAmountOut",
-                    token_in, amount_in
-                )
+                amount_out = self.call_function(self._get_amount_out, token_in, amount_in)
                 
                 if not amount_out or amount_out == 0:
                     return False
                 
                 # Execute swap with 1% slippage
                 min_out = int(amount_out * 0.99)
-                swap_tx = self.build_contract_tx(
-                    self.amm_contract, "swap",
-                    token_in, amount_in, min_out
-                )
+                swap_tx = self.build_function_tx(self._swap, token_in, amount_in, min_out)
                 result = self.send_transaction(swap_tx)
                 
                 if result:
-                    profit = (amount_out * self._get_oracle_price() // 10**26) - (amount_in // 10**6)
+                    self._spend_allowance(self.usdc_contract, amount_in)
+                    profit = amount_out * self._block_cache[1]["oracle"] // USD_FROM_WETH_PRICE - (amount_in // USDC_UNIT)
                     self.total_profit += profit
                     self.logger.info(f"Bought WETH, estimated profit: ${profit:.2f}")
                     return True
@@ -125,33 +173,25 @@ class ArbitrageAgent(BaseAgent):
                 amount_in = 10**16  # 0.01 WETH
                 token_in = CONTRACTS["MockWETH"]
                 
-                # Approve WETH
-                approve_tx = self.build_contract_tx(
-                    self.weth_contract, "approve",
-                    CONTRACTS["SimpleAMM"], amount_in
-                )
-                self.send_transaction(approve_tx)
+                # Approve WETH (once, then reused)
+                if not self._ensure_allowance(self.weth_contract, self._approve_weth, amount_in):
+                    return False
                 
                 # Get expected output
-                amount_out = self.call_contract(
-                    self.amm_contract, "getAmountOut",
-                    token_in, amount_in
-                )
+                amount_out = self.call_function(self._get_amount_out, token_in, amount_in)
                 
                 if not amount_out or amount_out == 0:
                     return False
                 
                 # Execute swap
                 min_out = int(amount_out * 0.99)
-                swap_tx = self.build_contract_tx(
-                    self.amm_contract, "swap",
-                    token_in, amount_in, min_out
-                )
+                swap_tx = self.build_function_tx(self._swap, token_in, amount_in, min_out)
                 result = self.send_transaction(swap_tx)
                 
                 if result:
-                    expected_value = (amount_in * self._get_oracle_price()) // 10**26
-                    profit = (amount_out // 10**6) - expected_value
+                    self._spend_allowance(self.weth_contract, amount_in)
+                    expected_value = amount_in * self._block_cache[1]["oracle"] // USD_FROM_WETH_PRICE
+                    profit = (amount_out // USDC_UNIT) - expected_value
                     self.total_profit += profit
                     self.logger.info(f"Sold WETH, estimated profit: ${profit:.2f}")
                     return True
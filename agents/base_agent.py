@@ -3,13 +3,15 @@ Thryx Base Agent
 Common functionality for all autonomous agents
 """
 import time
+import asyncio
 import logging
 from abc import ABC, abstractmethod
 from typing import Optional, Any
-from web3 import Web3
+from web3 import Web3, AsyncWeb3, WebsocketProviderV2
 from eth_account import Account
 
-from config import RPC_URL, AGENT_PRIVATE_KEYS, CONTRACTS
+from config import RPC_URL, WS_URL, AGENT_PRIVATE_KEYS, CONTRACTS, MULTICALL3_ADDRESS, MULTICALL3_ABI
+from chain_utils import NonceTracker, ReceiptWatcher, MulticallReader, receipt_ok, get_raw_tx
 
 # Configure logging
 logging.basicConfig(
@@ -38,6 +40,18 @@ class BaseAgent(ABC):
         self.account = Account.from_key(private_key)
         self.address = self.account.address
         
+        # Nonces are fetched once, then counted locally
+        self.nonces = NonceTracker(self.w3)
+        
+        # Receipts from newHeads when WS_URL is set, batched polling otherwise
+        self.receipts = ReceiptWatcher(self.w3, WS_URL)
+        
+        # Fetched once the RPC is reachable, it never changes
+        self.chain_id = None
+        
+        # Multicall3 (or batched eth_call) reads, probed on first read_many()
+        self._reader = MulticallReader(self.w3, MULTICALL3_ADDRESS, MULTICALL3_ABI, self.logger.warning)
+        
         # Stats
         self.tx_count = 0
         self.error_count = 0
@@ -59,6 +73,8 @@ class BaseAgent(ABC):
         """Wait for RPC to become available"""
         for i in range(max_retries):
             if self.connect():
+                self.chain_id = self.w3.eth.chain_id
+                self.receipts.start()
                 return True
             self.logger.info(f"Waiting for RPC... ({i+1}/{max_retries})")
             time.sleep(delay)
@@ -71,12 +87,19 @@ class BaseAgent(ABC):
             raise ValueError(f"Contract {name} not found in deployment")
         return self.w3.eth.contract(address=address, abi=abi)
     
+    def _next_nonce(self) -> int:
+        """Next nonce for this agent, without an RPC after the first call"""
+        return self.nonces.next(self.address)
+    
     def send_transaction(self, tx: dict, max_retries: int = 3) -> Optional[str]:
-        """Send a signed transaction with retry logic"""
+        """
+        Send a signed transaction, retrying failures up to the broadcast.
+        A broadcast transaction is never rebuilt (a fresh nonce could run it
+        twice); if it stays unmined, the same signed bytes are rebroadcast.
+        """
         for attempt in range(max_retries):
             try:
-                # Add nonce and gas - use web3.py v6 compatible keys
-                tx['nonce'] = self.w3.eth.get_transaction_count(self.address)
+                # Add gas - use web3.py v6 compatible keys
                 tx['from'] = self.address
                 
                 if 'gas' not in tx:
@@ -88,44 +111,80 @@ class BaseAgent(ABC):
                     tx['maxFeePerGas'] = base_fee * 2
                     tx['maxPriorityFeePerGas'] = self.w3.to_wei(1, 'gwei')
                 
-                # Sign and send
-                signed = self.account.sign_transaction(tx)
-                tx_hash = self.w3.eth.send_raw_transaction(signed.rawTransaction)
-                
-                # Wait for receipt
-                receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=30)
-                
-                if receipt['status'] == 1:
-                    self.tx_count += 1
-                    self.logger.info(f"TX successful: {tx_hash.hex()[:16]}...")
-                    return tx_hash.hex()
-                else:
-                    self.logger.warning(f"TX reverted: {tx_hash.hex()[:16]}...")
-                    return None
-                    
+                # Sign and send; the nonce is taken last so a failed estimate doesn't burn one
+                tx['nonce'] = self._next_nonce()
+                raw_tx = get_raw_tx(self.account.sign_transaction(tx))
+                try:
+                    tx_hash = self.w3.eth.send_raw_transaction(raw_tx)
+                except Exception:
+                    # e.g. "nonce too low" / "already known": resync from the node
+                    self.nonces.reset(self.address)
+                    raise
+                break
             except Exception as e:
                 self.error_count += 1
                 self.logger.warning(f"TX attempt {attempt+1} failed: {e}")
                 if attempt < max_retries - 1:
                     time.sleep(1)
+        else:
+            return None
+        
+        # Wait for receipt, rebroadcasting the same transaction between waits
+        for attempt in range(max_retries):
+            receipt = self.receipts.wait(tx_hash, timeout=30)
+            if receipt is not None:
+                break
+            if attempt < max_retries - 1:
+                self.logger.warning(f"No receipt for {tx_hash.hex()[:16]}... after 30s, rebroadcasting")
+                try:
+                    self.w3.eth.send_raw_transaction(raw_tx)
+                except Exception:
+                    pass  # "already known" while it is still in the pool
+        else:
+            self.error_count += 1
+            self.logger.warning(f"TX {tx_hash.hex()[:16]}... still unmined, giving up")
+            # If it was dropped, later local nonces would queue behind the gap: resync from the node
+            self.nonces.reset(self.address)
+            return None
         
+        if receipt_ok(receipt):
+            self.tx_count += 1
+            self.logger.info(f"TX successful: {tx_hash.hex()[:16]}...")
+            return tx_hash.hex()
+        self.logger.warning(f"TX reverted: {tx_hash.hex()[:16]}...")
         return None
     
     def call_contract(self, contract: Any, function_name: str, *args) -> Any:
         """Call a contract view function"""
+        return self.call_function(getattr(contract.functions, function_name), *args)
+    
+    def call_function(self, func: Any, *args) -> Any:
+        """Call a pre-bound contract view function, e.g. contract.functions.getPrice"""
         try:
-            func = getattr(contract.functions, function_name)
             return func(*args).call()
         except Exception as e:
-            self.logger.error(f"Contract call {function_name} failed: {e}")
+            self.logger.error(f"Contract call {func.fn_name} failed: {e}")
             return None
     
+    def read_many(self, contract_calls: list, block: Any = "latest") -> list:
+        """
+        Run several view calls in one round-trip: through Multicall3 when the
+        chain has it deployed, otherwise as a JSON-RPC batch of eth_calls.
+        Failed calls come back as None.
+        """
+        return self._reader.read(contract_calls, block)
+    
     def build_contract_tx(self, contract: Any, function_name: str, *args) -> dict:
         """Build a transaction for a contract function"""
-        func = getattr(contract.functions, function_name)
+        return self.build_function_tx(getattr(contract.functions, function_name), *args)
+    
+    def build_function_tx(self, func: Any, *args) -> dict:
+        """Build a transaction for a pre-bound contract function"""
+        if self.chain_id is None:  # Built before wait_for_rpc()
+            self.chain_id = self.w3.eth.chain_id
         return func(*args).build_transaction({
             'from': self.address,
-            'chainId': self.w3.eth.chain_id,
+            'chainId': self.chain_id,
         })
     
     @abstractmethod
@@ -138,6 +197,15 @@ class BaseAgent(ABC):
         self.logger.info("Starting autonomous loop...")
         self.wait_for_rpc()
         
+        if WS_URL:
+            try:
+                asyncio.run(self.run_event_driven(WS_URL))
+            except KeyboardInterrupt:
+                self.logger.info("Shutting down...")
+                return
+            except Exception as e:
+                self.logger.warning(f"Websocket loop stopped ({e}), falling back to polling")
+        
         while True:
             try:
                 self.execute()
@@ -150,6 +218,41 @@ class BaseAgent(ABC):
             
             time.sleep(self.loop_interval)
     
+    async def run_event_driven(self, ws_url: str):
+        """
+        Run execute() once per new block from a newHeads subscription.
+        Heads that arrive while execute() is busy are coalesced, so the
+        next run always sees the latest block.
+        """
+        new_head = asyncio.Event()
+        
+        async with AsyncWeb3.persistent_websocket(WebsocketProviderV2(ws_url)) as ws_w3:
+            await ws_w3.eth.subscribe("newHeads")
+            self.logger.info(f"Subscribed to new blocks at {ws_url}")
+            
+            async def listen():
+                try:
+                    async for _ in ws_w3.ws.process_subscriptions():
+                        new_head.set()
+                finally:
+                    new_head.set()  # Wake the loop so it notices
+            
+            listener = asyncio.create_task(listen())
+            try:
+                while True:
+                    await new_head.wait()
+                    new_head.clear()
+                    if listener.done():
+                        break
+                    try:
+                        await asyncio.to_thread(self.execute)
+                    except Exception as e:
+                        self.error_count += 1
+                        self.logger.error(f"Error in main loop: {e}")
+                listener.result()  # Surface why the subscription ended
+            finally:
+                listener.cancel()
+    
     def get_stats(self) -> dict:
         """Get agent statistics"""
         uptime = time.time() - self.start_time
@@ -10,14 +10,29 @@ Supports:
 - USDC deposits -> USDC on THRYX (1:1)
 """
 import os
+import sys
 import time
 import json
-from datetime import datetime
+import queue
+import atexit
+import sqlite3
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import requests
 from web3 import Web3
 from eth_account import Account
+from chain_utils import (
+    batch_request, make_http_provider, get_raw_tx, receipt_ok, fill_nonce_gaps, json_dumps,
+    NonceTracker, TokenBucket, TxSigner,
+)
 
 # Configuration from environment
 BASE_RPC = os.getenv("BASE_RPC", "https://mainnet.base.org")
+BASE_RPC_TIMEOUT = 15  # seconds
+BASE_RPC_RETRIES = 3  # Connection failures and 429/5xx from the public endpoint
 THRYX_RPC = os.getenv("RPC_URL", "http://localhost:8545")
 BASE_PRIVATE_KEY = os.getenv("BASE_PRIVATE_KEY", "")
 THRYX_MINTER_KEY = os.getenv("THRYX_MINTER_KEY", "")
@@ -25,110 +40,292 @@ THRYX_MINTER_KEY = os.getenv("THRYX_MINTER_KEY", "")
 # USDC on Base (official contract)
 BASE_USDC_ADDRESS = "0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913"
 
-# State file for persistence
+# Optional rotating log file, in addition to stdout
+LOG_FILE = os.getenv("BRIDGE_LOG_FILE", "")
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+# Deposit database (SQLite in WAL mode)
+DB_FILE = os.getenv("BRIDGE_DB_FILE", "/app/bridge.db")
+FALLBACK_DB_FILE = "bridge.db"
+
+# JSON state file written before the database, imported on first start
 STATE_FILE = os.getenv("BRIDGE_STATE_FILE", "/app/bridge_deposit_state.json")
 FALLBACK_STATE_FILE = "bridge_deposit_state.json"
 
+# Transfer(address,address,uint256)
+TRANSFER_TOPIC0 = Web3.to_hex(Web3.keccak(text="Transfer(address,address,uint256)"))
+
+# Max JSON-RPC calls per batch request
+BATCH_SIZE = 25
+
+# THRYX mint transactions; only recipient, amount and nonce vary per deposit
+MINT_SELECTOR = Web3.keccak(text="mint(address,uint256)")[:4]
+MINT_TEMPLATE = {
+    'type': 2,
+    'value': 0,
+    'gas': 100000,
+    'chainId': 31337,
+    'maxFeePerGas': Web3.to_wei(2, 'gwei'),
+    'maxPriorityFeePerGas': Web3.to_wei(1, 'gwei'),
+}
+ETH_TRANSFER_TEMPLATE = {**MINT_TEMPLATE, 'gas': 21000}
+
+# Send errors that mean the locally cached minter nonce is stale
+NONCE_ERROR_HINTS = ("nonce too low", "nonce too high", "already known", "known transaction", "replacement transaction")
+
 # Security limits
 MAX_DEPOSIT_PER_TX = 10.0  # ETH
 MAX_DEPOSIT_PER_DAY = 50.0  # ETH per address
 LOOKBACK_BLOCKS = 10000  # How far back to scan on startup (increased to catch older deposits)
+MINT_BURST = 5  # THRYX mints sent back-to-back before pacing kicks in
+MINT_RATE = 1.0  # Sustained THRYX mints per second
+POLL_INTERVAL = 10  # Seconds between Base scans once caught up with the tip
+STATE_FLUSH_INTERVAL = 30  # Seconds between write-behind saves of scan progress
+PROCESSED_CACHE_SIZE = 4096  # Recently seen tx hashes answered without a database lookup
+DAILY_TOTALS_DAYS = 2  # Days of per-address totals kept for rate limiting
+
+# Adaptive scan range: halve on provider timeouts/limits, grow 1.5x on success
+INITIAL_SCAN_STRIDE = 500
+MIN_SCAN_STRIDE = 10
+MAX_SCAN_STRIDE = 10000
+RANGE_ERROR_HINTS = ("timeout", "timed out", "too many", "too large", "more than", "limit", "exceed", "range", "503")
+
+
+log = logging.getLogger("BRIDGE")
+
+
+def setup_logging():
+    """
+    Route bridge logs through a queue: callers only enqueue the record and a
+    listener thread formats and writes it to stdout (and LOG_FILE if set).
+    """
+    if log.handlers:
+        return
+    
+    formatter = logging.Formatter('[%(name)s] %(asctime)s - %(message)s', datefmt='%H:%M:%S')
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE:
+        handlers.append(RotatingFileHandler(LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers)
+    listener.start()
+    atexit.register(listener.stop)  # Drain queued records on exit
+    
+    log.addHandler(QueueHandler(records))
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+
+def is_range_error(e: Exception) -> bool:
+    """True if a provider rejected or timed out on a block range that was too large"""
+    if isinstance(e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(e, requests.exceptions.HTTPError):
+        return True
+    return isinstance(e, ValueError) and any(hint in str(e).lower() for hint in RANGE_ERROR_HINTS)
+
+
+def tx_key(tx_hash) -> bytes:
+    """Packed 32-byte form of a tx hash, as stored in the processed table"""
+    if isinstance(tx_hash, bytes):
+        return tx_hash
+    return bytes.fromhex(tx_hash[2:] if tx_hash.startswith("0x") else tx_hash)
 
 
 class BridgeState:
-    """Persistent state management for deposit tracking"""
+    """
+    Persistent state management for deposit tracking, backed by SQLite.
+    Each processed deposit is one small committed transaction, so writes
+    cost the same however long the history grows; rate-limit totals are
+    indexed point lookups instead of a walk over in-memory dicts.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS processed (tx_hash BLOB PRIMARY KEY, block INTEGER, ts INTEGER);
+        CREATE TABLE IF NOT EXISTS deposits (
+            tx_hash BLOB PRIMARY KEY, sender BLOB, token TEXT, amount REAL, processed_at TEXT, info TEXT
+        );
+        CREATE TABLE IF NOT EXISTS daily (sender BLOB, day TEXT, amount REAL, PRIMARY KEY (sender, day));
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+    """
     
     def __init__(self):
-        self.state_file = STATE_FILE if os.path.exists(os.path.dirname(STATE_FILE) or '.') else FALLBACK_STATE_FILE
-        self.state = self._load_state()
+        self.db_file = DB_FILE if os.path.exists(os.path.dirname(DB_FILE) or '.') else FALLBACK_DB_FILE
+        self._today_str, self._day_ends = None, 0.0
+        self._pruned_for = None  # Day daily totals were last pruned on
+        self._recent = OrderedDict()  # LRU of processed tx hashes
+        
+        self.db = sqlite3.connect(self.db_file)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent on crash; fsync at checkpoints only
+        if self.db.execute("PRAGMA user_version").fetchone()[0] == 0:
+            with self.db:
+                self.db.executescript(self.SCHEMA)
+                self._import_legacy_state()
+                self.db.execute("PRAGMA user_version = 1")
+        
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'last_block'").fetchone()
+        self._last_block = row[0] if row else 0
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self.stats = self._load_stats()
+        self._prune_daily_totals()
     
-    def _load_state(self) -> dict:
-        """Load state from file"""
+    def _import_legacy_state(self):
+        """Import the JSON state file used before the database"""
+        state_file = STATE_FILE if os.path.exists(os.path.dirname(STATE_FILE) or '.') else FALLBACK_STATE_FILE
         try:
-            with open(self.state_file, 'r') as f:
-                data = json.load(f)
-                # Convert processed_txs list back to set
-                data['processed_txs'] = set(data.get('processed_txs', []))
-                return data
-        except:
-            return {
-                "processed_txs": set(),
-                "last_block": 0,
-                "deposits": [],
-                "daily_totals": {},
-                "stats": {
-                    "total_deposits": 0,
-                    "total_eth_bridged": 0,
-                    "total_usdc_bridged": 0
-                }
-            }
+            with open(state_file, 'r') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            log.warning(f"Warning: Could not read state {state_file}: {e}")
+            return
+        
+        deposits = [d for d in snapshot.get('deposits', []) if d.get("tx_hash")]
+        log.info(f"Importing {len(deposits)} deposits from {state_file} into {self.db_file}")
+        for deposit in deposits:
+            self._insert_deposit(deposit["tx_hash"], deposit)
+        # Hashes whose deposit records were dropped from the capped state file
+        self.db.executemany(
+            "INSERT OR IGNORE INTO processed (tx_hash) VALUES (?)",
+            ((tx_key(h),) for h in snapshot.get('processed_txs', []))
+        )
+        self.db.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('last_block', ?)", (snapshot.get("last_block", 0),)
+        )
+    
+    def _load_stats(self) -> dict:
+        """Bridge totals, summed once at startup and kept current by mark_processed"""
+        stats = {"total_deposits": 0, "total_eth_bridged": 0, "total_usdc_bridged": 0}
+        for token, count, amount in self.db.execute(
+            "SELECT token, COUNT(*), SUM(amount) FROM deposits GROUP BY token"
+        ):
+            stats["total_deposits"] += count
+            stats["total_eth_bridged" if token == "ETH" else "total_usdc_bridged"] += amount or 0
+        return stats
+    
+    def history(self):
+        """Yield every processed deposit, oldest first"""
+        for tx_hash, info in self.db.execute("SELECT tx_hash, info FROM deposits ORDER BY rowid"):
+            yield "0x" + tx_hash.hex(), json.loads(info)  # stdlib keeps wide wei amounts exact
     
-    def _save_state(self):
-        """Save state to file"""
+    def flush_if_needed(self, force: bool = False):
+        """Save scan progress if forced, or if it changed and STATE_FLUSH_INTERVAL has passed"""
+        now = time.monotonic()
+        if not (force or (self._dirty and now - self._last_flush > STATE_FLUSH_INTERVAL)):
+            return
+        
         try:
-            # Convert set to list for JSON serialization
-            save_data = {
-                **self.state,
-                "processed_txs": list(self.state["processed_txs"]),
-                "last_saved": datetime.now().isoformat()
-            }
-            with open(self.state_file, 'w') as f:
-                json.dump(save_data, f, indent=2, default=str)
-        except Exception as e:
-            print(f"[BRIDGE] Warning: Could not save state: {e}")
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('last_block', ?)", (self._last_block,))
+            self._dirty = False
+            self._last_flush = now
+        except sqlite3.Error as e:
+            log.warning(f"Warning: Could not save state: {e}")
+    
+    def _remember(self, key: bytes):
+        """Add a processed hash to the LRU"""
+        self._recent[key] = None
+        self._recent.move_to_end(key)
+        if len(self._recent) > PROCESSED_CACHE_SIZE:
+            self._recent.popitem(last=False)
     
     def is_processed(self, tx_hash: str) -> bool:
         """Check if transaction was already processed"""
-        return tx_hash in self.state["processed_txs"]
+        key = tx_key(tx_hash)
+        if key in self._recent:
+            return True
+        if self.db.execute("SELECT 1 FROM processed WHERE tx_hash = ? LIMIT 1", (key,)).fetchone():
+            self._remember(key)
+            return True
+        return False
     
     def mark_processed(self, tx_hash: str, deposit_info: dict):
-        """Mark a transaction as processed and save"""
-        self.state["processed_txs"].add(tx_hash)
-        self.state["deposits"].append({
+        """Mark a transaction as processed and record the deposit"""
+        deposit = {
             **deposit_info,
             "processed_at": datetime.now().isoformat()
-        })
+        }
+        # Committed immediately: losing a processed mark would re-mint on restart
+        with self.db:
+            self._insert_deposit(tx_hash, deposit)
+        self._remember(tx_key(tx_hash))
         
         # Update stats
-        self.state["stats"]["total_deposits"] += 1
-        if deposit_info.get("token") == "ETH":
-            self.state["stats"]["total_eth_bridged"] += deposit_info.get("amount_eth", 0)
+        self.stats["total_deposits"] += 1
+        if deposit.get("token") == "ETH":
+            self.stats["total_eth_bridged"] += deposit.get("amount_eth", 0)
         else:
-            self.state["stats"]["total_usdc_bridged"] += deposit_info.get("amount_usdc", 0)
+            self.stats["total_usdc_bridged"] += deposit.get("amount_usdc", 0)
         
-        # Update daily totals
-        today = datetime.now().strftime("%Y-%m-%d")
-        sender = deposit_info.get("from", "").lower()
-        if sender:
-            if sender not in self.state["daily_totals"]:
-                self.state["daily_totals"][sender] = {}
-            current = self.state["daily_totals"][sender].get(today, 0)
-            self.state["daily_totals"][sender][today] = current + deposit_info.get("amount_eth", 0)
+        # New totals are always recent, so old ones only need dropping once a day
+        if self._pruned_for != self._today():
+            self._prune_daily_totals()
+    
+    def _insert_deposit(self, tx_hash: str, deposit: dict):
+        """Write a processed deposit and its daily total; caller owns the transaction"""
+        key = tx_key(tx_hash)
+        token = deposit.get("token", "ETH")
+        sender = deposit.get("from", "")
+        sender = bytes.fromhex(sender[2:]) if sender else None
+        amount = deposit.get("amount_eth" if token == "ETH" else "amount_usdc", 0)
         
-        self._save_state()
+        self.db.execute(
+            "INSERT OR IGNORE INTO processed VALUES (?, ?, ?)",
+            (key, deposit.get("block"), int(time.time()))
+        )
+        self.db.execute(
+            "INSERT OR REPLACE INTO deposits VALUES (?, ?, ?, ?, ?, ?)",
+            (key, sender, token, amount, deposit["processed_at"], json_dumps(deposit).decode())
+        )
+        if sender:
+            self.db.execute(
+                "INSERT INTO daily VALUES (?, ?, ?) "
+                "ON CONFLICT (sender, day) DO UPDATE SET amount = amount + excluded.amount",
+                (sender, deposit["processed_at"][:10], deposit.get("amount_eth", 0))
+            )
+    
+    def _today(self) -> str:
+        """Today's date as YYYY-MM-DD, reformatted only when the day rolls over"""
+        if time.time() >= self._day_ends:
+            now = datetime.now()
+            self._today_str = now.strftime("%Y-%m-%d")
+            self._day_ends = datetime.combine(now.date() + timedelta(days=1), datetime.min.time()).timestamp()
+        return self._today_str
+    
+    def _prune_daily_totals(self):
+        """Drop per-address totals older than the rate-limit window"""
+        self._pruned_for = self._today()
+        cutoff = (datetime.now() - timedelta(days=DAILY_TOTALS_DAYS)).strftime("%Y-%m-%d")
+        with self.db:
+            self.db.execute("DELETE FROM daily WHERE day < ?", (cutoff,))
     
     def get_last_block(self) -> int:
         """Get last processed block number"""
-        return self.state.get("last_block", 0)
+        return self._last_block
     
     def set_last_block(self, block: int):
-        """Update last processed block"""
-        self.state["last_block"] = block
-        self._save_state()
+        """Update last processed block; written out by flush_if_needed"""
+        self._last_block = block
+        self._dirty = True
     
     def get_daily_total(self, address: str) -> float:
         """Get total deposited today by address"""
-        address = address.lower()
-        today = datetime.now().strftime("%Y-%m-%d")
-        
-        if address not in self.state["daily_totals"]:
-            return 0.0
-        
-        return self.state["daily_totals"][address].get(today, 0.0)
+        row = self.db.execute(
+            "SELECT amount FROM daily WHERE sender = ? AND day = ?",
+            (bytes.fromhex(address[2:]), self._today())
+        ).fetchone()
+        return row[0] if row else 0.0
     
     def get_stats(self) -> dict:
         """Get bridge statistics"""
-        return self.state["stats"]
+        return self.stats
 
 
 def load_deployment():
@@ -152,39 +349,61 @@ class BridgeAgent:
     
     def __init__(self):
         self.name = "BRIDGE"
+        setup_logging()
+        self.log = log
         
         # Initialize persistent state
         self.state = BridgeState()
         
+        # Blocks covered per deposit scan, adapted to the provider
+        self.scan_stride = INITIAL_SCAN_STRIDE
+        self.min_stride, self.max_stride = MIN_SCAN_STRIDE, MAX_SCAN_STRIDE
+        
+        # Latest Base head seen, and (block, balance, nonce) of the bridge
+        # wallet at the last scanned block so the next range can reuse it
+        self.base_head = None
+        self._wallet_at = None
+        
         # Connect to Base
-        self.base_w3 = Web3(Web3.HTTPProvider(BASE_RPC))
-        print(f"[{self.name}] Connected to Base: {self.base_w3.is_connected()}")
+        self.base_w3 = Web3(make_http_provider(BASE_RPC, timeout=BASE_RPC_TIMEOUT, retries=BASE_RPC_RETRIES))
+        self.log.info(f"Connected to Base: {self.base_w3.is_connected()}")
         
         # Connect to THRYX
-        self.thryx_w3 = Web3(Web3.HTTPProvider(THRYX_RPC))
-        print(f"[{self.name}] Connected to THRYX: {self.thryx_w3.is_connected()}")
+        self.thryx_w3 = Web3(make_http_provider(THRYX_RPC))
+        self.log.info(f"Connected to THRYX: {self.thryx_w3.is_connected()}")
         
         # Load Base wallet
         if BASE_PRIVATE_KEY:
             self.base_account = Account.from_key(BASE_PRIVATE_KEY)
-            print(f"[{self.name}] Base wallet: {self.base_account.address}")
+            self.log.info(f"Base wallet: {self.base_account.address}")
+            # Raw 20 bytes, compared against tx recipients without case folding
+            self._bridge_bytes = bytes.fromhex(self.base_account.address[2:])
             
             balance = self.base_w3.eth.get_balance(self.base_account.address)
-            print(f"[{self.name}] Base ETH balance: {self.base_w3.from_wei(balance, 'ether')} ETH")
+            self.log.info(f"Base ETH balance: {self.base_w3.from_wei(balance, 'ether')} ETH")
         else:
-            print(f"[{self.name}] WARNING: No BASE_PRIVATE_KEY set")
+            self.log.warning("WARNING: No BASE_PRIVATE_KEY set")
             self.base_account = None
         
         # Load THRYX minter from environment
         if THRYX_MINTER_KEY:
             self.thryx_minter = Account.from_key(THRYX_MINTER_KEY)
-            print(f"[{self.name}] THRYX minter loaded from environment")
+            self.log.info("THRYX minter loaded from environment")
         else:
             # Fallback to Hardhat account 0 for local testing only
             # In production, this MUST be set via environment variable
             default_key = os.getenv("HARDHAT_ACCOUNT_0", "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80")
             self.thryx_minter = Account.from_key(default_key)
-            print(f"[{self.name}] WARNING: Using default Hardhat account (local testing only)")
+            self.log.warning("WARNING: Using default Hardhat account (local testing only)")
+        
+        # Minter nonces are tracked locally, fetched from the node only on first use or after a reset
+        self.nonces = NonceTracker(self.thryx_w3)
+        self._minter_signer = TxSigner(self.thryx_minter.key)
+        self._mint_bucket = TokenBucket(capacity=MINT_BURST, refill_rate=MINT_RATE)
+        # Allowed deposits whose mint wasn't sent; the scan has moved past them, so retry from here
+        self._unminted = []
+        # EIP-55 forms of depositor addresses, keyed by lowercase hex
+        self._checksum_cache = {}
         
         # Load THRYX deployment
         self.deployment = load_deployment()
@@ -208,7 +427,11 @@ class BridgeAgent:
             )
             if self.base_account:
                 usdc_balance = self.base_usdc.functions.balanceOf(self.base_account.address).call()
-                print(f"[{self.name}] Base USDC balance: {usdc_balance / 1e6} USDC")
+                self.log.info(f"Base USDC balance: {usdc_balance / 1e6} USDC")
+            
+            # Padded bridge address for the Transfer `to` topic, built once
+            if self.base_account:
+                self._bridge_topic = "0x" + self.base_account.address[2:].lower().rjust(64, "0")
         
         # USDC ABI for minting on THRYX
         self.usdc_abi = [
@@ -217,11 +440,24 @@ class BridgeAgent:
             {"inputs": [{"name": "account", "type": "address"}], "name": "balanceOf", 
              "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
         ]
+        self.thryx_usdc = self.thryx_w3.eth.contract(
+            address=Web3.to_checksum_address(self.usdc_address),
+            abi=self.usdc_abi
+        ) if self.usdc_address else None
+        self._thryx_usdc_cs_addr = self.thryx_usdc.address if self.thryx_usdc else None
         
         # Print stats
         stats = self.state.get_stats()
-        print(f"[{self.name}] Historical stats: {stats['total_deposits']} deposits, "
-              f"{stats['total_eth_bridged']:.4f} ETH, {stats['total_usdc_bridged']:.2f} USDC bridged")
+        self.log.info(f"Historical stats: {stats['total_deposits']} deposits, "
+                      f"{stats['total_eth_bridged']:.4f} ETH, {stats['total_usdc_bridged']:.2f} USDC bridged")
+    
+    def _cs(self, address: str) -> str:
+        """Checksummed address, computed once per depositor"""
+        key = address.lower()
+        cs = self._checksum_cache.get(key)
+        if cs is None:
+            cs = self._checksum_cache[key] = Web3.to_checksum_address(key)
+        return cs
     
     def check_rate_limits(self, sender: str, amount_eth: float) -> tuple:
         """Check if deposit is within rate limits"""
@@ -237,143 +473,323 @@ class BridgeAgent:
         
         return True, "OK"
     
+    def _wallet_changed_blocks(self, from_block: int, to_block: int, before: tuple, after: tuple) -> list:
+        """
+        Blocks in [from_block, to_block] where the bridge wallet's balance or
+        nonce changed, found by bisecting on its (balance, nonce) at interval
+        midpoints with one batched request per level. An interval the node
+        can't answer for (no historical state) is returned whole.
+        """
+        address = self.base_account.address
+        changed = []
+        # (first block, last block, wallet before first, wallet after last)
+        intervals = [(from_block, to_block, before, after)]
+        while intervals:
+            changed += [lo for lo, hi, _, _ in intervals if lo == hi]
+            intervals = [interval for interval in intervals if interval[0] < interval[1]]
+            if not intervals:
+                break
+            
+            mids = [(lo + hi) // 2 for lo, hi, _, _ in intervals]
+            results = batch_request(self.base_w3, [
+                call for mid in mids for call in (
+                    ("eth_getBalance", [address, hex(mid)]),
+                    ("eth_getTransactionCount", [address, hex(mid)]),
+                )
+            ])
+            
+            halves = []
+            for i, ((lo, hi, wallet_lo, wallet_hi), mid) in enumerate(zip(intervals, mids)):
+                wallet_mid = tuple(results[2 * i:2 * i + 2])
+                if None in wallet_mid:
+                    changed += range(lo, hi + 1)
+                    continue
+                if wallet_mid != wallet_lo:
+                    halves.append((lo, mid, wallet_lo, wallet_mid))
+                if wallet_hi != wallet_mid:
+                    halves.append((mid + 1, hi, wallet_mid, wallet_hi))
+            intervals = halves
+        return sorted(changed)
+    
+    def _bridge_txs(self, block_nums: list) -> list:
+        """
+        Transactions sent to the bridge wallet in the given blocks, as
+        (block number, raw tx). Block receipts are scanned first, so only
+        successful matches are fetched (for their value) instead of every tx
+        body; blocks whose receipts the node won't serve are read in full.
+        """
+        bridge = self._bridge_bytes
+        matched = []  # (block number, tx hash)
+        full_blocks = []
+        for i in range(0, len(block_nums), BATCH_SIZE):
+            chunk = block_nums[i:i + BATCH_SIZE]
+            block_receipts = batch_request(self.base_w3, [("eth_getBlockReceipts", [hex(n)]) for n in chunk])
+            for block_num, receipts in zip(chunk, block_receipts):
+                if receipts is None:
+                    full_blocks.append(block_num)
+                    continue
+                matched += [
+                    (block_num, r["transactionHash"]) for r in receipts
+                    if r.get("to") and bytes.fromhex(r["to"][2:]) == bridge and receipt_ok(r)
+                ]
+        
+        txs = []
+        for i in range(0, len(matched), BATCH_SIZE):
+            chunk = matched[i:i + BATCH_SIZE]
+            results = batch_request(self.base_w3, [("eth_getTransactionByHash", [tx_hash]) for _, tx_hash in chunk])
+            for (block_num, tx_hash), tx in zip(chunk, results):
+                if tx is None:
+                    raise ValueError(f"Could not fetch transaction {tx_hash}")
+                txs.append((block_num, tx))
+        
+        for i in range(0, len(full_blocks), BATCH_SIZE):
+            chunk = full_blocks[i:i + BATCH_SIZE]
+            blocks = batch_request(self.base_w3, [("eth_getBlockByNumber", [hex(n), True]) for n in chunk])
+            for block_num, block in zip(chunk, blocks):
+                if block is None:
+                    raise ValueError(f"Could not fetch block {block_num}")
+                txs += [
+                    (block_num, tx) for tx in block["transactions"]
+                    if tx.get("to") and bytes.fromhex(tx["to"][2:]) == bridge
+                ]
+        return txs
+    
+    def _eth_deposits(self, block_nums: list) -> list:
+        """ETH sent to the bridge wallet in the given blocks"""
+        deposits = []
+        for block_num, tx in self._bridge_txs(block_nums):
+            tx_hash = tx["hash"]
+            value = int(tx["value"], 16)
+            if value > 0 and not self.state.is_processed(tx_hash):
+                sender = self._cs(tx["from"])
+                amount_eth = float(self.base_w3.from_wei(value, 'ether'))
+                
+                # Check rate limits
+                allowed, reason = self.check_rate_limits(sender, amount_eth)
+                
+                deposits.append({
+                    "tx_hash": tx_hash,
+                    "from": sender,
+                    "value": value,
+                    "amount_eth": amount_eth,
+                    "token": "ETH",
+                    "block": block_num,
+                    "allowed": allowed,
+                    "reason": reason
+                })
+        return deposits
+    
+    def _usdc_deposits(self, logs: list) -> list:
+        """
+        USDC deposits from raw eth_getLogs results. The query already pinned
+        the contract, Transfer topic and recipient, so each log is decoded by
+        slicing: topics[1] holds the sender, data the amount.
+        """
+        deposits = []
+        for log in logs:
+            tx_hash = log["transactionHash"]
+            if not self.state.is_processed(tx_hash):
+                value = int(log["data"], 16)
+                deposits.append({
+                    "tx_hash": tx_hash,
+                    "from": self._cs("0x" + log["topics"][1][-40:]),
+                    "value": value,
+                    "amount_usdc": value / 1e6,
+                    "token": "USDC",
+                    "block": int(log["blockNumber"], 16),
+                    "allowed": True,
+                    "reason": "OK"
+                })
+        return deposits
+    
+    def _scan_range(self, from_block: int, to_block: int) -> list:
+        """
+        Deposits in [from_block, to_block]. The USDC logs and the bridge
+        wallet's balance and nonce at both ends of the range come back in one
+        batched request. An EOA that sent nothing and whose balance didn't move
+        cannot have received ETH, so full blocks are only fetched where either
+        changed.
+        """
+        address = self.base_account.address
+        calls = [
+            ("eth_getLogs", [{
+                "address": self.base_usdc.address,
+                "fromBlock": hex(from_block),
+                "toBlock": hex(to_block),
+                "topics": [TRANSFER_TOPIC0, None, self._bridge_topic],
+            }]),
+            ("eth_getBalance", [address, hex(to_block)]),
+            ("eth_getTransactionCount", [address, hex(to_block)]),
+        ]
+        wallet_before = self._wallet_at[1:] if self._wallet_at and self._wallet_at[0] == from_block - 1 else None
+        if wallet_before is None:
+            calls += [
+                ("eth_getBalance", [address, hex(from_block - 1)]),
+                ("eth_getTransactionCount", [address, hex(from_block - 1)]),
+            ]
+        
+        logs, *wallet = batch_request(self.base_w3, calls)
+        if logs is None:
+            raise ValueError(f"eth_getLogs failed for range {from_block}-{to_block}")
+        wallet_after = tuple(wallet[:2])
+        wallet_before = wallet_before or tuple(wallet[2:])
+        
+        # Unknown (node without historical state) counts as changed
+        if None in wallet_after or None in wallet_before:
+            eth_blocks = list(range(from_block, to_block + 1))
+        elif wallet_after != wallet_before:
+            eth_blocks = self._wallet_changed_blocks(from_block, to_block, wallet_before, wallet_after)
+        else:
+            eth_blocks = []
+        deposits = self._eth_deposits(eth_blocks) if eth_blocks else []
+        deposits += self._usdc_deposits(logs)
+        
+        self._wallet_at = (to_block, *wallet_after) if None not in wallet_after else None
+        return deposits
+    
     def check_base_deposits(self):
         """Check for new ETH and USDC deposits to bridge wallet on Base"""
         if not self.base_account:
             return []
         
         try:
-            current_block = self.base_w3.eth.block_number
+            current_block = self.base_head = self.base_w3.eth.block_number
             last_block = self.state.get_last_block()
             
             if last_block == 0:
                 last_block = current_block - LOOKBACK_BLOCKS
             
-            deposits = []
+            if current_block <= last_block:
+                return []
             
-            # Scan blocks (limit to 50 at a time for performance)
-            end_block = min(current_block + 1, last_block + 50)
-            
-            for block_num in range(last_block + 1, end_block):
+            while True:
+                end_block = min(current_block, last_block + self.scan_stride)
                 try:
-                    block = self.base_w3.eth.get_block(block_num, full_transactions=True)
-                    
-                    # Check ETH transfers
-                    for tx in block.transactions:
-                        if tx.to and tx.to.lower() == self.base_account.address.lower():
-                            tx_hash = tx.hash.hex()
-                            
-                            if tx.value > 0 and not self.state.is_processed(tx_hash):
-                                amount_eth = float(self.base_w3.from_wei(tx.value, 'ether'))
-                                
-                                # Check rate limits
-                                allowed, reason = self.check_rate_limits(tx["from"], amount_eth)
-                                
-                                deposits.append({
-                                    "tx_hash": tx_hash,
-                                    "from": tx["from"],
-                                    "value": tx.value,
-                                    "amount_eth": amount_eth,
-                                    "token": "ETH",
-                                    "block": block_num,
-                                    "allowed": allowed,
-                                    "reason": reason
-                                })
-                    
-                    # Check USDC Transfer events
-                    try:
-                        transfer_filter = self.base_usdc.events.Transfer.create_filter(
-                            fromBlock=block_num,
-                            toBlock=block_num,
-                            argument_filters={'to': self.base_account.address}
-                        )
-                        for event in transfer_filter.get_all_entries():
-                            tx_hash = event.transactionHash.hex()
-                            if not self.state.is_processed(tx_hash):
-                                deposits.append({
-                                    "tx_hash": tx_hash,
-                                    "from": event.args["from"],
-                                    "value": event.args["value"],
-                                    "amount_usdc": event.args["value"] / 1e6,
-                                    "token": "USDC",
-                                    "block": block_num,
-                                    "allowed": True,
-                                    "reason": "OK"
-                                })
-                    except:
-                        pass
-                        
+                    deposits = self._scan_range(last_block + 1, end_block)
+                    break
                 except Exception as e:
-                    print(f"[{self.name}] Error scanning block {block_num}: {e}")
+                    if not is_range_error(e) or self.scan_stride <= self.min_stride:
+                        raise
+                    self.scan_stride = max(self.min_stride, self.scan_stride // 2)
+                    self.log.warning(f"Range too large ({e}), scan stride -> {self.scan_stride}")
+            
+            self.scan_stride = min(self.max_stride, int(self.scan_stride * 1.5))
+            deposits.sort(key=lambda d: d["block"])
             
             # Update last block
-            self.state.set_last_block(end_block - 1)
+            self.state.set_last_block(end_block)
             return deposits
             
         except Exception as e:
-            print(f"[{self.name}] Error checking Base deposits: {e}")
+            self.log.error(f"Error checking Base deposits: {e}")
             return []
     
+    def _sign_mint(self, recipient: str, amount_wei: int, token: str, nonce: int):
+        """Build and sign the THRYX transaction that credits a bridged deposit"""
+        if token == "USDC":
+            if not self.thryx_usdc:
+                raise ValueError("USDC contract not found")
+            
+            # mint(address,uint256) calldata, encoded by hand
+            data = (
+                MINT_SELECTOR
+                + bytes.fromhex(recipient[2:]).rjust(32, b"\0")
+                + amount_wei.to_bytes(32, "big")
+            )
+            tx = {**MINT_TEMPLATE, 'to': self._thryx_usdc_cs_addr, 'nonce': nonce, 'data': data}
+        else:
+            # ETH -> ETH 1:1
+            tx = {
+                **ETH_TRANSFER_TEMPLATE,
+                'to': self._cs(recipient),
+                'value': amount_wei,
+                'nonce': nonce,
+            }
+        
+        return self._minter_signer.sign(tx)
+    
     def mint_on_thryx(self, recipient: str, amount_wei: int, token: str = "ETH") -> dict:
         """Mint tokens on THRYX for a bridged deposit"""
-        try:
-            if token == "USDC":
-                if not self.usdc_address:
-                    return {"success": False, "error": "USDC contract not found"}
-                    
-                usdc = self.thryx_w3.eth.contract(
-                    address=Web3.to_checksum_address(self.usdc_address),
-                    abi=self.usdc_abi
-                )
-                
-                nonce = self.thryx_w3.eth.get_transaction_count(self.thryx_minter.address)
-                tx = usdc.functions.mint(
-                    Web3.to_checksum_address(recipient),
-                    amount_wei
-                ).build_transaction({
-                    'from': self.thryx_minter.address,
-                    'nonce': nonce,
-                    'gas': 100000,
-                    'chainId': 31337,
-                    'maxFeePerGas': self.thryx_w3.to_wei(2, 'gwei'),
-                    'maxPriorityFeePerGas': self.thryx_w3.to_wei(1, 'gwei'),
-                })
-                
-                signed = self.thryx_w3.eth.account.sign_transaction(tx, self.thryx_minter.key)
-                # Handle both old and new web3.py API
-                raw_tx = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-                tx_hash = self.thryx_w3.eth.send_raw_transaction(raw_tx)
+        minter = self.thryx_minter.address
+        self._mint_bucket.consume(1)
+        for attempt in range(2):
+            try:
+                signed = self._sign_mint(recipient, amount_wei, token, self.nonces.next(minter))
+                tx_hash = self.thryx_w3.eth.send_raw_transaction(get_raw_tx(signed))
                 
                 return {"success": True, "tx_hash": tx_hash.hex()}
                 
-            else:
-                # ETH -> ETH 1:1
-                nonce = self.thryx_w3.eth.get_transaction_count(self.thryx_minter.address)
-                tx = {
-                    'from': self.thryx_minter.address,
-                    'to': Web3.to_checksum_address(recipient),
-                    'value': amount_wei,
-                    'nonce': nonce,
-                    'gas': 21000,
-                    'chainId': 31337,
-                    'maxFeePerGas': self.thryx_w3.to_wei(2, 'gwei'),
-                    'maxPriorityFeePerGas': self.thryx_w3.to_wei(1, 'gwei'),
-                }
-                
-                signed = self.thryx_w3.eth.account.sign_transaction(tx, self.thryx_minter.key)
-                # Handle both old and new web3.py API
-                raw_tx = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-                tx_hash = self.thryx_w3.eth.send_raw_transaction(raw_tx)
-                
-                return {"success": True, "tx_hash": tx_hash.hex()}
+            except Exception as e:
+                # Resync from the node; retry once if only the nonce was stale
+                self.nonces.reset(minter)
+                if attempt or not any(hint in str(e).lower() for hint in NONCE_ERROR_HINTS):
+                    return {"success": False, "error": str(e)}
+    
+    def mint_many_on_thryx(self, deposits: list) -> list:
+        """
+        Mint several deposits at once. Transactions get sequential local
+        nonces, are signed in parallel and broadcast in one JSON-RPC batch.
+        Returns one mint_on_thryx-style result per deposit; a rejected send
+        is reported as failed, and its nonce filled so the later mints still run.
+        """
+        results = [{"success": False, "error": "USDC contract not found"}] * len(deposits)
+        # Only deposits that can be minted take a nonce, so there are no gaps
+        mintable = [i for i, d in enumerate(deposits) if d.get("token", "ETH") != "USDC" or self.thryx_usdc]
+        if not mintable:
+            return results
+        
+        minter = self.thryx_minter.address
+        try:
+            nonces = [self.nonces.next(minter) for _ in mintable]
+            
+            def sign(n):
+                deposit = deposits[mintable[n]]
+                return self._sign_mint(deposit['from'], deposit['value'], deposit.get("token", "ETH"), nonces[n])
+            
+            with ThreadPoolExecutor(max_workers=min(len(mintable), 8)) as pool:
+                signed = list(pool.map(sign, range(len(mintable))))
             
+            # One round-trip for every send, in nonce order
+            sent = batch_request(self.thryx_w3, [
+                ("eth_sendRawTransaction", [Web3.to_hex(get_raw_tx(s))]) for s in signed
+            ])
+            # Later mints were accepted behind any rejected nonce: fill the gaps so they execute
+            gaps = [nonces[n] for n, result in enumerate(sent) if result is None]
+            if not fill_nonce_gaps(self.thryx_w3, self._minter_signer.sign, minter, gaps, MINT_TEMPLATE):
+                self.nonces.reset(minter)  # Couldn't fill a gap, resync from the node
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            self.nonces.reset(minter)  # Resync in case the txs never made it out
+            for i in mintable:
+                results[i] = {"success": False, "error": str(e)}
+            return results
+        
+        for i, s, result in zip(mintable, signed, sent):
+            if result:
+                results[i] = {"success": True, "tx_hash": Web3.to_hex(s.hash)}
+            else:
+                results[i] = {"success": False, "error": "transaction rejected by THRYX node"}
+        return results
+    
+    def _mint_paced(self, deposits: list):
+        """
+        Yield (deposit, result) for each deposit, minting in batches as large
+        as the mint bucket allows so a burst of deposits doesn't flood THRYX
+        """
+        burst = []
+        for deposit in deposits:
+            if not self._mint_bucket.consume(1, block=False):
+                yield from zip(burst, self.mint_many_on_thryx(burst))
+                burst = []
+                self._mint_bucket.consume(1)
+            burst.append(deposit)
+        yield from zip(burst, self.mint_many_on_thryx(burst))
     
     def process_deposits(self):
         """Process any pending deposits"""
         deposits = self.check_base_deposits()
         
+        to_mint = [d for d in self._unminted if not self.state.is_processed(d["tx_hash"])]
+        self._unminted = []
         for deposit in deposits:
             tx_hash = deposit["tx_hash"]
             
@@ -382,22 +798,22 @@ class BridgeAgent:
             
             token = deposit.get("token", "ETH")
             
-            print(f"[{self.name}] ========================================", flush=True)
-            print(f"[{self.name}] NEW {token} DEPOSIT DETECTED ON BASE!", flush=True)
-            print(f"[{self.name}] From: {deposit['from']}", flush=True)
+            self.log.info("========================================")
+            self.log.info(f"NEW {token} DEPOSIT DETECTED ON BASE!")
+            self.log.info(f"From: {deposit['from']}")
             
             if token == "USDC":
                 amount_display = f"{deposit['value'] / 1e6} USDC"
             else:
                 amount_display = f"{self.base_w3.from_wei(deposit['value'], 'ether')} ETH"
             
-            print(f"[{self.name}] Amount: {amount_display}")
-            print(f"[{self.name}] TX: {tx_hash[:20]}...")
+            self.log.info(f"Amount: {amount_display}")
+            self.log.info(f"TX: {tx_hash[:20]}...")
             
             # Check if allowed
             if not deposit.get("allowed", True):
-                print(f"[{self.name}] REJECTED: {deposit['reason']}")
-                print(f"[{self.name}] Deposit will be refunded manually")
+                self.log.warning(f"REJECTED: {deposit['reason']}")
+                self.log.warning("Deposit will be refunded manually")
                 # Still mark as processed to avoid re-checking
                 self.state.mark_processed(tx_hash, {
                     **deposit,
@@ -406,46 +822,51 @@ class BridgeAgent:
                 })
                 continue
             
-            # Mint on THRYX
-            result = self.mint_on_thryx(deposit['from'], deposit['value'], token)
+            to_mint.append(deposit)
+        
+        # Mint on THRYX, batched and paced by the mint bucket
+        for deposit, result in self._mint_paced(to_mint):
+            token = deposit.get("token", "ETH")
             
             if result["success"]:
-                self.state.mark_processed(tx_hash, {
+                self.state.mark_processed(deposit["tx_hash"], {
                     **deposit,
                     "status": "completed",
                     "thryx_tx": result["tx_hash"]
                 })
                 
                 if token == "USDC":
-                    print(f"[{self.name}] Bridge complete! {deposit['value'] / 1e6} USDC on THRYX")
+                    self.log.info(f"Bridge complete! {deposit['value'] / 1e6} USDC on THRYX")
                 else:
                     eth_amt = float(self.base_w3.from_wei(deposit['value'], 'ether'))
-                    print(f"[{self.name}] Bridge complete! {eth_amt} ETH on THRYX")
-                print(f"[{self.name}] THRYX TX: {result['tx_hash'][:20]}...")
+                    self.log.info(f"Bridge complete! {eth_amt} ETH on THRYX")
+                self.log.info(f"THRYX TX: {result['tx_hash'][:20]}...")
             else:
-                print(f"[{self.name}] ERROR: {result['error']}")
+                self.log.error(f"ERROR: {result['error']}")
                 # Don't mark as processed - will retry on next loop
+                self._unminted.append(deposit)
             
-            print(f"[{self.name}] ========================================")
+            self.log.info("========================================")
+        
+        self.state.flush_if_needed()
     
     def restore_balances_on_startup(self):
         """
         CRITICAL: On node restart, re-mint all historical deposits that are missing.
         This ensures user funds are never lost even if the node resets.
         """
-        print(f"[{self.name}] ============================================", flush=True)
-        print(f"[{self.name}] CHECKING FOR MISSING BALANCES (Node Restart Recovery)", flush=True)
-        print(f"[{self.name}] ============================================", flush=True)
+        self.log.info("============================================")
+        self.log.info("CHECKING FOR MISSING BALANCES (Node Restart Recovery)")
+        self.log.info("============================================")
         
         # Get all completed deposits from history
-        deposits = self.state.state.get("deposits", [])
-        completed_deposits = [d for d in deposits if d.get("status") == "completed"]
+        completed_deposits = [d for _, d in self.state.history() if d.get("status") == "completed"]
         
         if not completed_deposits:
-            print(f"[{self.name}] No historical deposits to restore.", flush=True)
+            self.log.info("No historical deposits to restore.")
             return
         
-        print(f"[{self.name}] Found {len(completed_deposits)} historical deposits to verify", flush=True)
+        self.log.info(f"Found {len(completed_deposits)} historical deposits to verify")
         
         # Group by recipient
         recipient_deposits = {}
@@ -455,15 +876,15 @@ class BridgeAgent:
                 if recipient not in recipient_deposits:
                     recipient_deposits[recipient] = {"ETH": 0, "USDC": 0}
                 if dep.get("token") == "USDC":
-                    recipient_deposits[recipient]["USDC"] += dep.get("value", 0)
+                    recipient_deposits[recipient]["USDC"] += int(dep.get("value", 0))
                 else:
-                    recipient_deposits[recipient]["ETH"] += dep.get("value", 0)
+                    recipient_deposits[recipient]["ETH"] += int(dep.get("value", 0))
         
         # Check each recipient's current balance vs expected
         restored_count = 0
         for recipient, expected in recipient_deposits.items():
             try:
-                checksum_addr = Web3.to_checksum_address(recipient)
+                checksum_addr = self._cs(recipient)
                 
                 # Check ETH
                 if expected["ETH"] > 0:
@@ -473,64 +894,60 @@ class BridgeAgent:
                     # If balance is significantly less than expected, restore
                     if current_balance < expected_eth * 0.99:  # 1% tolerance for gas
                         missing = expected_eth - current_balance
-                        print(f"[{self.name}] Restoring {self.thryx_w3.from_wei(missing, 'ether')} ETH to {recipient[:10]}...", flush=True)
+                        self.log.info(f"Restoring {self.thryx_w3.from_wei(missing, 'ether')} ETH to {recipient[:10]}...")
                         
                         result = self.mint_on_thryx(recipient, missing, "ETH")
                         if result["success"]:
-                            print(f"[{self.name}] ✓ ETH restored! TX: {result['tx_hash'][:20]}...", flush=True)
+                            self.log.info(f"✓ ETH restored! TX: {result['tx_hash'][:20]}...")
                             restored_count += 1
                         else:
-                            print(f"[{self.name}] ✗ Failed to restore ETH: {result['error']}", flush=True)
+                            self.log.error(f"✗ Failed to restore ETH: {result['error']}")
                 
                 # Check USDC
-                if expected["USDC"] > 0 and self.usdc_address:
-                    usdc = self.thryx_w3.eth.contract(
-                        address=Web3.to_checksum_address(self.usdc_address),
-                        abi=self.usdc_abi
-                    )
-                    current_usdc = usdc.functions.balanceOf(checksum_addr).call()
+                if expected["USDC"] > 0 and self.thryx_usdc:
+                    current_usdc = self.thryx_usdc.functions.balanceOf(checksum_addr).call()
                     
                     if current_usdc < expected["USDC"] * 0.99:
                         missing = expected["USDC"] - current_usdc
-                        print(f"[{self.name}] Restoring {missing / 1e6} USDC to {recipient[:10]}...", flush=True)
+                        self.log.info(f"Restoring {missing / 1e6} USDC to {recipient[:10]}...")
                         
                         result = self.mint_on_thryx(recipient, int(missing), "USDC")
                         if result["success"]:
-                            print(f"[{self.name}] ✓ USDC restored! TX: {result['tx_hash'][:20]}...", flush=True)
+                            self.log.info(f"✓ USDC restored! TX: {result['tx_hash'][:20]}...")
                             restored_count += 1
                         else:
-                            print(f"[{self.name}] ✗ Failed to restore USDC: {result['error']}", flush=True)
+                            self.log.error(f"✗ Failed to restore USDC: {result['error']}")
                             
             except Exception as e:
-                print(f"[{self.name}] Error restoring {recipient}: {e}", flush=True)
+                self.log.error(f"Error restoring {recipient}: {e}")
         
         if restored_count > 0:
-            print(f"[{self.name}] ============================================", flush=True)
-            print(f"[{self.name}] RESTORED {restored_count} MISSING BALANCES!", flush=True)
-            print(f"[{self.name}] ============================================", flush=True)
+            self.log.info("============================================")
+            self.log.info(f"RESTORED {restored_count} MISSING BALANCES!")
+            self.log.info("============================================")
         else:
-            print(f"[{self.name}] All balances already correct - no restoration needed.", flush=True)
+            self.log.info("All balances already correct - no restoration needed.")
     
     def run(self):
         """Main loop"""
-        print(f"[{self.name}] Starting Secure Bridge Agent...")
-        print(f"[{self.name}] ============================================")
-        print(f"[{self.name}] THRYX BRIDGE - Base -> THRYX")
-        print(f"[{self.name}] ============================================")
-        print(f"[{self.name}] Bridge wallet: {self.base_account.address if self.base_account else 'NOT SET'}")
-        print(f"[{self.name}] ")
-        print(f"[{self.name}] SECURITY LIMITS:")
-        print(f"[{self.name}]   Max per transaction: {MAX_DEPOSIT_PER_TX} ETH")
-        print(f"[{self.name}]   Max per day/address: {MAX_DEPOSIT_PER_DAY} ETH")
-        print(f"[{self.name}] ")
-        print(f"[{self.name}] SUPPORTED:")
-        print(f"[{self.name}]   ETH  on Base -> ETH  on THRYX (1:1)")
-        print(f"[{self.name}]   USDC on Base -> USDC on THRYX (1:1)")
-        print(f"[{self.name}] ")
-        print(f"[{self.name}] TO BRIDGE:")
-        print(f"[{self.name}]   Send ETH or USDC to: {self.base_account.address if self.base_account else 'N/A'}")
-        print(f"[{self.name}]   You receive same token on THRYX at your address")
-        print(f"[{self.name}] ============================================")
+        self.log.info("Starting Secure Bridge Agent...")
+        self.log.info("============================================")
+        self.log.info("THRYX BRIDGE - Base -> THRYX")
+        self.log.info("============================================")
+        self.log.info(f"Bridge wallet: {self.base_account.address if self.base_account else 'NOT SET'}")
+        self.log.info("")
+        self.log.info("SECURITY LIMITS:")
+        self.log.info(f"  Max per transaction: {MAX_DEPOSIT_PER_TX} ETH")
+        self.log.info(f"  Max per day/address: {MAX_DEPOSIT_PER_DAY} ETH")
+        self.log.info("")
+        self.log.info("SUPPORTED:")
+        self.log.info("  ETH  on Base -> ETH  on THRYX (1:1)")
+        self.log.info("  USDC on Base -> USDC on THRYX (1:1)")
+        self.log.info("")
+        self.log.info("TO BRIDGE:")
+        self.log.info(f"  Send ETH or USDC to: {self.base_account.address if self.base_account else 'N/A'}")
+        self.log.info("  You receive same token on THRYX at your address")
+        self.log.info("============================================")
         
         # CRITICAL: Restore any missing balances from node restart
         self.restore_balances_on_startup()
@@ -539,19 +956,22 @@ class BridgeAgent:
         while True:
             try:
                 scan_count += 1
-                if scan_count % 6 == 1:  # Log every minute
-                    current = self.base_w3.eth.block_number
-                    last = self.state.get_last_block()
-                    print(f"[{self.name}] Scanning... Current block: {current}, Last scanned: {last}, Behind: {current - last}", flush=True)
+                scanned_before = self.state.get_last_block()
                 self.process_deposits()
-                time.sleep(10)
+                last = self.state.get_last_block()
+                if scan_count % 6 == 1 and self.base_head:  # Log every minute
+                    current = self.base_head
+                    self.log.info(f"Scanning... Current block: {current}, Last scanned: {last}, Behind: {current - last}")
+                
+                # Keep scanning while catching up; wait only at the tip or if the scan made no progress
+                if not (self.base_head and scanned_before < last < self.base_head):
+                    time.sleep(POLL_INTERVAL)
             except KeyboardInterrupt:
-                print(f"[{self.name}] Shutting down...", flush=True)
+                self.log.info("Shutting down...")
+                self.state.flush_if_needed(force=True)
                 break
             except Exception as e:
-                print(f"[{self.name}] Error in main loop: {e}", flush=True)
-                import traceback
-                traceback.print_exc()
+                self.log.exception(f"Error in main loop: {e}")
                 time.sleep(5)
 
 
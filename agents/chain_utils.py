@@ -0,0 +1,608 @@
+"""
+THRYX Chain Utilities
+Shared RPC helpers for agents: pooled HTTP sessions, JSON-RPC batching
+and local nonce tracking
+"""
+import json
+import time
+import asyncio
+import operator
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import rlp
+from eth_keys import keys
+from hexbytes import HexBytes
+from web3 import Web3, AsyncWeb3, WebsocketProviderV2
+from eth_account.datastructures import SignedTransaction
+
+try:
+    import orjson
+except ImportError:  # Fall back to requests' stdlib json parsing
+    orjson = None
+
+# eth-account renamed SignedTransaction.rawTransaction to raw_transaction;
+# resolve the name once instead of probing both on every send
+get_raw_tx = operator.attrgetter(
+    'raw_transaction' if hasattr(SignedTransaction, 'raw_transaction') else 'rawTransaction'
+)
+
+
+def json_dumps(obj, indent: bool = False, default=str) -> bytes:
+    """
+    Serialize to JSON bytes, with orjson when installed (compact unless indent).
+    Values JSON can't hold go through `default`; ints wider than 64 bits,
+    which orjson rejects, are written exactly by the stdlib fallback.
+    """
+    if orjson:
+        try:
+            return orjson.dumps(
+                obj, default=default, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+            )
+        except TypeError:
+            pass  # orjson rejects ints wider than 64 bits
+    if indent:
+        return json.dumps(obj, default=default, indent=2).encode()
+    return json.dumps(obj, default=default, separators=(",", ":")).encode()
+
+
+def json_loads(data):
+    """
+    Parse JSON bytes or str, with orjson when installed.
+    orjson reads ints wider than 64 bits as floats; use json.loads where those must stay exact.
+    """
+    return orjson.loads(data) if orjson else json.loads(data)
+
+# One keep-alive session per endpoint, shared by providers and batch calls
+_sessions = {}
+
+
+def ttl_cache(ttl: float = None, maxsize: int = 4096):
+    """
+    Memoize a function on its positional args.
+    ttl=None caches forever (immutable on-chain values such as symbols);
+    otherwise entries expire after ttl seconds. Least recently used entries
+    are evicted beyond maxsize.
+    """
+    def decorator(func):
+        cache = OrderedDict()  # args -> (expires_at, value)
+        lock = threading.Lock()
+        
+        @functools.wraps(func)
+        def wrapper(*args):
+            now = time.time()
+            with lock:
+                hit = cache.get(args)
+                if hit and (hit[0] is None or hit[0] > now):
+                    cache.move_to_end(args)
+                    return hit[1]
+            
+            value = func(*args)
+            with lock:
+                cache[args] = (None if ttl is None else now + ttl, value)
+                cache.move_to_end(args)
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return value
+        
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+# Contract objects per (provider, ABI, address); see get_contract
+_contracts = {}
+
+
+def get_contract(w3, address: str, abi: list):
+    """
+    Contract bound to address, built once per process instead of on every
+    call. ABIs are module-level constants, so they are keyed by identity.
+    """
+    key = (id(w3), id(abi), address)
+    contract = _contracts.get(key)
+    if contract is None:
+        contract = _contracts[key] = w3.eth.contract(address=Web3.to_checksum_address(address), abi=abi)
+    return contract
+
+
+def get_session(endpoint_uri: str, retries: int = 0) -> requests.Session:
+    """
+    Get a pooled keep-alive session for an RPC endpoint.
+    retries > 0 retries failed connections and 429/5xx responses with
+    exponential backoff; it only applies when the session is first created.
+    """
+    session = _sessions.get(endpoint_uri)
+    if session is None:
+        session = requests.Session()
+        max_retries = Retry(
+            total=retries,
+            read=0,  # A timed-out call may have been served; let the caller decide
+            backoff_factor=0.5,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=None,  # JSON-RPC is all POST
+            raise_on_status=False,
+        ) if retries else 0
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=max_retries)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _sessions[endpoint_uri] = session
+    return session
+
+
+def make_http_provider(endpoint_uri: str, timeout: float = None, retries: int = 0) -> Web3.HTTPProvider:
+    """HTTPProvider backed by the shared keep-alive session"""
+    request_kwargs = {"timeout": timeout} if timeout else None
+    return Web3.HTTPProvider(endpoint_uri, request_kwargs=request_kwargs, session=get_session(endpoint_uri, retries))
+
+
+@functools.lru_cache(maxsize=None)
+def get_w3(endpoint_uri: str, timeout: float = None, retries: int = 0) -> Web3:
+    """Web3 client shared by every agent in the process that uses this endpoint"""
+    return Web3(make_http_provider(endpoint_uri, timeout=timeout, retries=retries))
+
+
+def wait_for_node(w3, log=print, max_delay: float = 60):
+    """Block until the node answers, backing off exponentially between probes"""
+    delay = 1
+    while not w3.is_connected():
+        log(f"Waiting for node... (retry in {delay}s)")
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def batch_request(w3, calls: list, timeout: float = 10) -> list:
+    """
+    Send several JSON-RPC calls in a single HTTP round-trip.
+    `calls` is a list of (method, params) tuples; results come back in the
+    same order, with None for any call the node answered with an error.
+    """
+    if not calls:
+        return []
+
+    payload = [
+        {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+        for i, (method, params) in enumerate(calls)
+    ]
+    endpoint_uri = w3.provider.endpoint_uri
+    response = get_session(endpoint_uri).post(endpoint_uri, json=payload, timeout=timeout)
+    response.raise_for_status()
+
+    results = [None] * len(calls)
+    for item in (orjson.loads(response.content) if orjson else response.json()):
+        if "result" in item:
+            results[item["id"]] = item["result"]
+    return results
+
+
+def batch_call(w3, contract_calls: list, block: str = "latest") -> list:
+    """
+    Run many read-only contract calls, e.g. factory.functions.allCoins(i),
+    as one batch of eth_call and decode the results.
+    Calls that revert or fail to decode come back as None.
+    """
+    raw_results = batch_request(w3, [
+        ("eth_call", [{"to": fn.address, "data": fn._encode_transaction_data()}, block])
+        for fn in contract_calls
+    ])
+
+    return [_decode_output(w3, fn, data) for fn, data in zip(contract_calls, raw_results)]
+
+
+def multicall(w3, multicall3, contract_calls: list, block: str = "latest") -> list:
+    """
+    Run many read-only contract calls inside one eth_call through
+    Multicall3.aggregate3 (allowFailure=True) and decode the results.
+    Calls that revert or fail to decode come back as None.
+    """
+    if not contract_calls:
+        return []
+    
+    results = multicall3.functions.aggregate3([
+        (fn.address, True, fn._encode_transaction_data())
+        for fn in contract_calls
+    ]).call(block_identifier=block)
+    
+    return [
+        _decode_output(w3, fn, data) if success else None
+        for fn, (success, data) in zip(contract_calls, results)
+    ]
+
+
+class MulticallReader:
+    """
+    Runs many view calls in one round-trip: through Multicall3 when the chain
+    has it deployed, otherwise as one JSON-RPC batch of eth_calls.
+    Whether Multicall3 exists is probed on first use, and again after a
+    probe that failed, so one RPC error doesn't disable it for good.
+    """
+
+    def __init__(self, w3, address: str, abi: list, log=print):
+        self.w3 = w3
+        self.address = address
+        self.abi = abi
+        self.log = log
+        self._multicall3 = None
+        self._checked = False
+
+    def _contract(self):
+        """The Multicall3 contract, or None where it isn't deployed (or the probe failed)"""
+        if not self._checked:
+            try:
+                code = self.w3.eth.get_code(Web3.to_checksum_address(self.address))
+            except Exception as e:
+                self.log(f"Multicall3 probe failed ({e}), using batch calls")
+                return None
+            self._checked = True
+            if len(code) > 0:
+                self._multicall3 = get_contract(self.w3, self.address, self.abi)
+        return self._multicall3
+
+    def read(self, contract_calls: list, block="latest") -> list:
+        """Decoded results in call order, None for calls that failed"""
+        multicall3 = self._contract()
+        if multicall3:
+            try:
+                return multicall(self.w3, multicall3, contract_calls, block)
+            except Exception as e:
+                self.log(f"Multicall failed ({e}), using batch calls")
+        return batch_call(self.w3, contract_calls, hex(block) if isinstance(block, int) else block)
+
+
+def _decode_output(w3, fn, data):
+    """Decode raw return data for a contract function, None on failure"""
+    try:
+        types = [output["type"] for output in fn.abi["outputs"]]
+        values = w3.codec.decode(types, HexBytes(data))
+        values = [Web3.to_checksum_address(v) if t == "address" else v for t, v in zip(types, values)]
+        return values[0] if len(values) == 1 else tuple(values)
+    except Exception:
+        return None
+
+
+def wait_for_receipts(w3, tx_hashes: list, timeout: float = 120, poll_interval: float = 0.5) -> dict:
+    """
+    Poll receipts for many transactions at once (one batch per poll).
+    Returns {tx_hash: receipt} for every hash mined before the timeout.
+    """
+    pending = [h if isinstance(h, str) else h.hex() for h in tx_hashes]
+    receipts = {}
+    deadline = time.time() + timeout
+
+    while pending and time.time() < deadline:
+        results = batch_request(w3, [("eth_getTransactionReceipt", [h]) for h in pending])
+        still_pending = []
+        for tx_hash, receipt in zip(pending, results):
+            if receipt:
+                receipts[tx_hash] = receipt
+            else:
+                still_pending.append(tx_hash)
+        pending = still_pending
+        if pending:
+            time.sleep(poll_interval)
+
+    return receipts
+
+
+def receipt_ok(receipt: dict) -> bool:
+    """True if a raw JSON-RPC receipt reports success"""
+    return bool(receipt) and int(receipt.get("status", "0x0"), 16) == 1
+
+
+def fill_nonce_gaps(w3, sign, address: str, nonces: list, tx_template: dict) -> bool:
+    """
+    Send an empty self-transfer at each nonce whose send was rejected, so
+    transactions of the same batch already accepted at higher nonces still
+    mine instead of waiting behind the gap. `sign` turns a tx dict into a
+    signed transaction; `tx_template` supplies type, chainId and fees.
+    Returns False if a filler was rejected too (resync the nonce tracker).
+    """
+    if not nonces:
+        return True
+    fillers = [
+        sign({**tx_template, 'to': address, 'value': 0, 'gas': 21000, 'nonce': nonce})
+        for nonce in nonces
+    ]
+    results = batch_request(w3, [("eth_sendRawTransaction", [Web3.to_hex(get_raw_tx(f))]) for f in fillers])
+    return None not in results
+
+
+class NonceTracker:
+    """
+    Hands out sequential nonces per sender.
+    Only the first nonce for each address costs an RPC call; after that the
+    nonce is incremented locally as soon as a transaction is broadcast.
+    """
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self._nonces = {}
+        self._lock = threading.Lock()
+
+    def next(self, address: str) -> int:
+        """Reserve and return the next nonce for address"""
+        with self._lock:
+            if address not in self._nonces:
+                self._nonces[address] = self.w3.eth.get_transaction_count(address, 'pending')
+            nonce = self._nonces[address]
+            self._nonces[address] = nonce + 1
+            return nonce
+
+    def reset(self, address: str = None):
+        """Forget cached nonces so the next call resyncs from the node"""
+        with self._lock:
+            if address is None:
+                self._nonces.clear()
+            else:
+                self._nonces.pop(address, None)
+
+
+class PendingTxs:
+    """
+    Sent transactions settled later instead of waited on: settle() checks
+    every pending receipt in one batch and runs the mined callback for
+    successful ones. Transactions unmined after `timeout` seconds are
+    dropped and their sender's nonce is resynced.
+    """
+
+    def __init__(self, w3, nonces: NonceTracker, timeout: float = 120):
+        self.w3 = w3
+        self.nonces = nonces
+        self.timeout = timeout
+        self._pending = {}  # tx hash -> (sent_at, sender, on_mined, on_dropped)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, tx_hash, sender: str, on_mined, on_dropped=None):
+        """Track a sent transaction"""
+        self._pending[Web3.to_hex(tx_hash)] = (time.time(), sender, on_mined, on_dropped)
+
+    def settle(self) -> list:
+        """Resolve mined and timed-out transactions; returns [(tx_hash, "reverted" | "dropped")]"""
+        if not self._pending:
+            return []
+
+        hashes = list(self._pending)
+        receipts = batch_request(self.w3, [("eth_getTransactionReceipt", [h]) for h in hashes])
+        now = time.time()
+        failed = []
+        for tx_hash, receipt in zip(hashes, receipts):
+            sent_at, sender, on_mined, on_dropped = self._pending[tx_hash]
+            if receipt:
+                del self._pending[tx_hash]
+                if receipt_ok(receipt):
+                    on_mined()
+                else:
+                    failed.append((tx_hash, "reverted"))
+            elif now - sent_at > self.timeout:
+                del self._pending[tx_hash]
+                self.nonces.reset(sender)
+                if on_dropped:
+                    on_dropped()
+                failed.append((tx_hash, "dropped"))
+        return failed
+
+
+class AsyncNonceTracker:
+    """
+    NonceTracker for AsyncWeb3.
+    Concurrent callers get nonces in the order they call next(); the lock
+    keeps them from each fetching the same starting nonce from the node.
+    """
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self._nonces = {}
+        self._lock = asyncio.Lock()
+
+    async def next(self, address: str) -> int:
+        """Reserve and return the next nonce for address"""
+        async with self._lock:
+            if address not in self._nonces:
+                self._nonces[address] = await self.w3.eth.get_transaction_count(address, 'pending')
+            nonce = self._nonces[address]
+            self._nonces[address] = nonce + 1
+            return nonce
+
+    def reset(self, address: str = None):
+        """Forget cached nonces so the next call resyncs from the node"""
+        if address is None:
+            self._nonces.clear()
+        else:
+            self._nonces.pop(address, None)
+
+
+class TxSigner:
+    """
+    Signs EIP-1559 (type 2) transactions for one key.
+    The payload is RLP-encoded by hand and its hash signed directly with
+    eth-keys (libsecp256k1 when coincurve is installed), skipping
+    eth-account's per-call type detection and validation. tx needs chainId,
+    nonce, maxPriorityFeePerGas, maxFeePerGas, gas and to, plus optional
+    value and data (to and data as hex strings or bytes); output is
+    byte-identical to Account.sign_transaction.
+    """
+
+    def __init__(self, private_key):
+        self.key = keys.PrivateKey(HexBytes(private_key))
+
+    def sign(self, tx: dict) -> SignedTransaction:
+        tx_type = tx.get('type', 2)
+        if (int(tx_type, 16) if isinstance(tx_type, str) else tx_type) != 2:
+            raise ValueError(f"TxSigner only signs type 2 transactions, got type {tx_type}")
+        
+        fields = [
+            tx['chainId'],
+            tx['nonce'],
+            tx['maxPriorityFeePerGas'],
+            tx['maxFeePerGas'],
+            tx['gas'],
+            bytes(HexBytes(tx['to'])),
+            tx.get('value', 0),
+            bytes(HexBytes(tx.get('data', b""))),
+            [],  # accessList
+        ]
+        signature = self.key.sign_msg_hash(Web3.keccak(b"\x02" + rlp.encode(fields)))
+        raw = HexBytes(b"\x02" + rlp.encode(fields + [signature.v, signature.r, signature.s]))
+        return SignedTransaction(raw, HexBytes(Web3.keccak(raw)), signature.r, signature.s, signature.v)
+
+
+class TokenBucket:
+    """
+    Paces operations to refill_rate per second while allowing bursts of up
+    to capacity. Thread-safe.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n: float = 1, block: bool = True) -> bool:
+        """Take n tokens; waits for them if block, else returns False when short"""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.refill_rate)
+                self._last_refill = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return True
+                if not block:
+                    return False
+                time.sleep((n - self.tokens) / self.refill_rate)
+
+
+class ReceiptWatcher:
+    """
+    Resolves transaction receipts from a newHeads websocket subscription.
+    A daemon thread runs the subscription; on every new block all pending
+    hashes are checked with one batched eth_getTransactionReceipt call.
+    Without a websocket (or while it is down) wait() polls in batches
+    instead; a dropped subscription is resubscribed with backoff.
+
+    Threaded agents call wait(); asyncio agents register broadcast hashes
+    with expect(), await them with wait_many() and discard() them after.
+    """
+
+    def __init__(self, w3, ws_url: str = None, max_pending: int = 256, log=print, max_delay: float = 60):
+        self.w3 = w3
+        self.ws_url = ws_url
+        self.max_pending = max_pending
+        self.log = log
+        self.max_delay = max_delay
+        self.running = False
+        self._thread = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the subscription thread (no-op without a websocket URL)"""
+        if self.ws_url and self._thread is None:
+            self._thread = threading.Thread(
+                target=asyncio.run, args=(self._run(),), name="receipt-watcher", daemon=True
+            )
+            self._thread.start()
+
+    async def _run(self):
+        """Keep a newHeads subscription open, reconnecting with exponential backoff"""
+        delay = 1
+        while True:
+            try:
+                async with AsyncWeb3.persistent_websocket(WebsocketProviderV2(self.ws_url)) as ws_w3:
+                    await ws_w3.eth.subscribe("newHeads")
+                    self.running = True
+                    delay = 1
+                    async for _ in ws_w3.ws.process_subscriptions():
+                        await asyncio.to_thread(self._check_pending)
+                self.log(f"Receipt websocket {self.ws_url} closed, resubscribing in {delay}s")
+            except Exception as e:
+                self.log(f"Receipt websocket {self.ws_url} failed ({e!r}), resubscribing in {delay}s")
+            finally:
+                self.running = False
+                # Hand anyone still waiting back to polling
+                with self._lock:
+                    pending, self._pending = self._pending, {}
+                for future in pending.values():
+                    future.set_exception(ConnectionError("receipt websocket closed"))
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_delay)
+
+    def _check_pending(self):
+        with self._lock:
+            hashes = list(self._pending)
+        if not hashes:
+            return
+        try:
+            results = batch_request(self.w3, [("eth_getTransactionReceipt", [h]) for h in hashes])
+        except Exception:
+            return  # Try again on the next head
+        for tx_hash, receipt in zip(hashes, results):
+            if receipt:
+                with self._lock:
+                    future = self._pending.pop(tx_hash, None)
+                if future:
+                    future.set_result(receipt)
+
+    @staticmethod
+    def _key(tx_hash) -> str:
+        return tx_hash if isinstance(tx_hash, str) else Web3.to_hex(tx_hash)
+
+    def expect(self, tx_hash):
+        """Start tracking a broadcast tx_hash, returns its Future or None"""
+        with self._lock:
+            # Past the cap, callers poll rather than growing the pending set
+            if self.running and len(self._pending) < self.max_pending:
+                return self._pending.setdefault(self._key(tx_hash), Future())
+        return None
+
+    def discard(self, tx_hashes):
+        """Stop tracking hashes that are no longer being waited on"""
+        with self._lock:
+            futures = [self._pending.pop(self._key(h), None) for h in tx_hashes]
+        for future in futures:
+            if future:
+                future.cancel()
+
+    def wait(self, tx_hash, timeout: float = 120):
+        """Block until tx_hash is mined, returns the raw receipt or None on timeout"""
+        tx_hash = self._key(tx_hash)
+        deadline = time.time() + timeout
+
+        future = self.expect(tx_hash)
+        if future:
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeout:
+                self.discard([tx_hash])
+                return None
+            except ConnectionError:
+                pass  # Subscription dropped, poll for the rest of the timeout
+
+        return wait_for_receipts(self.w3, [tx_hash], max(deadline - time.time(), 0)).get(tx_hash)
+
+    async def wait_many(self, tx_hashes, timeout: float = 120) -> dict:
+        """
+        Await receipts for hashes registered with expect().
+        Returns {tx_hash: receipt} for those that arrived; anything missing
+        (timed out, never registered, or websocket dropped) is left to the caller to poll.
+        """
+        with self._lock:
+            futures = {h: self._pending[h] for h in map(self._key, tx_hashes) if h in self._pending}
+        if futures:
+            waiters = [asyncio.wrap_future(f) for f in futures.values()]
+            await asyncio.wait(waiters, timeout=timeout)
+            for waiter in waiters:
+                if waiter.done() and not waiter.cancelled():
+                    waiter.exception()  # Mark a dropped-websocket error as handled
+        return {
+            h: f.result() for h, f in futures.items()
+            if f.done() and not f.cancelled() and f.exception() is None
+        }
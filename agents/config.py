@@ -4,29 +4,67 @@ Loads deployment addresses and private keys for agents
 """
 import os
 import json
+import functools
 from pathlib import Path
+from collections.abc import Mapping
+
+try:
+    import orjson
+except ImportError:  # Fall back to stdlib json
+    orjson = None
 
 # RPC URL - Docker internal or localhost
 RPC_URL = os.getenv("RPC_URL", "http://127.0.0.1:8545")
 
+# Optional websocket endpoint for newHeads subscriptions (anvil serves ws:// on the RPC port)
+WS_URL = os.getenv("WS_URL", "")
+
 # Hardhat default private keys (DO NOT USE IN PRODUCTION)
 # These correspond to accounts 2-9 in Hardhat's default accounts
-AGENT_PRIVATE_KEYS = {
-    "oracle": os.getenv("PRIVATE_KEY_ORACLE", "0x5de4111afa1a4b94908f83103eb1f1706367c2e68ca870fc3fb9a804cdab365a"),
-    "arbitrage": os.getenv("PRIVATE_KEY_ARB", "0x7c852118294e51e653712a81e05800f419141751be58f605c371e15141b007a6"),
-    "liquidity": os.getenv("PRIVATE_KEY_LIQ", "0x47e179ec197488593b187f80a00eb0da91f1b9d0b13f8733639f19c30a34926a"),
-    "governance": os.getenv("PRIVATE_KEY_GOV", "0x8b3a350cf5c34c9194ca85829a2df0ec3153be0318b5e2d3348e872092edffba"),
-    "monitor": os.getenv("PRIVATE_KEY_MON", "0x92db14e403b83dfe3df233f83dfa3a0d7096f21ca9b0d6d6b8d88b2b4ec1564e"),
-    "security": os.getenv("PRIVATE_KEY_SEC", "0x4bbbf85ce3377467afe5d46f804f221813b2bb87f24d81f60f1fcdbf7cbf4356"),
-    "intent": os.getenv("PRIVATE_KEY_INT", "0xdbda1821b80551c9d65939329250298aa3472ba22feea921c0cf5d620ea67b97"),
+AGENT_KEY_ENV = {
+    "oracle": ("PRIVATE_KEY_ORACLE", "0x5de4111afa1a4b94908f83103eb1f1706367c2e68ca870fc3fb9a804cdab365a"),
+    "arbitrage": ("PRIVATE_KEY_ARB", "0x7c852118294e51e653712a81e05800f419141751be58f605c371e15141b007a6"),
+    "liquidity": ("PRIVATE_KEY_LIQ", "0x47e179ec197488593b187f80a00eb0da91f1b9d0b13f8733639f19c30a34926a"),
+    "governance": ("PRIVATE_KEY_GOV", "0x8b3a350cf5c34c9194ca85829a2df0ec3153be0318b5e2d3348e872092edffba"),
+    "monitor": ("PRIVATE_KEY_MON", "0x92db14e403b83dfe3df233f83dfa3a0d7096f21ca9b0d6d6b8d88b2b4ec1564e"),
+    "security": ("PRIVATE_KEY_SEC", "0x4bbbf85ce3377467afe5d46f804f221813b2bb87f24d81f60f1fcdbf7cbf4356"),
+    "intent": ("PRIVATE_KEY_INT", "0xdbda1821b80551c9d65939329250298aa3472ba22feea921c0cf5d620ea67b97"),
 }
 
+
+@functools.lru_cache(maxsize=None)
+def get_private_key(role: str) -> str:
+    """Private key for an agent role, read from the environment on first use"""
+    env_name, default = AGENT_KEY_ENV[role]
+    return os.environ.get(env_name, default)
+
+
+class _AgentKeys(Mapping):
+    """Read-only role -> private key view that resolves each key lazily"""
+    
+    def __getitem__(self, role):
+        if role not in AGENT_KEY_ENV:
+            raise KeyError(role)
+        return get_private_key(role)
+    
+    def __iter__(self):
+        return iter(AGENT_KEY_ENV)
+    
+    def __len__(self):
+        return len(AGENT_KEY_ENV)
+
+
+AGENT_PRIVATE_KEYS = _AgentKeys()
+
 # Contract addresses - loaded from deployment.json
 CONTRACTS = {}
 AGENTS = {}
 
+# Parsed deployment.json per path, with the mtime it was parsed at
+_DEPLOYMENT_CACHE = {}
+
 def load_deployment():
-    """Load contract addresses from deployment.json"""
+    """Load contract addresses from deployment.json, reparsing only if the file changed"""
     global CONTRACTS, AGENTS
     
     # Try multiple locations
@@ -38,13 +76,23 @@ def load_deployment():
     ]
     
     for deployment_path in possible_paths:
-        if deployment_path.exists():
-            with open(deployment_path) as f:
-                data = json.load(f)
-                CONTRACTS = data.get("contracts", {})
-                AGENTS = data.get("agents", {})
-                print(f"[CONFIG] Loaded deployment from {deployment_path}")
-                return
+        try:
+            mtime = deployment_path.stat().st_mtime
+        except OSError:
+            continue
+        
+        key = str(deployment_path)
+        cached = _DEPLOYMENT_CACHE.get(key)
+        if cached and cached[0] == mtime:
+            data = cached[1]
+        else:
+            with open(deployment_path, 'rb') as f:
+                data = orjson.loads(f.read()) if orjson else json.load(f)
+            _DEPLOYMENT_CACHE[key] = (mtime, data)
+            print(f"[CONFIG] Loaded deployment from {deployment_path}")
+        CONTRACTS = data.get("contracts", {})
+        AGENTS = data.get("agents", {})
+        return data
     
     print(f"[CONFIG] Warning: deployment.json not found")
     print("[CONFIG] Using placeholder addresses - run deployment first")
@@ -58,6 +106,7 @@ def load_deployment():
         "AgentOracle": "0x0000000000000000000000000000000000000000",
         "IntentMempool": "0x0000000000000000000000000000000000000000",
     }
+    return {}
 
 # Load on import
 load_deployment()
@@ -66,6 +115,7 @@ load_deployment()
 ERC20_ABI = [
     {"inputs": [{"name": "spender", "type": "address"}, {"name": "amount", "type": "uint256"}], "name": "approve", "outputs": [{"name": "", "type": "bool"}], "stateMutability": "nonpayable", "type": "function"},
     {"inputs": [{"name": "account", "type": "address"}], "name": "balanceOf", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [{"name": "owner", "type": "address"}, {"name": "spender", "type": "address"}], "name": "allowance", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
     {"inputs": [], "name": "decimals", "outputs": [{"name": "", "type": "uint8"}], "stateMutability": "view", "type": "function"},
 ]
 
@@ -82,6 +132,13 @@ AGENT_ORACLE_ABI = [
     {"inputs": [{"name": "pair", "type": "bytes32"}], "name": "getSubmissionCount", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
 ]
 
+# Multicall3 - same address on every chain it is deployed to
+MULTICALL3_ADDRESS = os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")
+
+MULTICALL3_ABI = [
+    {"inputs": [{"components": [{"name": "target", "type": "address"}, {"name": "allowFailure", "type": "bool"}, {"name": "callData", "type": "bytes"}], "name": "calls", "type": "tuple[]"}], "name": "aggregate3", "outputs": [{"components": [{"name": "success", "type": "bool"}, {"name": "returnData", "type": "bytes"}], "name": "returnData", "type": "tuple[]"}], "stateMutability": "payable", "type": "function"},
+]
+
 SIMPLE_AMM_ABI = [
     {"inputs": [{"name": "tokenIn", "type": "address"}, {"name": "amountIn", "type": "uint256"}, {"name": "minAmountOut", "type": "uint256"}], "name": "swap", "outputs": [{"name": "amountOut", "type": "uint256"}], "stateMutability": "nonpayable", "type": "function"},
     {"inputs": [{"name": "amountA", "type": "uint256"}, {"name": "amountB", "type": "uint256"}], "name": "addLiquidity", "outputs": [{"name": "liquidity", "type": "uint256"}], "stateMutability": "nonpayable", "type": "function"},
@@ -90,3 +147,21 @@ SIMPLE_AMM_ABI = [
     {"inputs": [], "name": "reserveA", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
     {"inputs": [], "name": "reserveB", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
 ]
+
+# CreatorCoinFactory and CreatorCoin, shared by the creator-coin agents
+CREATOR_FACTORY_ABI = [
+    {"inputs": [{"name": "name", "type": "string"}, {"name": "symbol", "type": "string"}, {"name": "profileUri", "type": "string"}], "name": "createCoin", "outputs": [{"name": "", "type": "address"}], "stateMutability": "nonpayable", "type": "function"},
+    {"inputs": [], "name": "totalCoins", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [{"name": "index", "type": "uint256"}], "name": "allCoins", "outputs": [{"name": "", "type": "address"}], "stateMutability": "view", "type": "function"},
+]
+
+CREATOR_COIN_ABI = [
+    {"inputs": [{"name": "minTokensOut", "type": "uint256"}], "name": "buy", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "payable", "type": "function"},
+    {"inputs": [{"name": "tokenAmount", "type": "uint256"}, {"name": "minEthOut", "type": "uint256"}], "name": "sell", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "nonpayable", "type": "function"},
+    {"inputs": [], "name": "getCurrentPrice", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [], "name": "totalEthLocked", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [], "name": "totalTrades", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [], "name": "symbol", "outputs": [{"name": "", "type": "string"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [], "name": "creator", "outputs": [{"name": "", "type": "address"}], "stateMutability": "view", "type": "function"},
+    {"inputs": [{"name": "account", "type": "address"}], "name": "balanceOf", "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"},
+]
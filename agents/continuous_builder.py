@@ -3,17 +3,48 @@ THRYX Continuous Builder Agent
 Runs forever, constantly improving and expanding the ecosystem
 """
 import os
-import json
+import sys
+import atexit
+import signal
 import time
 import random
+from itertools import accumulate
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import requests
 from web3 import Web3
 from eth_account import Account
 from price_feed import get_price_feed, format_eth_with_usdc
+from config import load_deployment, CREATOR_FACTORY_ABI
+from state_store import StateStore
+from chain_utils import get_w3, wait_for_node, get_contract, get_raw_tx, NonceTracker, PendingTxs, TxSigner
 
 # Config
 RPC_URL = os.getenv("RPC_URL", "http://thryx-node:8545")
+RPC_TIMEOUT = 10  # seconds
+RPC_RETRIES = 3  # Connection failures and 429/5xx from the node
 STATE_FILE = os.getenv("BUILDER_STATE", "/app/data/builder_state.json")
+PENDING_TX_TIMEOUT = 120  # Seconds before an unmined tx is dropped and its nonce resynced
+
+# Chain id and EIP-1559 fees (wei) shared by every transaction
+CHAIN_ID = 31337
+MAX_FEE_WEI = 2 * 10**9  # 2 gwei
+PRIORITY_FEE_WEI = 1 * 10**9  # 1 gwei
+
+# Fields every builder transaction shares; each send adds to, gas, value, nonce and data
+TX_TEMPLATE = {
+    'type': 2,
+    'chainId': CHAIN_ID,
+    'maxFeePerGas': MAX_FEE_WEI,
+    'maxPriorityFeePerGas': PRIORITY_FEE_WEI,
+}
+
+# Selectors for the trade path, hashed once instead of per ABI call
+TOTAL_COINS_SELECTOR = Web3.keccak(text="totalCoins()")[:4]
+ALL_COINS_SELECTOR = Web3.keccak(text="allCoins(uint256)")[:4]
+SYMBOL_SELECTOR = Web3.keccak(text="symbol()")[:4]
+BUY_CALLDATA = Web3.keccak(text="buy(uint256)")[:4] + bytes(32)  # buy(minTokensOut=0)
 
 # Hardhat default accounts
 BUILDER_ACCOUNTS = [
@@ -22,6 +53,13 @@ BUILDER_ACCOUNTS = [
     ("Builder3", "0x5de4111afa1a4b94908f83103eb1f1706367c2e68ca870fc3fb9a804cdab365a"),
 ]
 
+# Cycle actions and their odds
+ACTIONS = ("create", "trade", "transfer")
+ACTION_WEIGHTS = (1, 9, 1)
+ACTION_CUM_WEIGHTS = tuple(accumulate(ACTION_WEIGHTS))  # Passed to choices() so it skips re-accumulating
+ACTION_BATCH = 100  # Actions drawn per random.choices call
+BURST_EVERY = int(os.getenv("BUILDER_BURST_EVERY", "0"))  # Cycles between per-account trade bursts; 0 disables
+
 # Token themes for auto-creation
 TOKEN_THEMES = [
     ("THRYX Alpha", "ALPHA", "Early adopter token"),
@@ -41,47 +79,13 @@ TOKEN_THEMES = [
     ("Bull Run", "BULL", "Bull market energy"),
 ]
 
-FACTORY_ABI = [
-    {"name": "createCoin", "type": "function", "stateMutability": "nonpayable",
-     "inputs": [{"name": "name", "type": "string"}, {"name": "symbol", "type": "string"}, 
-               {"name": "profileUri", "type": "string"}],
-     "outputs": [{"name": "", "type": "address"}]},
-    {"name": "totalCoins", "type": "function", "stateMutability": "view",
-     "inputs": [], "outputs": [{"name": "", "type": "uint256"}]},
-    {"name": "allCoins", "type": "function", "stateMutability": "view",
-     "inputs": [{"name": "index", "type": "uint256"}],
-     "outputs": [{"name": "", "type": "address"}]},
-]
-
-COIN_ABI = [
-    {"name": "buy", "type": "function", "stateMutability": "payable",
-     "inputs": [{"name": "minTokensOut", "type": "uint256"}],
-     "outputs": [{"name": "", "type": "uint256"}]},
-    {"name": "sell", "type": "function", "stateMutability": "nonpayable",
-     "inputs": [{"name": "tokenAmount", "type": "uint256"}, {"name": "minEthOut", "type": "uint256"}],
-     "outputs": [{"name": "", "type": "uint256"}]},
-    {"name": "symbol", "type": "function", "stateMutability": "view",
-     "inputs": [], "outputs": [{"name": "", "type": "string"}]},
-    {"name": "balanceOf", "type": "function", "stateMutability": "view",
-     "inputs": [{"name": "account", "type": "address"}],
-     "outputs": [{"name": "", "type": "uint256"}]},
-    {"name": "totalTrades", "type": "function", "stateMutability": "view",
-     "inputs": [], "outputs": [{"name": "", "type": "uint256"}]},
-]
 
-
-class BuilderState:
+class BuilderState(StateStore):
     def __init__(self, filepath):
-        self.filepath = filepath
-        self.data = self._load()
+        super().__init__(filepath)
+        atexit.register(self.save)
     
-    def _load(self):
-        try:
-            if os.path.exists(self.filepath):
-                with open(self.filepath, 'r') as f:
-                    return json.load(f)
-        except:
-            pass
+    def default_state(self):
         return {
             "coins_created": 0,
             "trades_made": 0,
@@ -92,37 +96,41 @@ class BuilderState:
             "started_at": datetime.now().isoformat(),
         }
     
-    def save(self):
-        try:
-            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
-            with open(self.filepath, 'w') as f:
-                json.dump(self.data, f, indent=2)
-        except Exception as e:
-            print(f"Failed to save state: {e}")
-    
     def record_action(self, action_type, details=""):
         self.data["last_action"] = {
             "type": action_type,
             "details": details,
             "timestamp": datetime.now().isoformat()
         }
+        self.mark_dirty("last_action")
         self.save()
 
 
 class ContinuousBuilder:
     def __init__(self):
-        self.w3 = Web3(Web3.HTTPProvider(RPC_URL))
+        self.w3 = get_w3(RPC_URL, RPC_TIMEOUT, RPC_RETRIES)
         self.state = BuilderState(STATE_FILE)
         self.accounts = [Account.from_key(pk) for _, pk in BUILDER_ACCOUNTS]
-        self.deployment = self._load_deployment()
+        self._signers = {account.address: TxSigner(account.key) for account in self.accounts}
+        # Nonces are tracked locally, resynced from the node after any failed send
+        self.nonces = NonceTracker(self.w3)
+        self.deployment = load_deployment()
+        
+        # Themes by symbol, and the symbols not yet created
+        self._themes = {theme[1]: theme for theme in TOKEN_THEMES}
+        self._unused_symbols = set(self._themes) - set(self.state.data["created_symbols"])
+        self._coin_symbols = {}  # Coin address -> symbol; symbols never change
+        
+        # Private generator, so agents sharing a process don't contend on the global one
+        self._rng = random.Random()
+        self._planned_actions = deque()
+        
+        # Sent transactions, settled at the start of the next cycle
+        self.pending = PendingTxs(self.w3, self.nonces, timeout=PENDING_TX_TIMEOUT)
+        
+        # One worker per account for burst_cycle's concurrent sign-and-send
+        self._pool = ThreadPoolExecutor(max_workers=len(self.accounts))
         
-    def _load_deployment(self):
-        try:
-            with open("/app/deployment.json", "r") as f:
-                return json.load(f)
-        except:
-            return {"contracts": {}}
-    
     def get_factory_address(self):
         return self.deployment.get("contracts", {}).get("CreatorCoinFactory", "")
     
@@ -130,6 +138,16 @@ class ContinuousBuilder:
         timestamp = datetime.now().strftime("%H:%M:%S")
         print(f"[{timestamp}] 🤖 BUILDER: {msg}")
     
+    def _settle_pending(self):
+        """Apply the outcome of transactions sent in earlier cycles (one batched receipt poll)"""
+        for tx_hash, outcome in self.pending.settle():
+            self.log(f"❌ Transaction {tx_hash[:10]}... {outcome}")
+    
+    def _send(self, account, tx: dict):
+        """Sign tx (TX_TEMPLATE plus per-call fields) with the cached signer and send it"""
+        signed = self._signers[account.address].sign(tx)
+        return self.w3.eth.send_raw_transaction(get_raw_tx(signed))
+    
     def create_coin(self):
         """Create a new creator coin"""
         factory_addr = self.get_factory_address()
@@ -138,148 +156,182 @@ class ContinuousBuilder:
             return False
         
         # Pick unused theme
-        available = [t for t in TOKEN_THEMES if t[1] not in self.state.data["created_symbols"]]
-        if not available:
+        if self._unused_symbols:
+            name, symbol, bio = self._themes[self._rng.choice(tuple(self._unused_symbols))]
+        else:
             self.log("All themes used, recycling...")
-            available = TOKEN_THEMES
-        
-        name, symbol, bio = random.choice(available)
-        creator = random.choice(self.accounts)
+            name, symbol, bio = self._rng.choice(TOKEN_THEMES)
+        creator = self._rng.choice(self.accounts)
         
         try:
-            factory = self.w3.eth.contract(
-                address=Web3.to_checksum_address(factory_addr),
-                abi=FACTORY_ABI
-            )
+            factory = get_contract(self.w3, factory_addr, CREATOR_FACTORY_ABI)
             
-            nonce = self.w3.eth.get_transaction_count(creator.address)
-            tx = factory.functions.createCoin(name, symbol, bio).build_transaction({
-                'from': creator.address,
-                'nonce': nonce,
+            tx_hash = self._send(creator, {
+                **TX_TEMPLATE,
+                'to': factory.address,
                 'gas': 3000000,
-                'chainId': 31337,
-                'maxFeePerGas': self.w3.to_wei(2, 'gwei'),
-                'maxPriorityFeePerGas': self.w3.to_wei(1, 'gwei'),
+                'nonce': self.nonces.next(creator.address),
+                'data': factory.functions.createCoin(name, symbol, bio)._encode_transaction_data(),
             })
+            # Not offered again while pending; a reverted create most likely means it exists
+            self._unused_symbols.discard(symbol)
             
-            signed = self.w3.eth.account.sign_transaction(tx, creator.key)
-            raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-            tx_hash = self.w3.eth.send_raw_transaction(raw)
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            
-            if receipt.status == 1:
+            def created():
                 self.log(f"✅ Created ${symbol} - {name}")
                 self.state.data["coins_created"] += 1
                 self.state.data["created_symbols"].append(symbol)
+                self.state.mark_dirty("coins_created", "created_symbols")
                 self.state.record_action("create_coin", f"${symbol}")
-                return True
+            
+            self.pending.add(tx_hash, creator.address, created, lambda: self._unused_symbols.add(symbol))
+            return True
         except Exception as e:
+            self.nonces.reset(creator.address)
             if "already exists" in str(e).lower():
                 self.state.data["created_symbols"].append(symbol)
+                self.state.mark_dirty("created_symbols")
+                self._unused_symbols.discard(symbol)
             self.log(f"❌ Failed to create {symbol}: {e}")
         return False
     
+    def _pick_coin(self, factory_addr):
+        """Random (address, symbol) from the factory's coins, None if there are none"""
+        total = int(self.w3.eth.call({'to': factory_addr, 'data': TOTAL_COINS_SELECTOR}).hex(), 16)
+        if total == 0:
+            return None
+        
+        idx = self._rng.randint(0, total - 1)
+        coin_addr = self.w3.eth.call({'to': factory_addr, 'data': ALL_COINS_SELECTOR + idx.to_bytes(32, 'big')})[-20:]
+        coin_addr = self.w3.to_checksum_address(coin_addr)
+        
+        symbol = self._coin_symbols.get(coin_addr)
+        if symbol is None:
+            result = self.w3.eth.call({'to': coin_addr, 'data': SYMBOL_SELECTOR})
+            symbol = self._coin_symbols[coin_addr] = self.w3.codec.decode(['string'], result)[0]
+        return coin_addr, symbol
+    
+    def _buy_tx(self, trader, coin_addr):
+        """buy(0) on coin_addr for a random amount, as (tx, eth_amount)"""
+        eth_amount = self._rng.uniform(0.01, 0.2)
+        return {
+            **TX_TEMPLATE,
+            'to': coin_addr,
+            'gas': 200000,
+            'value': int(eth_amount * 10**18),
+            'nonce': self.nonces.next(trader.address),
+            'data': BUY_CALLDATA,
+        }, eth_amount
+    
+    def _bought(self, eth_amount, symbol):
+        """Mined callback for a buy"""
+        def bought():
+            self.log(f"💰 Bought {format_eth_with_usdc(eth_amount)} of ${symbol}")
+            self.state.data["trades_made"] += 1
+            self.state.mark_dirty("trades_made")
+            self.state.record_action("trade", f"BUY ${symbol}")
+        return bought
+    
     def trade_random_coin(self):
         """Make a random trade on an existing coin"""
         factory_addr = self.get_factory_address()
         if not factory_addr:
             return False
         
+        trader = self._rng.choice(self.accounts)
         try:
-            factory = self.w3.eth.contract(
-                address=Web3.to_checksum_address(factory_addr),
-                abi=FACTORY_ABI
-            )
-            
-            total = factory.functions.totalCoins().call()
-            if total == 0:
+            picked = self._pick_coin(factory_addr)
+            if picked is None:
                 return False
-            
-            # Pick random coin
-            idx = random.randint(0, total - 1)
-            coin_addr = factory.functions.allCoins(idx).call()
-            coin = self.w3.eth.contract(
-                address=Web3.to_checksum_address(coin_addr),
-                abi=COIN_ABI
-            )
-            
-            symbol = coin.functions.symbol().call()
-            trader = random.choice(self.accounts)
-            eth_amount = random.uniform(0.01, 0.2)
+            coin_addr, symbol = picked
             
             # Buy
-            nonce = self.w3.eth.get_transaction_count(trader.address)
-            tx = coin.functions.buy(0).build_transaction({
-                'from': trader.address,
-                'nonce': nonce,
-                'value': self.w3.to_wei(eth_amount, 'ether'),
-                'gas': 200000,
-                'chainId': 31337,
-                'maxFeePerGas': self.w3.to_wei(2, 'gwei'),
-                'maxPriorityFeePerGas': self.w3.to_wei(1, 'gwei'),
-            })
-            
-            signed = self.w3.eth.account.sign_transaction(tx, trader.key)
-            raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-            tx_hash = self.w3.eth.send_raw_transaction(raw)
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            
-            if receipt.status == 1:
-                self.log(f"💰 Bought {format_eth_with_usdc(eth_amount)} of ${symbol}")
-                self.state.data["trades_made"] += 1
-                self.state.record_action("trade", f"BUY ${symbol}")
-                return True
+            tx, eth_amount = self._buy_tx(trader, coin_addr)
+            tx_hash = self._send(trader, tx)
+            self.pending.add(tx_hash, trader.address, self._bought(eth_amount, symbol))
+            return True
         except Exception as e:
+            self.nonces.reset(trader.address)
             self.log(f"❌ Trade failed: {e}")
         return False
     
+    def burst_cycle(self):
+        """
+        One buy per builder account on the same random coin, signed and sent
+        concurrently. Nonces are reserved up front on this thread, so the
+        workers only sign and broadcast.
+        """
+        factory_addr = self.get_factory_address()
+        if not factory_addr:
+            return 0
+        
+        try:
+            picked = self._pick_coin(factory_addr)
+            if picked is None:
+                return 0
+            coin_addr, symbol = picked
+            buys = [(trader, *self._buy_tx(trader, coin_addr)) for trader in self.accounts]
+        except Exception as e:
+            self.nonces.reset()  # Some nonces may be reserved but never sent
+            self.log(f"❌ Burst failed: {e}")
+            return 0
+        
+        sent = 0
+        futures = [(trader, eth_amount, self._pool.submit(self._send, trader, tx)) for trader, tx, eth_amount in buys]
+        for trader, eth_amount, future in futures:
+            try:
+                tx_hash = future.result()
+            except Exception as e:
+                self.nonces.reset(trader.address)
+                self.log(f"❌ Burst trade failed: {e}")
+                continue
+            self.pending.add(tx_hash, trader.address, self._bought(eth_amount, symbol))
+            sent += 1
+        return sent
+    
     def transfer_eth(self):
         """Random ETH transfer between accounts"""
-        sender = random.choice(self.accounts)
-        receiver = random.choice(self.accounts)
+        sender = self._rng.choice(self.accounts)
+        receiver = self._rng.choice(self.accounts)
         if sender.address == receiver.address:
             return False
         
-        amount = random.uniform(0.05, 0.5)
+        amount = self._rng.uniform(0.05, 0.5)
         
         try:
-            nonce = self.w3.eth.get_transaction_count(sender.address)
-            tx = {
-                'from': sender.address,
+            tx_hash = self._send(sender, {
+                **TX_TEMPLATE,
                 'to': receiver.address,
-                'value': self.w3.to_wei(amount, 'ether'),
-                'nonce': nonce,
                 'gas': 21000,
-                'chainId': 31337,
-                'maxFeePerGas': self.w3.to_wei(2, 'gwei'),
-                'maxPriorityFeePerGas': self.w3.to_wei(1, 'gwei'),
-            }
+                'value': int(amount * 10**18),
+                'nonce': self.nonces.next(sender.address),
+            })
             
-            signed = self.w3.eth.account.sign_transaction(tx, sender.key)
-            raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-            tx_hash = self.w3.eth.send_raw_transaction(raw)
-            self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            def transferred():
+                self.log(f"💸 Transferred {amount:.4f} ETH")
+                self.state.data["eth_transferred"] += 1
+                self.state.mark_dirty("eth_transferred")
+                self.state.record_action("transfer", f"{amount:.4f} ETH")
             
-            self.log(f"💸 Transferred {amount:.4f} ETH")
-            self.state.data["eth_transferred"] += 1
-            self.state.record_action("transfer", f"{amount:.4f} ETH")
+            self.pending.add(tx_hash, sender.address, transferred)
             return True
         except Exception as e:
+            self.nonces.reset(sender.address)
             self.log(f"❌ Transfer failed: {e}")
         return False
     
     def run_cycle(self):
         """Run one building cycle"""
         self.state.data["cycle_count"] += 1
+        self.state.mark_dirty("cycle_count")
         cycle = self.state.data["cycle_count"]
         
         self.log(f"=== Cycle {cycle} ===")
+        self._settle_pending()
         
-        # Decide what to do (weighted random)
-        action = random.choices(
-            ["create", "trade", "trade", "trade", "transfer"],
-            weights=[1, 3, 3, 3, 1]
-        )[0]
+        # Decide what to do (weighted random, drawn ACTION_BATCH cycles at a time)
+        if not self._planned_actions:
+            self._planned_actions.extend(self._rng.choices(ACTIONS, cum_weights=ACTION_CUM_WEIGHTS, k=ACTION_BATCH))
+        action = self._planned_actions.popleft()
         
         if action == "create":
             self.create_coin()
@@ -288,6 +340,9 @@ class ContinuousBuilder:
         else:
             self.transfer_eth()
         
+        if BURST_EVERY and cycle % BURST_EVERY == 0:
+            self.log(f"⚡ Burst: {self.burst_cycle()}/{len(self.accounts)} trades sent")
+        
         # Print stats every 10 cycles
         if cycle % 10 == 0:
             self.log(f"📊 Stats: {self.state.data['coins_created']} coins, "
@@ -299,22 +354,25 @@ class ContinuousBuilder:
         self.log("🚀 Continuous Builder started!")
         self.log(f"Factory: {self.get_factory_address()}")
         
+        # docker stop sends SIGTERM; exit normally so atexit saves state
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        
+        wait_for_node(self.w3, self.log)
+        
         while True:
             try:
-                if not self.w3.is_connected():
-                    self.log("Waiting for node...")
-                    time.sleep(5)
-                    continue
-                
                 self.run_cycle()
                 
                 # Random delay between 10-60 seconds
-                delay = random.randint(10, 60)
+                delay = self._rng.randint(10, 60)
                 time.sleep(delay)
                 
             except KeyboardInterrupt:
                 self.log("Shutting down...")
                 break
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                # Connectivity is only probed once a cycle fails to reach the node
+                wait_for_node(self.w3, self.log)
             except Exception as e:
                 self.log(f"Error: {e}")
                 time.sleep(10)
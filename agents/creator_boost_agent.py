@@ -4,58 +4,73 @@ Identifies and promotes quality creators with strategic buys
 Helps real creators succeed on the platform
 """
 import os
-import json
 import time
+import logging
+import heapq
 import random
+from bisect import bisect_left
+from collections import deque
+from functools import cached_property
 from datetime import datetime
+import requests
 from web3 import Web3
 from eth_account import Account
-from price_feed import get_price_feed, format_eth_with_usdc
+from hexbytes import HexBytes
+from price_feed import get_price_feed
+from config import load_deployment
+from state_store import StateStore
+from chain_utils import get_w3, wait_for_node, get_raw_tx, batch_request, NonceTracker, PendingTxs
 
 # Config
 RPC_URL = os.getenv("RPC_URL", "http://thryx-node:8545")
+RPC_TIMEOUT = 10  # seconds
+RPC_RETRIES = 3  # Connection failures and 429/5xx from the node
 STATE_FILE = os.getenv("CREATOR_BOOST_STATE", "/app/data/creator_boost_state.json")
+LOG_LEVEL = os.getenv("CREATOR_BOOST_LOG_LEVEL", "INFO").upper()  # WARNING or above also skips USDC price lookups
+COIN_METRICS_HISTORY = 256  # Metrics entries kept per coin
+
+# Chain id and EIP-1559 fees (wei) shared by every transaction
+CHAIN_ID = 31337
+MAX_FEE_WEI = 2 * 10**9  # 2 gwei
+PRIORITY_FEE_WEI = 1 * 10**9  # 1 gwei
 
 # Creator boost account
 BOOST_KEY = "0x8166f546bab6da521a8369cab06c5d2b9e46670292d85c875ee9ec20e84ffb61"  # Account 17
 
-FACTORY_ABI = [
-    {"name": "totalCoins", "type": "function", "stateMutability": "view",
-     "inputs": [], "outputs": [{"name": "", "type": "uint256"}]},
-    {"name": "allCoins", "type": "function", "stateMutability": "view",
-     "inputs": [{"name": "index", "type": "uint256"}],
-     "outputs": [{"name": "", "type": "address"}]},
-]
+# Score tiers: a value above the i-th threshold earns POINTS[i + 1]
+TVL_TIERS = (10**17, 5 * 10**17, 10**18)  # 0.1 / 0.5 / 1 ETH locked
+TVL_POINTS = (0, 10, 20, 30)
+TRADE_TIERS = (5, 20, 50)
+TRADE_POINTS = (0, 10, 20, 30)
+PRICE_TIERS = (10**14, 10**15)  # 0.0001 / 0.001 ETH
+PRICE_POINTS = (0, 10, 20)
+BOOST_COOLDOWN = 3600  # 1 hour
+
+# Selectors for the factory/coin calls on the boost path, hashed once
+TOTAL_COINS_SELECTOR = Web3.keccak(text="totalCoins()")[:4]
+ALL_COINS_SELECTOR = Web3.keccak(text="allCoins(uint256)")[:4]
+SYMBOL_SELECTOR = Web3.keccak(text="symbol()")[:4]
+CREATOR_SELECTOR = Web3.keccak(text="creator()")[:4]
+COIN_METRIC_SELECTORS = tuple(  # price, TVL, trades
+    Web3.keccak(text=sig)[:4] for sig in ("getCurrentPrice()", "totalEthLocked()", "totalTrades()")
+)
+BUY_CALLDATA = Web3.keccak(text="buy(uint256)")[:4] + bytes(32)  # buy(minTokensOut=0)
+
+
+def _eth_call(to: str, data: bytes) -> tuple:
+    """eth_call entry for batch_request"""
+    return ("eth_call", [{"to": to, "data": "0x" + data.hex()}, "latest"])
 
-COIN_ABI = [
-    {"name": "buy", "type": "function", "stateMutability": "payable",
-     "inputs": [{"name": "minTokensOut", "type": "uint256"}],
-     "outputs": [{"name": "", "type": "uint256"}]},
-    {"name": "getCurrentPrice", "type": "function", "stateMutability": "view",
-     "inputs": [], "outputs": [{"name": "", "type": "uint256"}]},
-    {"name": "totalEthLocked", "type": "function", "stateMutability": "view",
-     "inputs": [], "outputs": [{"name": "", "type": "uint256"}]},
-    {"name": "totalTrades", "type": "function", "stateMutability": "view",
-     "inputs": [], "outputs": [{"name": "", "type": "uint256"}]},
-    {"name": "symbol", "type": "function", "stateMutability": "view",
-     "inputs": [], "outputs": [{"name": "", "type": "string"}]},
-    {"name": "creator", "type": "function", "stateMutability": "view",
-     "inputs": [], "outputs": [{"name": "", "type": "address"}]},
-]
 
+def _uint(result):
+    """A hex-encoded single-word return value as int, None for a failed or empty call"""
+    return int(result[:66], 16) if result and len(result) >= 66 else None
 
-class CreatorBoostState:
-    def __init__(self, filepath):
-        self.filepath = filepath
-        self.data = self._load()
+
+class CreatorBoostState(StateStore):
+    SPLIT_KEYS = ("creator_scores", "coin_metrics", "last_boost")
     
-    def _load(self):
-        try:
-            if os.path.exists(self.filepath):
-                with open(self.filepath, 'r') as f:
-                    return json.load(f)
-        except:
-            pass
+    def default_state(self):
         return {
             "boosts_given": 0,
             "eth_invested": 0,
@@ -66,104 +81,120 @@ class CreatorBoostState:
             "started_at": datetime.now().isoformat(),
         }
     
-    def save(self):
-        try:
-            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
-            with open(self.filepath, 'w') as f:
-                json.dump(self.data, f, indent=2)
-        except:
-            pass
+    def prepare(self, data):
+        # Per-coin history is a ring buffer of the last COIN_METRICS_HISTORY entries
+        data["coin_metrics"] = {
+            coin: deque(history, maxlen=COIN_METRICS_HISTORY)
+            for coin, history in data["coin_metrics"].items()
+        }
+        return data
 
 
 class CreatorBoostAgent:
     def __init__(self):
         self.name = "CREATOR_BOOST"
-        self.w3 = Web3(Web3.HTTPProvider(RPC_URL))
+        self.w3 = get_w3(RPC_URL, RPC_TIMEOUT, RPC_RETRIES)
         self.state = CreatorBoostState(STATE_FILE)
         self.account = Account.from_key(BOOST_KEY)
-        self.deployment = self._load_deployment()
-        self.price_feed = get_price_feed()
+        self.nonces = NonceTracker(self.w3)  # Resynced from the node after any failed boost
+        self.pending = PendingTxs(self.w3, self.nonces)
+        self.deployment = load_deployment()
+        self._log = logging.getLogger(self.name)
         
-    def _load_deployment(self):
-        try:
-            with open("/app/deployment.json", "r") as f:
-                return json.load(f)
-        except:
-            return {"contracts": {}}
+        # Immutable coin data: factory index -> address, address -> (symbol, creator)
+        self._coin_addrs = []
+        self._coin_info = {}
+        
+    @cached_property
+    def price_feed(self):
+        """Created on first use, so the oracle is never touched while INFO logs are off"""
+        return get_price_feed()
     
     def log(self, msg):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        print(f"[{timestamp}] ⭐ {self.name}: {msg}")
+        self._log.info(msg)
+    
+    def format_eth(self, eth_amount: float) -> str:
+        """ETH amount with its USDC value, skipping the oracle when the line won't be logged"""
+        if not self._log.isEnabledFor(logging.INFO):
+            return ""
+        return self.price_feed.format_eth_with_usdc(eth_amount)
     
     def get_all_coins(self):
-        """Get all creator coins with metadata"""
+        """
+        Get all creator coins with metadata, in at most three batched round-trips.
+        Coin addresses, symbols and creators never change, so they are only
+        fetched for coins not seen before; each cycle re-reads price, TVL and trades.
+        Calldata is built from precomputed selectors and results decoded by slicing.
+        """
         factory_addr = self.deployment.get("contracts", {}).get("CreatorCoinFactory", "")
         if not factory_addr:
             return []
         
         coins = []
         try:
-            factory = self.w3.eth.contract(
-                address=Web3.to_checksum_address(factory_addr),
-                abi=FACTORY_ABI
-            )
-            total = factory.functions.totalCoins().call()
+            total = _uint(self.w3.eth.call({"to": factory_addr, "data": TOTAL_COINS_SELECTOR}).hex())
+            
+            known = len(self._coin_addrs)
+            if total > known:
+                new_addrs = batch_request(self.w3, [
+                    _eth_call(factory_addr, ALL_COINS_SELECTOR + i.to_bytes(32, "big"))
+                    for i in range(known, total)
+                ])
+                for result in new_addrs:
+                    if _uint(result) is None:
+                        break  # Keep indexes contiguous; retry the rest next cycle
+                    self._coin_addrs.append(Web3.to_checksum_address("0x" + result[-40:]))
             
-            for i in range(total):
-                coin_addr = factory.functions.allCoins(i).call()
-                coin = self.w3.eth.contract(
-                    address=Web3.to_checksum_address(coin_addr),
-                    abi=COIN_ABI
-                )
+            calls = []
+            for coin_addr in self._coin_addrs:
+                if coin_addr not in self._coin_info:
+                    calls += [_eth_call(coin_addr, SYMBOL_SELECTOR), _eth_call(coin_addr, CREATOR_SELECTOR)]
+                calls += [_eth_call(coin_addr, selector) for selector in COIN_METRIC_SELECTORS]
+            results = iter(batch_request(self.w3, calls))
+            
+            for coin_addr in self._coin_addrs:
+                if coin_addr not in self._coin_info:
+                    symbol, creator = next(results), next(results)
+                    if _uint(creator) is not None and symbol:
+                        try:
+                            symbol = self.w3.codec.decode(["string"], HexBytes(symbol))[0]
+                            self._coin_info[coin_addr] = (symbol, Web3.to_checksum_address("0x" + creator[-40:]))
+                        except Exception:
+                            pass
+                price, tvl, trades = (_uint(next(results)) for _ in COIN_METRIC_SELECTORS)
+                if coin_addr not in self._coin_info or None in (price, tvl, trades):
+                    continue
                 
+                symbol, creator = self._coin_info[coin_addr]
                 coins.append({
                     "address": coin_addr,
-                    "symbol": coin.functions.symbol().call(),
-                    "creator": coin.functions.creator().call(),
-                    "price": coin.functions.getCurrentPrice().call(),
-                    "tvl": coin.functions.totalEthLocked().call(),
-                    "trades": coin.functions.totalTrades().call(),
+                    "symbol": symbol,
+                    "creator": creator,
+                    "price": price,
+                    "tvl": tvl,
+                    "trades": trades,
                 })
         except Exception as e:
             self.log(f"Error getting coins: {e}")
         
         return coins
     
-    def calculate_creator_score(self, coin_data):
+    def calculate_creator_score(self, coin_data, now=None):
         """
         Calculate creator quality score based on metrics
         Higher score = more worthy of boost
         """
-        score = 0
-        
-        # TVL score (more locked = more committed community)
-        tvl_eth = coin_data["tvl"] / 10**18
-        if tvl_eth > 1:
-            score += 30
-        elif tvl_eth > 0.5:
-            score += 20
-        elif tvl_eth > 0.1:
-            score += 10
-        
-        # Trade activity score
-        trades = coin_data["trades"]
-        if trades > 50:
-            score += 30
-        elif trades > 20:
-            score += 20
-        elif trades > 5:
-            score += 10
-        
-        # Price health (higher price = more demand)
-        price = coin_data["price"]
-        if price > 10**15:  # > 0.001 ETH
-            score += 20
-        elif price > 10**14:
-            score += 10
+        # TVL (more locked = more committed community), trade activity and
+        # price health (higher price = more demand)
+        score = (
+            TVL_POINTS[bisect_left(TVL_TIERS, coin_data["tvl"])]
+            + TRADE_POINTS[bisect_left(TRADE_TIERS, coin_data["trades"])]
+            + PRICE_POINTS[bisect_left(PRICE_TIERS, coin_data["price"])]
+        )
         
         # Boost cooldown penalty
         last_boost = self.state.data["last_boost"].get(coin_data["address"], 0)
-        if time.time() - last_boost < 3600:  # 1 hour cooldown
+        if (now or time.time()) - last_boost < BOOST_COOLDOWN:
             score -= 50
         
         return max(0, score)
@@ -173,33 +204,20 @@ class CreatorBoostAgent:
         if not coins:
             return None
         
-        # Calculate scores for all coins
-        scored = []
-        for coin in coins:
-            score = self.calculate_creator_score(coin)
-            scored.append((coin, score))
-        
-        # Sort by score
-        scored.sort(key=lambda x: x[1], reverse=True)
-        
-        # Get top candidates (score > 20)
-        candidates = [(c, s) for c, s in scored if s > 20]
+        # Get top 3 candidates (score > 20)
+        now = time.time()
+        scored = [(coin, self.calculate_creator_score(coin, now)) for coin in coins]
+        top = heapq.nlargest(3, [(c, s) for c, s in scored if s > 20], key=lambda x: x[1])
         
-        if not candidates:
+        if not top:
             return None
         
         # Pick randomly from top 3 (adds variety)
-        top = candidates[:3]
         return random.choice(top)[0]
     
     def boost_creator(self, coin_data):
         """Give a creator a boost buy"""
         try:
-            coin = self.w3.eth.contract(
-                address=Web3.to_checksum_address(coin_data["address"]),
-                abi=COIN_ABI
-            )
-            
             # Boost amount based on TVL (bigger coins get smaller % boost)
             tvl_eth = coin_data["tvl"] / 10**18
             if tvl_eth < 0.1:
@@ -209,55 +227,68 @@ class CreatorBoostAgent:
             else:
                 amount = 0.02
             
+            amount_wei = self.w3.to_wei(amount, 'ether')
+            
             # Check balance
             balance = self.w3.eth.get_balance(self.account.address)
-            if balance < self.w3.to_wei(amount, 'ether'):
+            if balance < amount_wei:
                 self.log(f"⚠️ Low balance for boost")
                 return False
             
-            nonce = self.w3.eth.get_transaction_count(self.account.address)
-            tx = coin.functions.buy(0).build_transaction({
-                'from': self.account.address,
-                'nonce': nonce,
-                'value': self.w3.to_wei(amount, 'ether'),
+            tx = {
+                'type': 2,
+                'to': coin_data["address"],
+                'nonce': self.nonces.next(self.account.address),
+                'value': amount_wei,
+                'data': BUY_CALLDATA,
                 'gas': 200000,
-                'chainId': 31337,
-                'maxFeePerGas': self.w3.to_wei(2, 'gwei'),
-                'maxPriorityFeePerGas': self.w3.to_wei(1, 'gwei'),
-            })
+                'chainId': CHAIN_ID,
+                'maxFeePerGas': MAX_FEE_WEI,
+                'maxPriorityFeePerGas': PRIORITY_FEE_WEI,
+            }
             
             signed = self.w3.eth.account.sign_transaction(tx, self.account.key)
-            raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
+            raw = get_raw_tx(signed)
             tx_hash = self.w3.eth.send_raw_transaction(raw)
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
             
-            if receipt.status == 1:
-                self.log(f"⭐ Boosted ${coin_data['symbol']} with {format_eth_with_usdc(amount)}")
+            def boosted():
+                self.log(f"⭐ Boosted ${coin_data['symbol']} with {self.format_eth(amount)}")
                 self.log(f"   Creator: {coin_data['creator'][:10]}...")
                 
                 # Update state
                 self.state.data["boosts_given"] += 1
                 self.state.data["eth_invested"] += amount
                 self.state.data["last_boost"][coin_data["address"]] = time.time()
+                self.state.mark_dirty("boosts_given", "eth_invested")
+                self.state.mark_entry_dirty("last_boost", coin_data["address"])
                 
                 creator = coin_data["creator"]
                 if creator not in self.state.data["creators_boosted"]:
                     self.state.data["creators_boosted"].append(creator)
+                    self.state.mark_dirty("creators_boosted")
                 
                 # Update creator score
                 self.state.data["creator_scores"][creator] = \
                     self.state.data["creator_scores"].get(creator, 0) + 10
+                self.state.mark_entry_dirty("creator_scores", creator)
                 
                 self.state.save()
-                return True
+            
+            # Settled at the start of the next cycle instead of waiting for the block
+            self.pending.add(tx_hash, self.account.address, boosted)
+            return True
                 
         except Exception as e:
+            self.nonces.reset(self.account.address)
             self.log(f"Boost failed: {e}")
         
         return False
     
     def run_cycle(self):
         """Find and boost worthy creators"""
+        for tx_hash, outcome in self.pending.settle():
+            self.log(f"Boost {tx_hash[:10]}... {outcome}")
+        
         coins = self.get_all_coins()
         if not coins:
             return
@@ -276,16 +307,12 @@ class CreatorBoostAgent:
         self.log(f"Boost wallet: {self.account.address}")
         self.log("Mission: Help real creators succeed")
         
+        wait_for_node(self.w3, self.log)
         balance = self.w3.eth.get_balance(self.account.address)
-        self.log(f"Boost fund: {format_eth_with_usdc(balance / 10**18)}")
+        self.log(f"Boost fund: {self.format_eth(balance / 10**18)}")
         
         while True:
             try:
-                if not self.w3.is_connected():
-                    self.log("Waiting for node...")
-                    time.sleep(5)
-                    continue
-                
                 self.run_cycle()
                 
                 # Run every 2-5 minutes
@@ -294,11 +321,19 @@ class CreatorBoostAgent:
             except KeyboardInterrupt:
                 self.log("Shutting down...")
                 break
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                # Connectivity is only probed once a cycle fails to reach the node
+                wait_for_node(self.w3, self.log)
             except Exception as e:
                 self.log(f"Error: {e}")
                 time.sleep(10)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=LOG_LEVEL,
+        format='[%(asctime)s] ⭐ %(name)s: %(message)s',
+        datefmt='%H:%M:%S'
+    )
     agent = CreatorBoostAgent()
     agent.run()
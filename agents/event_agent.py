@@ -3,18 +3,34 @@ THRYX Event Scheduler Agent
 Runs scheduled events: daily token launches, weekly airdrops, monthly mega-events
 """
 import os
-import json
 import time
 import random
-from datetime import datetime, timedelta
-from web3 import Web3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from web3 import Web3, AsyncWeb3, AsyncHTTPProvider
 from eth_account import Account
 from price_feed import format_eth_with_usdc
+from config import load_deployment
+from chain_utils import get_contract, get_raw_tx, json_dumps, json_loads, AsyncNonceTracker, TxSigner
 
 # Config
 RPC_URL = os.getenv("RPC_URL", "http://thryx-node:8545")
 STATE_FILE = os.getenv("EVENT_STATE", "/app/data/event_state.json")
 
+# Minimum seconds between two launches of each event
+EVENT_INTERVALS = {
+    "daily": 20 * 3600,
+    "weekly": 6 * 86400,
+    "monthly": 25 * 86400,
+}
+RETRY_DELAY = 300  # Seconds before retrying an event whose launch failed
+
+# Chain id and EIP-1559 fees (wei) shared by every transaction
+CHAIN_ID = 31337
+MAX_FEE_WEI = 2 * 10**9  # 2 gwei
+PRIORITY_FEE_WEI = 1 * 10**9  # 1 gwei
+
 # Event agent account
 EVENT_KEY = "0xde9be858da4a475276426320d5e9262ecfc3ba460bfac56360bfa6c4c28b4ee0"  # Account 12
 
@@ -25,8 +41,14 @@ FACTORY_ABI = [
      "outputs": [{"name": "", "type": "address"}]},
     {"name": "totalCoins", "type": "function", "stateMutability": "view",
      "inputs": [], "outputs": [{"name": "", "type": "uint256"}]},
+    {"name": "allCoins", "type": "function", "stateMutability": "view",
+     "inputs": [{"name": "index", "type": "uint256"}],
+     "outputs": [{"name": "", "type": "address"}]},
 ]
 
+# CoinCreated(address indexed coin, address indexed creator, string name, string symbol, string profileUri)
+COIN_CREATED_TOPIC = Web3.keccak(text="CoinCreated(address,address,string,string,string)")
+
 COIN_ABI = [
     {"name": "buy", "type": "function", "stateMutability": "payable",
      "inputs": [{"name": "minTokensOut", "type": "uint256"}],
@@ -61,15 +83,33 @@ MONTHLY_THEMES = [
 
 
 class EventState:
+    """
+    last_<kind> holds each event's last run as ISO text for people reading
+    the file; last_<kind>_ts holds the same moment as epoch seconds, which
+    is what the scheduler compares against.
+    """
+    
     def __init__(self, filepath):
         self.filepath = filepath
         self.data = self._load()
+        
+        # State files from before the epoch fields only have the ISO text
+        for kind in EVENT_INTERVALS:
+            last = self.data.get(f"last_{kind}")
+            if last and f"last_{kind}_ts" not in self.data:
+                self.data[f"last_{kind}_ts"] = datetime.fromisoformat(last).timestamp()
+    
+    def mark_run(self, kind):
+        """Record that the `kind` event ran now"""
+        now = time.time()
+        self.data[f"last_{kind}"] = datetime.fromtimestamp(now).isoformat()
+        self.data[f"last_{kind}_ts"] = now
     
     def _load(self):
         try:
             if os.path.exists(self.filepath):
-                with open(self.filepath, 'r') as f:
-                    return json.load(f)
+                with open(self.filepath, 'rb') as f:
+                    return json_loads(f.read())
         except:
             pass
         return {
@@ -85,8 +125,8 @@ class EventState:
     def save(self):
         try:
             os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
-            with open(self.filepath, 'w') as f:
-                json.dump(self.data, f, indent=2)
+            with open(self.filepath, 'wb') as f:
+                f.write(json_dumps(self.data, indent=True))
         except:
             pass
 
@@ -94,51 +134,57 @@ class EventState:
 class EventAgent:
     def __init__(self):
         self.name = "EVENT"
-        self.w3 = Web3(Web3.HTTPProvider(RPC_URL))
+        self.w3 = AsyncWeb3(AsyncHTTPProvider(RPC_URL))
         self.state = EventState(STATE_FILE)
         self.account = Account.from_key(EVENT_KEY)
-        self.deployment = self._load_deployment()
-        self.used_symbols = set(self.state.data.get("coins_launched", []))
+        # Sole sender from this wallet: nonces are tracked locally, resynced after a failed launch
+        self.nonces = AsyncNonceTracker(self.w3)
+        self._signer = TxSigner(self.account.key)
+        # One signing thread per concurrently launched event, keeping ECDSA off the event loop
+        self._sign_pool = ThreadPoolExecutor(max_workers=len(EVENT_INTERVALS))
+        self.deployment = load_deployment()
+        # Factory contract, built once; None until a factory is deployed
+        factory_addr = self.deployment.get("contracts", {}).get("CreatorCoinFactory", "")
+        self.factory = get_contract(self.w3, factory_addr, FACTORY_ABI) if factory_addr else None
+        # Launched symbols, deduped once here so launches only touch the set
+        launched = list(dict.fromkeys(self.state.data.get("coins_launched", [])))
+        self.state.data["coins_launched"] = launched
+        self.used_symbols = set(launched)
         
-    def _load_deployment(self):
-        try:
-            with open("/app/deployment.json", "r") as f:
-                return json.load(f)
-        except:
-            return {"contracts": {}}
-    
     def log(self, msg):
         timestamp = datetime.now().strftime("%H:%M:%S")
         print(f"[{timestamp}] 📅 {self.name}: {msg}")
     
     def should_run_daily(self):
         """Check if daily event should run"""
-        last = self.state.data.get("last_daily")
-        if not last:
-            return True
-        last_dt = datetime.fromisoformat(last)
-        return datetime.now() - last_dt > timedelta(hours=20)
+        return time.time() - self.state.data.get("last_daily_ts", 0) > EVENT_INTERVALS["daily"]
     
     def should_run_weekly(self):
         """Check if weekly event should run"""
-        last = self.state.data.get("last_weekly")
-        if not last:
-            return True
-        last_dt = datetime.fromisoformat(last)
-        return datetime.now() - last_dt > timedelta(days=6)
+        return time.time() - self.state.data.get("last_weekly_ts", 0) > EVENT_INTERVALS["weekly"]
     
     def should_run_monthly(self):
         """Check if monthly event should run"""
-        last = self.state.data.get("last_monthly")
-        if not last:
-            return True
-        last_dt = datetime.fromisoformat(last)
-        return datetime.now() - last_dt > timedelta(days=25)
+        return time.time() - self.state.data.get("last_monthly_ts", 0) > EVENT_INTERVALS["monthly"]
+    
+    async def _send(self, tx):
+        """Sign on the signing pool and broadcast, returning the tx hash"""
+        signed = await asyncio.get_running_loop().run_in_executor(self._sign_pool, self._signer.sign, tx)
+        return await self.w3.eth.send_raw_transaction(get_raw_tx(signed))
+    
+    def seconds_until_next_event(self):
+        """Time to sleep until the earliest event becomes due; RETRY_DELAY if one already is"""
+        now = time.time()
+        wait = min(
+            self.state.data.get(f"last_{kind}_ts", 0) + interval - now
+            for kind, interval in EVENT_INTERVALS.items()
+        )
+        # Due now means this cycle's launch failed; +1s since should_run_* needs strictly past
+        return wait + 1 if wait > 0 else RETRY_DELAY
     
-    def launch_coin(self, name, symbol, bio, liquidity_eth):
+    async def launch_coin(self, name, symbol, bio, liquidity_eth):
         """Launch a new coin with initial liquidity"""
-        factory_addr = self.deployment.get("contracts", {}).get("CreatorCoinFactory", "")
-        if not factory_addr:
+        if not self.factory:
             self.log("No factory address")
             return None
         
@@ -150,70 +196,61 @@ class EventAgent:
             counter += 1
         
         try:
-            factory = self.w3.eth.contract(
-                address=Web3.to_checksum_address(factory_addr),
-                abi=FACTORY_ABI
-            )
-            
             # Create coin
-            nonce = self.w3.eth.get_transaction_count(self.account.address)
-            tx = factory.functions.createCoin(name, symbol, bio).build_transaction({
+            nonce = await self.nonces.next(self.account.address)
+            tx = await self.factory.functions.createCoin(name, symbol, bio).build_transaction({
                 'from': self.account.address,
                 'nonce': nonce,
                 'gas': 3000000,
-                'chainId': 31337,
-                'maxFeePerGas': self.w3.to_wei(2, 'gwei'),
-                'maxPriorityFeePerGas': self.w3.to_wei(1, 'gwei'),
+                'chainId': CHAIN_ID,
+                'maxFeePerGas': MAX_FEE_WEI,
+                'maxPriorityFeePerGas': PRIORITY_FEE_WEI,
             })
             
-            signed = self.w3.eth.account.sign_transaction(tx, self.account.key)
-            raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-            tx_hash = self.w3.eth.send_raw_transaction(raw)
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            tx_hash = await self._send(tx)
+            receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash)
             
             if receipt.status != 1:
                 return None
             
-            # Get the new coin address from logs
-            total = factory.functions.totalCoins().call()
-            coin_addr = factory.functions.allCoins(total - 1).call()
+            # Get the new coin address from logs (totalCoins() - 1 races concurrent launches)
+            coin_addr = next(
+                Web3.to_checksum_address(log["topics"][1][-20:])
+                for log in receipt["logs"] if log["topics"] and log["topics"][0] == COIN_CREATED_TOPIC
+            )
             
             self.log(f"🚀 Launched ${symbol} - {name}")
-            self.used_symbols.add(symbol)
-            self.state.data["coins_launched"].append(symbol)
+            if symbol not in self.used_symbols:
+                self.used_symbols.add(symbol)
+                self.state.data["coins_launched"].append(symbol)
             
             # Add initial liquidity
             if liquidity_eth > 0:
-                time.sleep(2)
-                coin = self.w3.eth.contract(
-                    address=Web3.to_checksum_address(coin_addr),
-                    abi=COIN_ABI
-                )
+                coin = get_contract(self.w3, coin_addr, COIN_ABI)
                 
-                nonce = self.w3.eth.get_transaction_count(self.account.address)
-                buy_tx = coin.functions.buy(0).build_transaction({
+                nonce = await self.nonces.next(self.account.address)
+                buy_tx = await coin.functions.buy(0).build_transaction({
                     'from': self.account.address,
                     'nonce': nonce,
                     'value': self.w3.to_wei(liquidity_eth, 'ether'),
                     'gas': 200000,
-                    'chainId': 31337,
-                    'maxFeePerGas': self.w3.to_wei(2, 'gwei'),
-                    'maxPriorityFeePerGas': self.w3.to_wei(1, 'gwei'),
+                    'chainId': CHAIN_ID,
+                    'maxFeePerGas': MAX_FEE_WEI,
+                    'maxPriorityFeePerGas': PRIORITY_FEE_WEI,
                 })
                 
-                signed = self.w3.eth.account.sign_transaction(buy_tx, self.account.key)
-                raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
-                self.w3.eth.send_raw_transaction(raw)
+                await self._send(buy_tx)
                 
                 self.log(f"💰 Added {format_eth_with_usdc(liquidity_eth)} initial liquidity")
             
             return coin_addr
             
         except Exception as e:
+            self.nonces.reset(self.account.address)
             self.log(f"Launch error: {e}")
             return None
     
-    def run_daily_event(self):
+    async def run_daily_event(self):
         """Run daily mini token launch"""
         self.log("🌅 Running DAILY event...")
         
@@ -224,10 +261,10 @@ class EventAgent:
         date_suffix = datetime.now().strftime("%m%d")
         name = f"{name} {date_suffix}"
         
-        coin_addr = self.launch_coin(name, symbol, bio, 0.05)
+        coin_addr = await self.launch_coin(name, symbol, bio, 0.05)
         
         if coin_addr:
-            self.state.data["last_daily"] = datetime.now().isoformat()
+            self.state.mark_run("daily")
             self.state.data["events_run"] += 1
             self.state.data["event_history"].append({
                 "type": "daily",
@@ -237,7 +274,7 @@ class EventAgent:
             })
             self.state.save()
     
-    def run_weekly_event(self):
+    async def run_weekly_event(self):
         """Run weekly token launch with airdrop"""
         self.log("📅 Running WEEKLY event...")
         
@@ -248,10 +285,10 @@ class EventAgent:
         week = datetime.now().isocalendar()[1]
         name = f"{name} W{week}"
         
-        coin_addr = self.launch_coin(name, symbol, bio, 0.2)
+        coin_addr = await self.launch_coin(name, symbol, bio, 0.2)
         
         if coin_addr:
-            self.state.data["last_weekly"] = datetime.now().isoformat()
+            self.state.mark_run("weekly")
             self.state.data["events_run"] += 1
             self.state.data["event_history"].append({
                 "type": "weekly",
@@ -261,7 +298,7 @@ class EventAgent:
             })
             self.state.save()
     
-    def run_monthly_event(self):
+    async def run_monthly_event(self):
         """Run monthly mega launch"""
         self.log("🎉 Running MONTHLY MEGA event...")
         
@@ -272,10 +309,10 @@ class EventAgent:
         month = datetime.now().strftime("%b")
         name = f"{name} {month}"
         
-        coin_addr = self.launch_coin(name, symbol, bio, 0.5)
+        coin_addr = await self.launch_coin(name, symbol, bio, 0.5)
         
         if coin_addr:
-            self.state.data["last_monthly"] = datetime.now().isoformat()
+            self.state.mark_run("monthly")
             self.state.data["events_run"] += 1
             self.state.data["event_history"].append({
                 "type": "monthly",
@@ -285,47 +322,49 @@ class EventAgent:
             })
             self.state.save()
     
-    def run_cycle(self):
-        """Check and run scheduled events"""
-        # Check monthly first (most important)
+    async def run_cycle(self):
+        """
+        Check and run scheduled events. Due launches run concurrently; each
+        reserves its createCoin nonce as its first await, so monthly,
+        weekly and daily get consecutive nonces in that order.
+        """
+        due = []
         if self.should_run_monthly():
-            self.run_monthly_event()
-            time.sleep(5)
-        
-        # Then weekly
+            due.append(self.run_monthly_event())
         if self.should_run_weekly():
-            self.run_weekly_event()
-            time.sleep(5)
-        
-        # Then daily
+            due.append(self.run_weekly_event())
         if self.should_run_daily():
-            self.run_daily_event()
+            due.append(self.run_daily_event())
+        
+        await asyncio.gather(*due)
     
-    def run(self):
+    async def run(self):
         """Main loop"""
         self.log("🚀 Event Scheduler Agent started!")
         self.log(f"Event wallet: {self.account.address}")
         
         while True:
             try:
-                if not self.w3.is_connected():
+                if not await self.w3.is_connected():
                     self.log("Waiting for node...")
-                    time.sleep(5)
+                    await asyncio.sleep(5)
                     continue
                 
-                self.run_cycle()
+                await self.run_cycle()
                 
-                # Check every 5 minutes
-                time.sleep(300)
+                # Sleep until the next event is due instead of polling
+                delay = self.seconds_until_next_event()
+                self.log(f"Next event check in {delay / 3600:.1f}h")
+                await asyncio.sleep(delay)
                 
-            except KeyboardInterrupt:
-                self.log("Shutting down...")
-                break
             except Exception as e:
                 self.log(f"Error: {e}")
-                time.sleep(30)
+                await asyncio.sleep(30)
 
 
 if __name__ == "__main__":
     agent = EventAgent()
-    agent.run()
+    try:
+        asyncio.run(agent.run())
+    except KeyboardInterrupt:
+        agent.log("Shutting down...")
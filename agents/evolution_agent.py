@@ -8,35 +8,75 @@ This agent autonomously:
 - Generates value for the chain continuously
 """
 import os
-import json
+import sys
+import atexit
+import signal
 import time
 import random
 from datetime import datetime, timedelta
 from web3 import Web3
 from eth_account import Account
+from chain_utils import (
+    get_w3, get_contract, get_raw_tx, batch_request, json_dumps, json_loads, MulticallReader, NonceTracker, TxSigner,
+)
+from config import load_deployment, MULTICALL3_ADDRESS, MULTICALL3_ABI, CREATOR_FACTORY_ABI, CREATOR_COIN_ABI
 
 # Configuration
 RPC_URL = os.getenv("RPC_URL", "http://localhost:8545")
-DEPLOYMENT_FILE = os.getenv("DEPLOYMENT_FILE", "/app/deployment.json")
+RPC_TIMEOUT = 10  # seconds
+RPC_RETRIES = 3  # Connection failures and 429/5xx from the node
 MEMORY_FILE = os.getenv("EVOLUTION_MEMORY_FILE", "/app/data/evolution_memory.json")
+SNAPSHOT_EVERY = 10  # actions between memory snapshots; events are appended as they happen
+
+# Chain id and EIP-1559 fees (wei) shared by every transaction
+CHAIN_ID = 31337
+MAX_FEE_WEI = 2 * 10**9  # 2 gwei
+PRIORITY_FEE_WEI = 1 * 10**9  # 1 gwei
 
 # Evolution parameters
 MIN_ACTIVITY_FOR_NEW_TOKEN = 5  # trades before considering new token
 VALUE_THRESHOLD_ETH = 0.01  # minimum value to trigger actions
 LEARNING_RATE = 0.1  # how fast to adapt strategies
+CYCLE_INTERVAL = 60  # seconds between evolution cycles
+IDLE_CYCLE_INTERVAL = 600  # seconds between cycles while every action strategy is disabled
+ACTIVITY_WINDOW = 10  # blocks before the head scanned for recent activity
+
+# Ecosystem token ideas: (name, symbol, description)
+THEMES = (
+    ("THRYX Governance", "TGOV", "Governance token for THRYX ecosystem decisions"),
+    ("THRYX Rewards", "TRWD", "Rewards token for active participants"),
+    ("AI Agent Token", "AGENT", "Token representing AI agent collective"),
+    ("Bridge Bonus", "BRDG", "Bonus token for bridge users"),
+    ("Liquidity Mining", "TLIQ", "Rewards for liquidity providers"),
+    ("Creator Fund", "CFUND", "Shared fund for top creators"),
+)
 
 
 class EvolutionMemory:
-    """Persistent memory for learning and evolution"""
+    """
+    Persistent memory for learning and evolution, split by growth:
+    - <memory>.json: counters, strategies and created tokens, snapshotted
+      every SNAPSHOT_EVERY actions and on exit
+    - evolution_events.jsonl: one appended line per action and evolution event
+    """
     
     def __init__(self, filepath: str):
         self.filepath = filepath
+        self.events_file = os.path.join(os.path.dirname(filepath), "evolution_events.jsonl")
         self.memory = self._load()
+        self._unsaved_actions = 0
+        
+        # The evolution log used to live in the snapshot
+        legacy_log = self.memory.pop("evolution_log", [])
+        if legacy_log and not os.path.exists(self.events_file):
+            self._append_events([{"type": "evolution", **entry} for entry in legacy_log])
+            self.save()
+        atexit.register(self.save)
     
     def _load(self) -> dict:
         try:
-            with open(self.filepath, 'r') as f:
-                return json.load(f)
+            with open(self.filepath, 'rb') as f:
+                return json_loads(f.read())
         except:
             return {
                 "created_at": datetime.now().isoformat(),
@@ -55,17 +95,25 @@ class EvolutionMemory:
                 "learned_patterns": [],
                 "value_generated_eth": 0,
                 "last_evolution": None,
-                "evolution_log": [],
             }
     
     def save(self):
+        """Snapshot the (small, bounded) memory dict"""
         try:
             self.memory["last_saved"] = datetime.now().isoformat()
-            with open(self.filepath, 'w') as f:
-                json.dump(self.memory, f, indent=2, default=str)
+            with open(self.filepath, 'wb') as f:
+                f.write(json_dumps(self.memory))
+            self._unsaved_actions = 0
         except Exception as e:
             print(f"[EVOLUTION] Warning: Could not save memory: {e}")
     
+    def _append_events(self, entries: list):
+        try:
+            with open(self.events_file, 'ab') as f:
+                f.writelines(json_dumps(entry) + b"\n" for entry in entries)
+        except OSError as e:
+            print(f"[EVOLUTION] Warning: Could not append events: {e}")
+    
     def record_action(self, action_type: str, success: bool, details: dict = None):
         """Record an action and learn from it"""
         self.memory["total_actions"] += 1
@@ -90,18 +138,27 @@ class EvolutionMemory:
                 strat["enabled"] = True
                 self.log_evolution(f"Re-enabled strategy '{action_type}' (success rate: {new_rate:.2%})")
         
-        self.save()
+        self._append_events([{
+            "type": "action",
+            "timestamp": datetime.now().isoformat(),
+            "action": action_type,
+            "success": success,
+            "details": details,
+        }])
+        self._unsaved_actions += 1
+        if self._unsaved_actions >= SNAPSHOT_EVERY:
+            self.save()
     
     def log_evolution(self, message: str):
         """Log an evolution event"""
         entry = {
+            "type": "evolution",
             "timestamp": datetime.now().isoformat(),
             "generation": self.memory["generation"],
             "message": message
         }
-        self.memory["evolution_log"].append(entry)
+        self._append_events([entry])
         print(f"[EVOLUTION] 🧬 {message}")
-        self.save()
     
     def evolve(self):
         """Increment generation and potentially mutate strategies"""
@@ -122,6 +179,9 @@ class EvolutionMemory:
             return 0.5
         return self.memory["successful_actions"] / total
     
+    def any_strategy_enabled(self, strategies) -> bool:
+        return any(self.memory["strategies"].get(s, {"enabled": True})["enabled"] for s in strategies)
+    
     def should_try_strategy(self, strategy: str) -> bool:
         """Decide whether to try a strategy based on learned success rate"""
         if strategy not in self.memory["strategies"]:
@@ -138,51 +198,53 @@ class EvolutionAgent:
     
     def __init__(self):
         self.name = "EVOLUTION"
-        self.w3 = Web3(Web3.HTTPProvider(RPC_URL))
+        self.w3 = get_w3(RPC_URL, RPC_TIMEOUT, RPC_RETRIES)
         self.memory = EvolutionMemory(MEMORY_FILE)
         
         # Load deployment
-        self.deployment = self._load_deployment()
+        self.deployment = load_deployment()
         
         # Use Hardhat account for actions
         self.account = Account.from_key(
             os.getenv("EVOLUTION_PRIVATE_KEY", 
                       "0x5de4111afa1a4b94908f83103eb1f1706367c2e68ca870fc3fb9a804cdab365a")  # Account 2
         )
+        # Sole sender from this wallet: nonces are tracked locally, resynced after a failed send
+        self.nonces = NonceTracker(self.w3)
+        self._signer = TxSigner(self.account.key)
         
-        # Contract ABIs
-        self.factory_abi = [
-            {"name": "createCoin", "type": "function", "stateMutability": "nonpayable",
-             "inputs": [{"name": "name", "type": "string"}, {"name": "symbol", "type": "string"}, 
-                       {"name": "profileUri", "type": "string"}],
-             "outputs": [{"name": "", "type": "address"}]},
-            {"name": "totalCoins", "type": "function", "stateMutability": "view",
-             "inputs": [], "outputs": [{"name": "", "type": "uint256"}]},
-        ]
+        # Factory contract, built once; None until a factory is deployed
+        factory_addr = self.deployment.get("contracts", {}).get("CreatorCoinFactory")
+        self.factory = get_contract(self.w3, factory_addr, CREATOR_FACTORY_ABI) if factory_addr else None
         
-        self.coin_abi = [
-            {"name": "buy", "type": "function", "stateMutability": "payable",
-             "inputs": [{"name": "minTokensOut", "type": "uint256"}],
-             "outputs": [{"name": "", "type": "uint256"}]},
-            {"name": "totalTrades", "type": "function", "stateMutability": "view",
-             "inputs": [], "outputs": [{"name": "", "type": "uint256"}]},
-            {"name": "symbol", "type": "function", "stateMutability": "view",
-             "inputs": [], "outputs": [{"name": "", "type": "string"}]},
-        ]
+        self._reader = MulticallReader(
+            self.w3, MULTICALL3_ADDRESS, MULTICALL3_ABI, lambda msg: print(f"[{self.name}] {msg}")
+        )
+        
+        # Coins never move or get renamed: factory index -> (address, symbol)
+        self._coins = {}
+        
+        # Symbols of tokens already created, kept in step with memory["tokens_created"]
+        self._created_symbols = {t.get("symbol", "") for t in self.memory.memory["tokens_created"]}
+        # Themes not created yet, by symbol; a theme leaves once its token is created
+        self._available_themes = {theme[1]: theme for theme in THEMES if theme[1] not in self._created_symbols}
         
         print(f"[{self.name}] Initialized - Generation {self.memory.memory['generation']}")
         print(f"[{self.name}] Success rate: {self.memory.get_success_rate():.2%}")
         print(f"[{self.name}] Total actions: {self.memory.memory['total_actions']}")
     
-    def _load_deployment(self) -> dict:
-        paths = [DEPLOYMENT_FILE, "deployment.json", "../deployment.json", "/app/deployment.json"]
-        for p in paths:
-            try:
-                with open(p) as f:
-                    return json.load(f)
-            except:
-                pass
-        return {}
+    def _coin_at(self, idx: int):
+        """(address, symbol) of the factory's idx-th coin, None if it can't be read"""
+        if idx not in self._coins:
+            [coin_addr] = self._reader.read([self.factory.functions.allCoins(idx)])
+            if coin_addr is None:
+                return None
+            coin = get_contract(self.w3, coin_addr, CREATOR_COIN_ABI)
+            [symbol] = self._reader.read([coin.functions.symbol()])
+            if symbol is None:
+                return None
+            self._coins[idx] = (coin_addr, symbol)
+        return self._coins[idx]
     
     def analyze_chain_activity(self) -> dict:
         """Analyze current chain state and activity"""
@@ -190,23 +252,17 @@ class EvolutionAgent:
             block = self.w3.eth.block_number
             
             # Get factory stats
-            factory_addr = self.deployment.get("contracts", {}).get("CreatorCoinFactory")
             total_coins = 0
-            if factory_addr:
-                factory = self.w3.eth.contract(
-                    address=Web3.to_checksum_address(factory_addr),
-                    abi=self.factory_abi
-                )
-                total_coins = factory.functions.totalCoins().call()
+            if self.factory:
+                [total_coins] = self._reader.read([self.factory.functions.totalCoins()])
+                total_coins = total_coins or 0
             
-            # Get recent transactions
-            recent_txs = 0
-            for i in range(max(0, block - 10), block + 1):
-                try:
-                    b = self.w3.eth.get_block(i)
-                    recent_txs += len(b.transactions)
-                except:
-                    pass
+            # Get recent transactions (all blocks in one batched request)
+            blocks = batch_request(self.w3, [
+                ("eth_getBlockByNumber", [hex(i), False])
+                for i in range(max(0, block - ACTIVITY_WINDOW), block + 1)
+            ])
+            recent_txs = sum(len(b["transactions"]) for b in blocks if b)
             
             return {
                 "block": block,
@@ -224,47 +280,28 @@ class EvolutionAgent:
             return False
         
         try:
-            factory_addr = self.deployment.get("contracts", {}).get("CreatorCoinFactory")
-            if not factory_addr:
+            if not self.factory:
                 return False
             
-            # Generate token idea
-            themes = [
-                ("THRYX Governance", "TGOV", "Governance token for THRYX ecosystem decisions"),
-                ("THRYX Rewards", "TRWD", "Rewards token for active participants"),
-                ("AI Agent Token", "AGENT", "Token representing AI agent collective"),
-                ("Bridge Bonus", "BRDG", "Bonus token for bridge users"),
-                ("Liquidity Mining", "TLIQ", "Rewards for liquidity providers"),
-                ("Creator Fund", "CFUND", "Shared fund for top creators"),
-            ]
-            
             # Pick a theme we haven't created yet
-            created_symbols = [t.get("symbol", "") for t in self.memory.memory["tokens_created"]]
-            available = [t for t in themes if t[1] not in created_symbols]
-            
-            if not available:
+            if not self._available_themes:
                 print(f"[{self.name}] All ecosystem tokens already created")
                 return False
             
-            name, symbol, desc = random.choice(available)
+            name, symbol, desc = self._available_themes[random.choice(tuple(self._available_themes))]
             
-            factory = self.w3.eth.contract(
-                address=Web3.to_checksum_address(factory_addr),
-                abi=self.factory_abi
-            )
-            
-            nonce = self.w3.eth.get_transaction_count(self.account.address)
-            tx = factory.functions.createCoin(name, symbol, desc).build_transaction({
+            nonce = self.nonces.next(self.account.address)
+            tx = self.factory.functions.createCoin(name, symbol, desc).build_transaction({
                 'from': self.account.address,
                 'nonce': nonce,
                 'gas': 3000000,
-                'chainId': 31337,
-                'maxFeePerGas': self.w3.to_wei(2, 'gwei'),
-                'maxPriorityFeePerGas': self.w3.to_wei(1, 'gwei'),
+                'chainId': CHAIN_ID,
+                'maxFeePerGas': MAX_FEE_WEI,
+                'maxPriorityFeePerGas': PRIORITY_FEE_WEI,
             })
             
-            signed = self.w3.eth.account.sign_transaction(tx, self.account.key)
-            raw_tx = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
+            signed = self._signer.sign(tx)
+            raw_tx = get_raw_tx(signed)
             tx_hash = self.w3.eth.send_raw_transaction(raw_tx)
             receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
             
@@ -275,47 +312,47 @@ class EvolutionAgent:
                     "created_at": datetime.now().isoformat(),
                     "tx_hash": tx_hash.hex(),
                 })
+                self._created_symbols.add(symbol)
+                self._available_themes.pop(symbol, None)
                 self.memory.record_action("token_creation", True, {"symbol": symbol})
                 self.memory.log_evolution(f"Created ecosystem token: ${symbol}")
+                self.memory.save()  # Don't wait for the next snapshot, or a crash retries the symbol
                 return True
             else:
                 self.memory.record_action("token_creation", False)
                 return False
                 
         except Exception as e:
+            self.nonces.reset(self.account.address)
             print(f"[{self.name}] Error creating token: {e}")
             self.memory.record_action("token_creation", False)
             return False
     
-    def seed_liquidity(self, coin_address: str, eth_amount: float = 0.01) -> bool:
+    def seed_liquidity(self, coin_address: str, symbol: str, eth_amount: float = 0.01) -> bool:
         """Seed a coin with initial liquidity by buying"""
         if not self.memory.should_try_strategy("liquidity_provision"):
             return False
         
         try:
-            coin = self.w3.eth.contract(
-                address=Web3.to_checksum_address(coin_address),
-                abi=self.coin_abi
-            )
+            coin = get_contract(self.w3, coin_address, CREATOR_COIN_ABI)
             
-            nonce = self.w3.eth.get_transaction_count(self.account.address)
+            nonce = self.nonces.next(self.account.address)
             tx = coin.functions.buy(0).build_transaction({
                 'from': self.account.address,
                 'nonce': nonce,
                 'value': self.w3.to_wei(eth_amount, 'ether'),
                 'gas': 200000,
-                'chainId': 31337,
-                'maxFeePerGas': self.w3.to_wei(2, 'gwei'),
-                'maxPriorityFeePerGas': self.w3.to_wei(1, 'gwei'),
+                'chainId': CHAIN_ID,
+                'maxFeePerGas': MAX_FEE_WEI,
+                'maxPriorityFeePerGas': PRIORITY_FEE_WEI,
             })
             
-            signed = self.w3.eth.account.sign_transaction(tx, self.account.key)
-            raw_tx = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
+            signed = self._signer.sign(tx)
+            raw_tx = get_raw_tx(signed)
             tx_hash = self.w3.eth.send_raw_transaction(raw_tx)
             receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
             
             if receipt.status == 1:
-                symbol = coin.functions.symbol().call()
                 self.memory.record_action("liquidity_provision", True, {"coin": symbol, "eth": eth_amount})
                 print(f"[{self.name}] 💧 Seeded ${symbol} with {eth_amount} ETH")
                 return True
@@ -324,6 +361,7 @@ class EvolutionAgent:
                 return False
                 
         except Exception as e:
+            self.nonces.reset(self.account.address)
             print(f"[{self.name}] Error seeding liquidity: {e}")
             self.memory.record_action("liquidity_provision", False)
             return False
@@ -349,19 +387,14 @@ class EvolutionAgent:
         # Decision: Seed liquidity on new coins?
         if state["total_coins"] > 0 and random.random() < 0.2:
             # Get a random coin and seed it
-            factory_addr = self.deployment.get("contracts", {}).get("CreatorCoinFactory")
-            if factory_addr:
+            if self.factory:
                 try:
-                    factory = self.w3.eth.contract(
-                        address=Web3.to_checksum_address(factory_addr),
-                        abi=[{"name": "allCoins", "type": "function", "stateMutability": "view",
-                              "inputs": [{"name": "index", "type": "uint256"}],
-                              "outputs": [{"name": "", "type": "address"}]}]
-                    )
                     idx = random.randint(0, state["total_coins"] - 1)
-                    coin_addr = factory.functions.allCoins(idx).call()
+                    coin = self._coin_at(idx)
+                    if coin is None:
+                        raise ValueError(f"could not read coin {idx}")
                     print(f"[{self.name}] 💧 Attempting to seed coin at index {idx}...")
-                    if self.seed_liquidity(coin_addr, 0.005):
+                    if self.seed_liquidity(*coin, 0.005):
                         actions_taken += 1
                 except Exception as e:
                     print(f"[{self.name}] Error getting coin: {e}")
@@ -379,11 +412,17 @@ class EvolutionAgent:
         print(f"[{self.name}] This agent autonomously expands the THRYX ecosystem")
         print(f"[{self.name}] by creating tokens, seeding liquidity, and learning from outcomes.")
         
+        # docker stop sends SIGTERM; exit normally so atexit snapshots the event log
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        
         while True:
             try:
                 self.run_evolution_cycle()
-                # Run every 60 seconds
-                time.sleep(60)
+                # Back off while neither cycle action can run (strategies only re-enable via record_action)
+                if self.memory.any_strategy_enabled(("token_creation", "liquidity_provision")):
+                    time.sleep(CYCLE_INTERVAL)
+                else:
+                    time.sleep(IDLE_CYCLE_INTERVAL)
             except KeyboardInterrupt:
                 print(f"[{self.name}] Shutting down...")
                 self.memory.save()
@@ -10,6 +10,7 @@ from datetime import datetime
 from web3 import Web3
 from eth_account import Account
 from price_feed import get_price_feed, format_eth_with_usdc
+from chain_utils import get_raw_tx
 
 # Config
 RPC_URL = os.getenv("RPC_URL", "http://thryx-node:8545")
@@ -176,7 +177,7 @@ class MarketMakerAgent:
             })
             
             signed = self.w3.eth.account.sign_transaction(tx, mm.key)
-            raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
+            raw = get_raw_tx(signed)
             tx_hash = self.w3.eth.send_raw_transaction(raw)
             receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
             
@@ -10,6 +10,7 @@ from datetime import datetime
 from web3 import Web3
 from eth_account import Account
 from price_feed import format_eth_with_usdc
+from chain_utils import get_raw_tx
 
 # Config
 RPC_URL = os.getenv("RPC_URL", "http://thryx-node:8545")
@@ -166,7 +167,7 @@ class SocialAgent:
             })
             
             signed = self.w3.eth.account.sign_transaction(tx, follower.key)
-            raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
+            raw = get_raw_tx(signed)
             tx_hash = self.w3.eth.send_raw_transaction(raw)
             receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
             
@@ -211,7 +212,7 @@ class SocialAgent:
             })
             
             signed = self.w3.eth.account.sign_transaction(tx, user.key)
-            raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
+            raw = get_raw_tx(signed)
             tx_hash = self.w3.eth.send_raw_transaction(raw)
             receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
             
@@ -250,7 +251,7 @@ class SocialAgent:
             }
             
             signed = self.w3.eth.account.sign_transaction(tx, sender.key)
-            raw = getattr(signed, 'rawTransaction', None) or getattr(signed, 'raw_transaction', None)
+            raw = get_raw_tx(signed)
             self.w3.eth.send_raw_transaction(raw)
             
             self.log(f"💸 Social transfer: {sender.address[:8]}... → {receiver.address[:8]}...")
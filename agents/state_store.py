@@ -0,0 +1,137 @@
+"""
+THRYX Agent State Store
+Dict-shaped agent state persisted in SQLite (WAL mode), one row per
+top-level key: callers mark what they changed and save() writes only
+those rows, so counters and appends cost a single small row instead of
+the whole blob. Per-item maps (SPLIT_KEYS) get one row per entry.
+"""
+import os
+import gzip
+import time
+import sqlite3
+from chain_utils import json_dumps, json_loads
+
+
+def _move_aside(path: str, error: Exception) -> bool:
+    """Keep an unreadable file for inspection instead of overwriting it, returns whether it moved"""
+    corrupt_path = f"{path}.corrupt-{int(time.time())}"
+    print(f"Failed to load state from {path}: {error}")
+    try:
+        os.replace(path, corrupt_path)
+    except OSError as e:
+        print(f"Could not move {path} aside: {e}")
+        return False
+    print(f"Kept unreadable state as {corrupt_path}")
+    return True
+
+
+class StateStore:
+    """
+    Subclasses provide default_state() and may override prepare() to turn
+    loaded values into richer types. `filepath` is the agent's JSON state
+    path; the database sits next to it and imports the JSON on first start.
+
+    Changes are not detected: after mutating self.data, call mark_dirty()
+    for the top-level keys touched (or mark_entry_dirty() for one entry of
+    a SPLIT_KEYS map) before save().
+    """
+
+    # Top-level dicts stored as one "<key>/<entry>" row per entry
+    SPLIT_KEYS = ()
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.db_path = os.path.splitext(filepath)[0] + ".db"
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.db = self._connect()
+
+        loaded = {}
+        for key, value in self.db.execute("SELECT key, value FROM state"):
+            top, sep, entry = key.partition("/")
+            if sep and top in self.SPLIT_KEYS:
+                loaded.setdefault(top, {})[entry] = json_loads(value)
+            else:
+                loaded[key] = json_loads(value)
+        stored = set(loaded)
+        if not loaded:
+            loaded = self._load_legacy()
+
+        self.data = self.prepare({**self.default_state(), **loaded})
+        self._dirty = set()  # (key, entry) pairs, entry None for the whole key
+        self.mark_dirty(*(key for key in self.data if key not in stored))
+        self.save()
+
+    def default_state(self) -> dict:
+        raise NotImplementedError
+
+    def prepare(self, data: dict) -> dict:
+        """Hook to convert loaded JSON values (e.g. lists to bounded deques)"""
+        return data
+
+    def _connect(self):
+        try:
+            db = sqlite3.connect(self.db_path)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent on crash; fsync at checkpoints only
+            db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            return db
+        except sqlite3.DatabaseError as e:
+            if not os.path.exists(self.db_path):
+                raise
+            if not _move_aside(self.db_path, e):
+                raise
+            return self._connect()
+
+    def _load_legacy(self) -> dict:
+        """State from the JSON file (plain or gzipped) used before the database"""
+        for path, opener in ((self.filepath, open), (self.filepath + ".gz", gzip.open)):
+            try:
+                with opener(path, 'rb') as f:
+                    data = json_loads(f.read())
+            except FileNotFoundError:
+                continue
+            except (OSError, EOFError, ValueError) as e:
+                _move_aside(path, e)
+                continue
+            print(f"Importing state from {path} into {self.db_path}")
+            return data
+        return {}
+
+    def mark_dirty(self, *keys):
+        """Mark top-level keys to be written by the next save()"""
+        self._dirty.update((key, None) for key in keys)
+
+    def mark_entry_dirty(self, key, entry):
+        """Mark one entry of a SPLIT_KEYS map (added, changed or deleted)"""
+        self._dirty.add((key, entry))
+
+    def save(self):
+        """Write the keys marked dirty since the last save, in one transaction"""
+        if not self._dirty:
+            return
+
+        writes, deletes, cleared = [], [], []
+        for key, entry in self._dirty:
+            if key not in self.SPLIT_KEYS:
+                if key in self.data:
+                    writes.append((key, json_dumps(self.data[key], default=list).decode()))
+                else:
+                    deletes.append((key,))
+            elif entry is None:
+                # Whole map replaced: drop its old rows and write every entry
+                prefix = f"{key}/"
+                cleared.append((len(prefix), prefix))
+                writes.extend((f"{key}/{e}", json_dumps(v, default=list).decode()) for e, v in self.data.get(key, {}).items())
+            elif entry in self.data.get(key, {}):
+                writes.append((f"{key}/{entry}", json_dumps(self.data[key][entry], default=list).decode()))
+            else:
+                deletes.append((f"{key}/{entry}",))
+
+        try:
+            with self.db:
+                self.db.executemany("DELETE FROM state WHERE substr(key, 1, ?) = ?", cleared)
+                self.db.executemany("DELETE FROM state WHERE key = ?", deletes)
+                self.db.executemany("INSERT OR REPLACE INTO state VALUES (?, ?)", writes)
+            self._dirty.clear()
+        except sqlite3.Error as e:
+            print(f"Failed to save state: {e}")